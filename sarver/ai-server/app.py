@@ -1,11 +1,11 @@
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, jsonify, request, send_file, Response
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 import os
 import time
 import sys
 import json
-import psutil
+from collections import deque
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
@@ -30,29 +30,53 @@ app = Flask(__name__)
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from dispatcher.accounting import agent_accounting
+from dispatcher.metrics import agent_label, collector, gauge_family, instrument_flask
+from dispatcher.tracing import trace_flask
+from dispatcher.broadcast import EmitAggregator, register_rooms
+from dispatcher.aio import iter_sync
+from dispatcher.batch import dispatch_batch_async, parse_batch
+from dispatcher.cache import response_cache
+from dispatcher.context import context_manager
+from dispatcher.core import dispatch as dispatch_request, stream_dispatch_async
+from dispatcher.ratelimit import rate_limiter
+from dispatcher.singleflight import singleflight_stats
+from dispatcher.streaming import (
+    NDJSON, STREAM_HEADERS, STREAM_MIMETYPES, encode_events, get_stream_mode, stream_metrics
+)
+from dispatcher.system_stats import system_sampler
+from dispatcher.timeseries import query_args, timeseries
+instrument_flask(app, "ai_server")  # GET /metrics
+trace_flask(app, "ai_server")  # Server-Timing header, traces in the admin dashboard
+
 # Global variables for monitoring
-latency_log = []
+latency_log = deque(maxlen=100)  # recent calls for display; history is in dispatcher.timeseries
 agents_status = {}
 system_stats = {}
 active_connections = 0
 
+# agent_response goes out batched per room every SOCKETIO_TICK_MS; clients start in
+# "dispatch" (all agents) and can subscribe to "agent:<name>" rooms instead
+emitter = EmitAggregator(socketio.emit, start_task=socketio.start_background_task, sleep=socketio.sleep)
+join_default_rooms = register_rooms(socketio, default_rooms=("dispatch",), allowed_prefixes=("agent:",))
+
+@collector
+def _socket_metrics():
+    yield gauge_family("zombiecoder_socketio_connections", "Connected Socket.IO clients", [({}, active_connections)])
+
 def update_system_stats():
-    """Update system statistics"""
+    """Latest sample from the background sampler; never blocks the request"""
     global system_stats
-    ram = psutil.virtual_memory()
-    cpu = psutil.cpu_percent(interval=0.5)
-    disk = psutil.disk_usage('/')
-    
-    system_stats = {
-        "ram_percent": ram.percent,
-        "ram_total_gb": round(ram.total / (1024**3), 2),
-        "ram_available_gb": round(ram.available / (1024**3), 2),
-        "cpu_percent": cpu,
-        "disk_percent": disk.percent,
-        "disk_total_gb": round(disk.total / (1024**3), 2),
-        "disk_free_gb": round(disk.free / (1024**3), 2),
-        "timestamp": datetime.now().isoformat(),
-        "active_connections": active_connections
+    system_stats = dict(system_sampler.snapshot(), active_connections=active_connections)
+
+def agent_usage(agent_name):
+    """Calls, latency percentiles, CPU time and footprint from dispatcher.accounting"""
+    usage = agent_accounting.snapshot(agent_name) or {}
+    return {
+        "last_used": usage.get("last_used"),
+        "memory_usage": usage.get("memory_usage", "N/A"),
+        "stats": usage or None
     }
 
 def update_agent_status():
@@ -60,7 +84,6 @@ def update_agent_status():
     global agents_status
     try:
         # Import agent registry
-        sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
         from ai.agents.registry import AgentRegistry
         
         for agent_name in AgentRegistry._agents.keys():
@@ -68,19 +91,24 @@ def update_agent_status():
                 agent = AgentRegistry.get_agent(agent_name)
                 agents_status[agent_name] = {
                     "status": "active",
-                    "last_used": datetime.now().isoformat(),
-                    "memory_usage": "0KB",
+                    **agent_usage(agent_name),
                     "config": agent.config if hasattr(agent, 'config') else {}
                 }
             except Exception as e:
-                agents_status[agent_name] = {
-                    "status": f"disabled: {str(e)}",
-                    "last_used": None,
-                    "memory_usage": "0KB"
-                }
+                agents_status[agent_name] = {"status": f"disabled: {str(e)}", **agent_usage(agent_name)}
     except Exception as e:
         logger.error(f"Error updating agent status: {e}")
 
+def _pipeline_metrics():
+    """Streaming, coalescing, cache, rate-limit and context figures from the dispatch pipeline"""
+    return {
+        "stream_metrics": stream_metrics.snapshot(),
+        "singleflight": singleflight_stats(),
+        "response_cache": response_cache.stats(),
+        "rate_limits": rate_limiter.snapshot(),
+        "context": context_manager.stats()
+    }
+
 @app.route("/api/status")
 def status():
     """Enhanced status endpoint for admin panel"""
@@ -98,10 +126,13 @@ def status():
     return jsonify({
         "service": "ai-server",
         "dispatcher_active": True,
-        "latency_log": latency_log[-10:],  # Last 10 entries
+        "latency_log": list(latency_log)[-10:],  # Last 10 entries
         "agents_status": agents_status,
         "fallback_info": fallback_info,
         "system": system_stats,
+        **_pipeline_metrics(),
+        "agent_usage": agent_accounting.stats(),
+        "socketio_emits": emitter.stats(),
         "server_info": {
             "port": 8000,
             "uptime": time.time(),
@@ -113,7 +144,6 @@ def status():
 def get_agents():
     """Get all available agents"""
     try:
-        sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
         from ai.agents.registry import AgentRegistry
         
         agents = AgentRegistry.list_agents()
@@ -133,7 +163,6 @@ def get_agents():
 def get_agent_status(agent_name):
     """Get specific agent status"""
     try:
-        sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
         from ai.agents.registry import AgentRegistry
         
         agent = AgentRegistry.get_agent(agent_name)
@@ -142,7 +171,7 @@ def get_agent_status(agent_name):
             "agent": agent_name,
             "status": "active",
             "config": agent.config if hasattr(agent, 'config') else {},
-            "memory_usage": "0KB"
+            **agent_usage(agent_name)
         })
     except Exception as e:
         return jsonify({
@@ -160,14 +189,19 @@ def dispatch():
     if not agent_name or not text:
         return jsonify({"error": "Missing agent or text"}), 400
 
+    stream_mode = get_stream_mode(data, request.headers.get("Accept"))
+    if stream_mode:
+        events = iter_sync(stream_dispatch_async({"agent": agent_name, "text": text, "prompt": text}))
+        return Response(
+            encode_events(events, stream_mode),
+            mimetype=STREAM_MIMETYPES[stream_mode],
+            headers=STREAM_HEADERS
+        )
+
     start_time = time.time()
     
     try:
-        # Import dispatcher
-        sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-        from dispatcher.core import dispatch as dispatch_request
-        
-        result = dispatch_request({"agent": agent_name, "text": text})
+        result = dispatch_request({"agent": agent_name, "text": text, "prompt": text})
         
         # Calculate latency
         latency = (time.time() - start_time) * 1000
@@ -176,17 +210,17 @@ def dispatch():
             "latency_ms": round(latency, 2),
             "agent": agent_name
         })
+        # per-agent series and rooms only for registered agents; anything else is "unknown"
+        agent_key = agent_label(agent_name)
+        _record_metric("ai_server.latency_ms", latency)
+        _record_metric(f"ai_server.latency_ms.{agent_key}", latency)
         
-        # Keep only last 100 entries
-        if len(latency_log) > 100:
-            latency_log.pop(0)
-        
-        # Emit real-time update
-        socketio.emit('agent_response', {
+        # Real-time update, batched with the other dispatches of this tick
+        emitter.add('agent_response', {
             'agent': agent_name,
             'latency': round(latency, 2),
             'timestamp': datetime.now().isoformat()
-        })
+        }, rooms=("dispatch", f"agent:{agent_key}"), key=agent_key, value=latency)
         
         return jsonify({
             "success": True,
@@ -203,6 +237,7 @@ def dispatch():
             "agent": agent_name,
             "error": str(e)
         })
+        _record_metric("ai_server.errors", 1)
         
         logger.error(f"Dispatch error: {e}")
         return jsonify({
@@ -211,6 +246,30 @@ def dispatch():
             "latency_ms": round(latency, 2)
         }), 500
 
+@app.route("/api/dispatch/batch", methods=["POST"])
+def dispatch_batch():
+    """Bulk dispatch: JSON array or JSON Lines in, NDJSON results out in completion order"""
+    upload = request.files.get("file")
+    try:
+        if upload is not None:
+            items = parse_batch(upload.read(), upload.mimetype)
+        else:
+            items = parse_batch(request.get_data(), request.content_type)
+    except ValueError as e:
+        return jsonify({"success": False, "error": f"Invalid batch: {e}"}), 400
+
+    if not items:
+        return jsonify({"success": False, "error": "Empty batch"}), 400
+
+    concurrency = request.args.get("concurrency", type=int)
+    logger.info(f"Batch dispatch of {len(items)} items")
+    events = iter_sync(dispatch_batch_async(items, concurrency=concurrency))
+    return Response(
+        encode_events(events, NDJSON),
+        mimetype=STREAM_MIMETYPES[NDJSON],
+        headers=STREAM_HEADERS
+    )
+
 @app.route("/api/providers")
 def get_providers():
     """Get available providers"""
@@ -225,6 +284,17 @@ def get_providers():
         "providers": providers
     })
 
+def _record_metric(name, value):
+    timeseries.record(name, value)
+
+@app.route("/api/timeseries")
+def get_timeseries():
+    """Series names, or ?series=<name>&start=&end=&resolution=1s|1m|1h rollups (min/max/avg/p95)"""
+    try:
+        return jsonify(query_args(timeseries, request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route("/api/logs")
 def get_logs():
     """Get recent logs"""
@@ -264,6 +334,7 @@ def handle_connect():
     global active_connections
     active_connections += 1
     logger.info(f"Client connected. Total connections: {active_connections}")
+    join_default_rooms()
     emit('status', {'message': 'Connected to AI Server'})
 
 @socketio.on('disconnect')
@@ -283,10 +354,7 @@ def handle_agent_request(data):
             # Process request
             start_time = time.time()
             
-            sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-            from dispatcher.core import dispatch as dispatch_request
-            
-            result = dispatch_request({"agent": agent_name, "text": text})
+            result = dispatch_request({"agent": agent_name, "text": text, "prompt": text})
             latency = (time.time() - start_time) * 1000
             
             emit('agent_response', {
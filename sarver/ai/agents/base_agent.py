@@ -1,7 +1,12 @@
 import os
+import sys
 import yaml
 from typing import Dict, List, Optional
 from .memory_system import MemoryManager
+from .jobs import check_cancelled
+from dispatcher.accounting import agent_accounting, approx_size
+from dispatcher.aio import to_thread
+from dispatcher.tracing import span, traced
 
 class BaseAgent:
     def __init__(self, name: str, category: str, config_path: str = None, personality_path: str = None):
@@ -10,6 +15,11 @@ class BaseAgent:
         self.config = self._load_config(config_path)
         self.personality = self._load_personality(personality_path)
         self.memory = MemoryManager()
+        agent_accounting.set_footprint(
+            name,
+            instance=sys.getsizeof(self) + approx_size(self.config) + approx_size(self.personality),
+            memory_store=self.memory.store_size(name),
+        )
         
     def _load_config(self, config_path: str = None) -> Dict:
         if config_path is not None:
@@ -48,6 +58,7 @@ class BaseAgent:
         master_config = self._load_master_config()
         return message.startswith(master_config['admin_prefix'])
         
+    @traced('config.load_yaml')
     def _load_master_config(self) -> Dict:
         config_path = os.path.join(
             os.path.dirname(__file__),
@@ -58,6 +69,10 @@ class BaseAgent:
             
     def process_message(self, message: str, user_role: str = "user") -> str:
         """Process incoming message and return response, using memory and fallback if needed."""
+        with agent_accounting.measure(self.name):
+            return self._process_message(message, user_role)
+
+    def _process_message(self, message: str, user_role: str) -> str:
         if self.is_admin_command(message) and user_role not in self._load_master_config()['admin_roles']:
             return "Sorry, this command is only available for administrators."
         # Remove admin prefix if present
@@ -68,11 +83,33 @@ class BaseAgent:
         if memory_answer:
             return memory_answer
         # Generate response
-        response = self._generate_response(message)
+        check_cancelled()
+        with span('agent.generate', agent=self.name):
+            response = self._generate_response(message)
         # Store in memory
         self.memory.set(self.name, message, response, is_agent=True)
         return response
 
+    async def process_message_async(self, message: str, user_role: str = "user") -> str:
+        """Async twin of process_message(); memory I/O and generation run off the event loop."""
+        async with agent_accounting.ameasure(self.name):
+            return await self._process_message_async(message, user_role)
+
+    async def _process_message_async(self, message: str, user_role: str) -> str:
+        master_config = await to_thread(self._load_master_config)
+        is_admin = message.startswith(master_config['admin_prefix'])
+        if is_admin and user_role not in master_config['admin_roles']:
+            return "Sorry, this command is only available for administrators."
+        if is_admin:
+            message = message[len(master_config['admin_prefix']):].strip()
+        memory_answer = await self.memory.aget(self.name, message, is_agent=True)
+        if memory_answer:
+            return memory_answer
+        with span('agent.generate', agent=self.name):
+            response = await to_thread(self._generate_response, message)
+        await self.memory.aset(self.name, message, response, is_agent=True)
+        return response
+
     def get_personality(self) -> Dict:
         """Return the agent's personality dictionary."""
         return self.personality
@@ -1,56 +1,104 @@
 import threading
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Optional
 from .registry import AgentRegistry
+from .jobs import (
+    INTERACTIVE, DONE, TIMEOUT, CANCELLED, SHED, GATHER_ALL, Job, JobQueue, JobCancelled, gather, gather_quota
+)
 
 class AgentExecutor:
-    def __init__(self, max_workers: int = 5):
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
-        self.active_tasks: Dict[str, Any] = {}
-        self._lock = threading.Lock()
-        
-    def run_agent(self, agent_name: str, message: str, user_role: str = "user") -> str:
-        """Run an agent in a separate thread"""
+    def __init__(self, max_workers: int = 5, max_queue: int = 100):
+        self.jobs = JobQueue(workers=max_workers, max_queue=max_queue)
+
+    @property
+    def active_tasks(self) -> Dict[str, Job]:
+        """Queued and running jobs by id"""
+        return {job.id: job for job in self.jobs.active()}
+
+    def submit(self, agent_name: str, message: str, user_role: str = "user",
+               priority: str = INTERACTIVE, deadline: float = None) -> Job:
+        """Queue an agent call and return its job without waiting"""
         agent = AgentRegistry.get_agent(agent_name)
-        future = self.executor.submit(agent.process_message, message, user_role)
-        
-        with self._lock:
-            task_id = str(threading.get_ident())
-            self.active_tasks[task_id] = future
-            
+        return self.jobs.submit(
+            agent.process_message, (message, user_role),
+            priority=priority, deadline=deadline, meta={"agent": agent_name}
+        )
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        return self.jobs.cancel(job_id)
+
+    @staticmethod
+    def _outcome(job: Job) -> Any:
+        job.wait()
+        if job.status == DONE:
+            return job.result
+        if job.status == TIMEOUT:
+            raise TimeoutError(job.error)
+        if job.status in (CANCELLED, SHED):
+            raise JobCancelled(job.error)
+        raise job.exception or RuntimeError(job.error)
+
+    def run_agent(self, agent_name: str, message: str, user_role: str = "user", timeout: float = 30) -> str:
+        """Run an agent as an interactive job and wait for its result"""
+        return self._outcome(self.submit(agent_name, message, user_role, deadline=timeout))
+
+    def scatter(self, tasks: List[Dict[str, str]], user_role: str = "user",
+                priority: str = INTERACTIVE, timeout: float = 30) -> List[Job]:
+        """Submit one job per task, in task order; all or nothing"""
+        jobs = []
         try:
-            result = future.result(timeout=30)  # 30 second timeout
-            return result
-        finally:
-            with self._lock:
-                self.active_tasks.pop(task_id, None)
-                
-    def run_multiple_agents(self, 
-                          tasks: List[Dict[str, str]], 
-                          user_role: str = "user") -> Dict[str, str]:
-        """Run multiple agents in parallel"""
-        futures = {}
+            for task in tasks:
+                jobs.append(self.submit(task['agent'], task['message'], task.get('user_role', user_role),
+                                        priority=priority, deadline=timeout))
+        except Exception:
+            for job in jobs:
+                job.cancel('scatter aborted')
+            raise
+        return jobs
+
+    def scatter_gather(self, tasks: List[Dict[str, str]], policy: str = GATHER_ALL, n: int = None,
+                       user_role: str = "user", priority: str = INTERACTIVE,
+                       timeout: float = 30) -> Iterator[Dict]:
+        """Fan tasks out and stream results back as they finish (see jobs.gather)"""
+        # validate before anything is queued so a bad request doesn't leave jobs running
+        gather_quota(policy, n, len(tasks))
+        return gather(self.scatter(tasks, user_role, priority, timeout), policy, n, timeout)
+
+    def run_multiple_agents(self,
+                          tasks: List[Dict[str, str]],
+                          user_role: str = "user",
+                          priority: str = INTERACTIVE,
+                          timeout: float = 30) -> Dict[str, str]:
+        """Run multiple agents in parallel under one deadline, keyed by agent name"""
         results = {}
-        
+        for event in self.scatter_gather(tasks, GATHER_ALL, None, user_role, priority, timeout):
+            if event['type'] != 'result':
+                continue
+            agent_name = tasks[event['index']]['agent']
+            if event['status'] == DONE:
+                results[agent_name] = event['result']
+            else:
+                results[agent_name] = f"Error: {event['error']}"
+
+        # anything the deadline cut off
         for task in tasks:
-            agent_name = task['agent']
-            message = task['message']
-            agent = AgentRegistry.get_agent(agent_name)
-            future = self.executor.submit(agent.process_message, message, user_role)
-            futures[agent_name] = future
-            
-        # Wait for all tasks to complete
-        for agent_name, future in futures.items():
-            try:
-                results[agent_name] = future.result(timeout=30)
-            except Exception as e:
-                results[agent_name] = f"Error: {str(e)}"
-                
+            results.setdefault(task['agent'], "Error: deadline exceeded")
         return results
-        
-    def cancel_all_tasks(self):
-        """Cancel all running tasks"""
-        with self._lock:
-            for future in self.active_tasks.values():
-                future.cancel()
-            self.active_tasks.clear()
+
+    def cancel_all_tasks(self) -> int:
+        """Cancel all queued and running jobs"""
+        return self.jobs.cancel_all()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> AgentExecutor:
+    """Process-wide executor shared by the job endpoints"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = AgentExecutor()
+        return _executor
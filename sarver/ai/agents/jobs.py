@@ -0,0 +1,413 @@
+"""
+Job queue for agent work.
+
+Every submitted job gets a unique id, a priority class and a deadline. Jobs wait
+in a bounded priority queue: when it is full, interactive work sheds the newest
+queued batch job and anything else is rejected with QueueFullError.
+Cancellation is cooperative - running code sees it at the next check_cancelled()
+call, and the late result of a cancelled or timed-out job is dropped.
+"""
+import contextvars
+import heapq
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from dispatcher.tracing import span
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITIES = {INTERACTIVE: 0, BATCH: 10}
+DEFAULT_DEADLINES = {INTERACTIVE: 30.0, BATCH: 300.0}
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+CANCELLED = 'cancelled'
+SHED = 'shed'
+TIMEOUT = 'timeout'
+FINISHED = (DONE, ERROR, CANCELLED, SHED, TIMEOUT)
+
+GATHER_ALL = 'all'
+GATHER_FIRST = 'first'
+GATHER_FIRST_N = 'first_n'
+GATHER_QUORUM = 'quorum'
+GATHER_POLICIES = (GATHER_ALL, GATHER_FIRST, GATHER_FIRST_N, GATHER_QUORUM)
+
+
+class QueueFullError(Exception):
+    """The queue is full and there is no lower-priority job to shed"""
+
+
+class JobCancelled(Exception):
+    """Raised at a checkpoint once the current job is cancelled or past its deadline"""
+
+
+_current_job: contextvars.ContextVar = contextvars.ContextVar('current_job', default=None)
+
+
+def current_job() -> Optional['Job']:
+    return _current_job.get()
+
+
+def check_cancelled():
+    """Cancellation checkpoint for long-running agent code; a no-op outside a job"""
+    job = _current_job.get()
+    if job is not None and job.should_stop():
+        raise JobCancelled(job.id)
+
+
+class Job:
+    def __init__(self, func: Callable, args: tuple = (), kwargs: Dict = None, priority: str = INTERACTIVE,
+                 deadline: float = None, meta: Dict = None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority}, expected one of {list(PRIORITIES)}")
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.priority = priority
+        self.meta = meta or {}
+        self.timeout = float(deadline if deadline is not None else DEFAULT_DEADLINES[priority])
+        self.deadline = time.monotonic() + self.timeout
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.exception: Optional[BaseException] = None
+        self.on_finish: Optional[Callable[['Job'], None]] = None
+        self._callbacks: List[Callable[['Job'], None]] = []
+        self._cancel = threading.Event()
+        self._cond = threading.Condition()
+        self._events: List[Dict] = [self._event(QUEUED)]
+
+    # state
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def should_stop(self) -> bool:
+        return self._cancel.is_set() or self.expired()
+
+    def _event(self, status: str) -> Dict:
+        event = {'type': 'status', 'job_id': self.id, 'status': status}
+        if status == DONE:
+            event.update(type='done', result=self.result)
+        elif status in FINISHED:
+            event.update(type='error', error=self.error)
+        return event
+
+    def transition(self, status: str, **fields) -> bool:
+        """Move to a new status; finished jobs never change again"""
+        with self._cond:
+            if self.finished:
+                return False
+            self.status = status
+            for name, value in fields.items():
+                setattr(self, name, value)
+            if status in FINISHED:
+                self.finished_at = time.time()
+            self._events.append(self._event(status))
+            self._cond.notify_all()
+            callbacks = list(self._callbacks) if status in FINISHED else []
+        if status in FINISHED:
+            if status != DONE:
+                self._cancel.set()
+            if self.on_finish:
+                self.on_finish(self)
+            for callback in callbacks:
+                callback(self)
+        return True
+
+    def add_done_callback(self, callback: Callable[['Job'], None]):
+        """Call callback(job) once the job finishes, or right away if it already has"""
+        with self._cond:
+            if not self.finished:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def cancel(self, reason: str = 'cancelled') -> bool:
+        self._cancel.set()
+        return self.transition(CANCELLED, error=reason)
+
+    def refresh(self):
+        """Time the job out once its deadline has passed"""
+        if not self.finished and self.expired():
+            self.transition(TIMEOUT, error=f"deadline of {self.timeout:g}s exceeded")
+
+    # waiting
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until the job finishes (or its deadline passes); True if finished"""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self.finished:
+                budget = max(self.remaining(), 0)
+                if end is not None:
+                    budget = min(budget, end - time.monotonic())
+                if budget <= 0:
+                    break
+                self._cond.wait(budget)
+        self.refresh()
+        return self.finished
+
+    def events(self) -> Iterator[Dict]:
+        """Status events from submission onwards, ending with a done/error event"""
+        sent = 0
+        while True:
+            with self._cond:
+                while sent == len(self._events) and not self.finished and not self.expired():
+                    self._cond.wait(max(self.remaining(), 0))
+                pending = self._events[sent:]
+                sent = len(self._events)
+            yield from pending
+            if pending and pending[-1]['type'] != 'status':
+                return
+            self.refresh()
+
+    def to_dict(self) -> Dict:
+        self.refresh()
+        return {
+            'id': self.id,
+            'status': self.status,
+            'priority': self.priority,
+            'meta': self.meta,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'deadline_in': None if self.finished else round(max(self.remaining(), 0), 3),
+        }
+
+
+def _vote_key(result: Any) -> str:
+    return ' '.join(str(result).split())
+
+
+def gather(jobs: List[Job], policy: str = GATHER_ALL, n: int = None, timeout: float = 30) -> Iterator[Dict]:
+    """
+    Yield a 'result' event per job as it finishes, then one 'done' event.
+
+    all      - wait for every job
+    first    - stop at the first successful result
+    first_n  - stop after n successful results
+    quorum   - stop once n results agree (default: a majority of the jobs)
+
+    Everything shares one deadline; jobs still pending when the policy is
+    satisfied, becomes unsatisfiable or runs out of time are cancelled.
+    """
+    return _gather(jobs, policy, gather_quota(policy, n, len(jobs)), timeout)
+
+
+def gather_quota(policy: str, n, count: int) -> int:
+    """How many results `policy` waits for out of `count` jobs; ValueError if n is unusable"""
+    if policy not in GATHER_POLICIES:
+        raise ValueError(f"Unknown gather policy {policy}, expected one of {list(GATHER_POLICIES)}")
+    if n is not None:
+        try:
+            n = int(n)
+        except (TypeError, ValueError):
+            raise ValueError(f"n must be an integer, got {n!r}")
+        if not 1 <= n <= count:
+            raise ValueError(f"n must be between 1 and {count}, got {n}")
+    return {
+        GATHER_ALL: count,
+        GATHER_FIRST: 1,
+        GATHER_FIRST_N: n or 1,
+        GATHER_QUORUM: n or count // 2 + 1,
+    }[policy]
+
+
+def _gather(jobs: List[Job], policy: str, needed: int, timeout: float) -> Iterator[Dict]:
+    start = time.monotonic()
+    finished: "queue.Queue[int]" = queue.Queue()
+    for index, job in enumerate(jobs):
+        job.add_done_callback(lambda _, i=index: finished.put(i))
+
+    pending = set(range(len(jobs)))
+    succeeded: List[int] = []
+    votes: Dict[str, List[int]] = {}
+    winner = None
+    reason = 'deadline'
+    try:
+        while pending:
+            remaining = start + timeout - time.monotonic()
+            try:
+                index = finished.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                break
+            pending.discard(index)
+            job = jobs[index]
+            yield {'type': 'result', 'index': index, **job.to_dict()}
+
+            if job.status == DONE:
+                succeeded.append(index)
+                if policy == GATHER_QUORUM:
+                    agreeing = votes.setdefault(_vote_key(job.result), [])
+                    agreeing.append(index)
+                    if len(agreeing) >= needed:
+                        winner = agreeing[0]
+                elif policy != GATHER_ALL and len(succeeded) >= needed:
+                    winner = succeeded[0]
+                if winner is not None:
+                    reason = 'satisfied'
+                    break
+            best = max((len(v) for v in votes.values()), default=0) if policy == GATHER_QUORUM else len(succeeded)
+            if policy != GATHER_ALL and best + len(pending) < needed:
+                reason = 'unsatisfiable'
+                break
+        else:
+            reason = 'satisfied' if len(succeeded) == len(jobs) else 'completed'
+    finally:
+        # stragglers, including those left behind by a consumer that stopped early
+        cancelled = [i for i in sorted(pending) if jobs[i].cancel(f'gather {reason}')]
+
+    yield {
+        'type': 'done',
+        'policy': policy,
+        'needed': needed,
+        'satisfied': reason == 'satisfied',
+        'reason': reason,
+        'winner': winner,
+        'result': jobs[winner].result if winner is not None else None,
+        'succeeded': succeeded,
+        'cancelled': cancelled,
+        'elapsed_ms': round((time.monotonic() - start) * 1000, 2),
+    }
+
+
+class JobQueue:
+    def __init__(self, workers: int = 5, max_queue: int = 100, max_history: int = 1000):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_history = max_history
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        self.counters = {name: 0 for name in ('submitted', 'rejected', DONE, ERROR, CANCELLED, SHED, TIMEOUT)}
+
+    def submit(self, func: Callable, args: tuple = (), kwargs: Dict = None, priority: str = INTERACTIVE,
+               deadline: float = None, meta: Dict = None) -> Job:
+        job = Job(func, args, kwargs, priority, deadline, meta)
+        job.on_finish = self._finished
+        with self._cond:
+            queued = [entry for entry in self._heap if entry[2].status == QUEUED]
+            victim = None
+            if len(queued) >= self.max_queue:
+                # shed the newest job of the lowest class below the new one
+                candidates = [e for e in queued if e[0] > PRIORITIES[priority]]
+                if not candidates:
+                    self.counters['rejected'] += 1
+                    raise QueueFullError(f"Job queue full ({self.max_queue} queued)")
+                victim = max(candidates, key=lambda e: (e[0], e[1]))[2]
+            self._heap = [e for e in self._heap if e[2].status == QUEUED]
+            heapq.heapify(self._heap)
+            heapq.heappush(self._heap, (PRIORITIES[priority], next(self._seq), job))
+            self._remember(job)
+            self.counters['submitted'] += 1
+            self._start_workers()
+            self._cond.notify()
+        if victim is not None:
+            victim.transition(SHED, error='shed for higher-priority work')
+        return job
+
+    def _remember(self, job: Job):
+        self._jobs[job.id] = job
+        excess = len(self._jobs) - self.max_history
+        if excess > 0:
+            for old_id in [i for i, j in self._jobs.items() if j.finished][:excess]:
+                del self._jobs[old_id]
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f'agent-job-{len(self._threads)}', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _finished(self, job: Job):
+        with self._cond:
+            self.counters[job.status] += 1
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+                if job.status != QUEUED:
+                    continue
+                self._running += 1
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._running -= 1
+
+    def _run(self, job: Job):
+        job.refresh()
+        if not job.transition(RUNNING, started_at=time.time()):
+            return
+        token = _current_job.set(job)
+        try:
+            with span('job', job_id=job.id, priority=job.priority, **job.meta):
+                result = job.func(*job.args, **job.kwargs)
+        except JobCancelled:
+            job.refresh()
+            job.cancel()
+        except Exception as e:
+            job.transition(ERROR, error=str(e) or type(e).__name__, exception=e)
+        else:
+            job.refresh()
+            job.transition(DONE, result=result)
+        finally:
+            _current_job.reset(token)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        return job.cancel() if job else False
+
+    def cancel_all(self) -> int:
+        with self._cond:
+            jobs = [j for j in self._jobs.values() if not j.finished]
+        return sum(job.cancel() for job in jobs)
+
+    def active(self) -> List[Job]:
+        with self._cond:
+            return [j for j in self._jobs.values() if not j.finished]
+
+    def stats(self) -> Dict:
+        with self._cond:
+            depth = {name: 0 for name in PRIORITIES}
+            for _, _, job in self._heap:
+                if job.status == QUEUED:
+                    depth[job.priority] += 1
+            return {
+                'workers': self.workers,
+                'running': self._running,
+                'queued': depth,
+                'max_queue': self.max_queue,
+                'counters': dict(self.counters),
+            }
@@ -1,6 +1,9 @@
 import os
 import json
 from typing import Optional, Any
+from dispatcher.accounting import agent_accounting
+from dispatcher.aio import to_thread
+from dispatcher.tracing import traced
 
 class MemoryManager:
     def __init__(self, base_dir: str = 'storage'):
@@ -13,6 +16,7 @@ class MemoryManager:
         directory = self.agent_memory_dir if is_agent else self.fallback_memory_dir
         return os.path.join(directory, f'{name}_memory.json')
 
+    @traced('memory.get')
     def get(self, name: str, user_input: str, is_agent: bool = True) -> Optional[Any]:
         """Retrieve answer from memory for a given agent/provider and user input."""
         path = self._get_memory_path(name, is_agent)
@@ -22,6 +26,7 @@ class MemoryManager:
             data = json.load(f)
         return data.get(user_input)
 
+    @traced('memory.set')
     def set(self, name: str, user_input: str, answer: Any, is_agent: bool = True):
         """Store answer in memory for a given agent/provider and user input."""
         path = self._get_memory_path(name, is_agent)
@@ -33,7 +38,15 @@ class MemoryManager:
         data[user_input] = answer
         with open(path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+        if is_agent:
+            agent_accounting.set_footprint(name, memory_store=os.path.getsize(path), memory_entries=len(data))
 
+    def store_size(self, name: str, is_agent: bool = True) -> int:
+        """Size in bytes of the memory file for an agent/provider (0 if there is none)."""
+        path = self._get_memory_path(name, is_agent)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    @traced('memory.has')
     def has(self, name: str, user_input: str, is_agent: bool = True) -> bool:
         """Check if memory has an answer for a given agent/provider and user input."""
         path = self._get_memory_path(name, is_agent)
@@ -43,6 +56,7 @@ class MemoryManager:
             data = json.load(f)
         return user_input in data
 
+    @traced('memory.get_all')
     def get_all(self, name: str, is_agent: bool = True) -> dict:
         """Get all memory for a given agent/provider."""
         path = self._get_memory_path(name, is_agent)
@@ -50,3 +64,18 @@ class MemoryManager:
             return {}
         with open(path, 'r', encoding='utf-8') as f:
             return json.load(f)
+
+    async def _in_thread(self, func, *args, **kwargs):
+        return await to_thread(func, *args, **kwargs)
+
+    async def aget(self, name: str, user_input: str, is_agent: bool = True) -> Optional[Any]:
+        """Async twin of get(); file I/O runs off the event loop."""
+        return await self._in_thread(self.get, name, user_input, is_agent)
+
+    async def aset(self, name: str, user_input: str, answer: Any, is_agent: bool = True):
+        """Async twin of set()."""
+        await self._in_thread(self.set, name, user_input, answer, is_agent)
+
+    async def ahas(self, name: str, user_input: str, is_agent: bool = True) -> bool:
+        """Async twin of has()."""
+        return await self._in_thread(self.has, name, user_input, is_agent)
@@ -0,0 +1,348 @@
+"""
+Declarative agent pipelines.
+
+Pipelines are defined in pipelines.yaml (next to registry.yaml) as a DAG of
+stages. A stage starts as soon as everything it `needs` has finished, so
+independent branches run in parallel. When more stages are ready than
+`max_parallel` allows, the ones with the longest estimated path to the end of
+the pipeline go first, which keeps the critical path short. Estimates come from
+the timings of earlier runs.
+
+Stage prompts are templates: {input} is the pipeline input and {<stage id>} is
+that stage's output. Stages marked `cache: true` go through the shared response
+cache, keyed by pipeline, stage and agent; failed stages are never cached.
+Tokens from `dispatch` stages are relayed to the caller as they arrive.
+"""
+import asyncio
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import yaml
+
+from dispatcher.aio import to_thread
+from dispatcher.cache import UNCACHEABLE_AGENT_TYPES, response_cache
+from dispatcher.streaming import result_text
+
+PIPELINES_YAML = os.path.join(os.path.dirname(__file__), 'pipelines.yaml')
+
+DEFAULT_ESTIMATE_MS = 1000.0
+_PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+Emit = Callable[[Dict], Awaitable[None]]
+
+
+# stage runners: async (stage, prompt, emit) -> output text
+
+async def _run_agent_stage(stage: Dict, prompt: str, emit: Emit) -> str:
+    from ai.server.mcp.dispatcher import run_agent_async
+    result = await run_agent_async(stage['agent'], prompt=prompt, **stage.get('params', {}))
+    if result.get('agent_type') in UNCACHEABLE_AGENT_TYPES:
+        raise RuntimeError(f"agent {stage['agent']} failed: {result_text(result)}")
+    return result_text(result)
+
+
+async def _run_dispatch_stage(stage: Dict, prompt: str, emit: Emit) -> str:
+    from dispatcher.core import stream_dispatch_async
+    parts = []
+    request = {'prompt': prompt, 'agent': stage.get('agent'), **stage.get('params', {})}
+    async for event in stream_dispatch_async(request):
+        if event['type'] == 'token':
+            parts.append(event['token'])
+            await emit({'type': 'token', 'stage': stage['id'], 'token': event['token']})
+        elif event['type'] == 'error':
+            raise RuntimeError(event.get('error') or 'dispatch failed')
+    return ''.join(parts)
+
+
+def _synthesize(text: str, voice_id: Optional[str]) -> str:
+    from ai.voice.voice_handler import generate_speech
+    audio = generate_speech(text, voice_id)
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as f:
+        f.write(audio)
+        return f.name
+
+
+async def _run_tts_stage(stage: Dict, prompt: str, emit: Emit) -> str:
+    return await to_thread(_synthesize, prompt, stage.get('params', {}).get('voice_id'))
+
+
+STAGE_RUNNERS: Dict[str, Callable[[Dict, str, Emit], Awaitable[str]]] = {
+    'agent': _run_agent_stage,
+    'dispatch': _run_dispatch_stage,
+    'tts': _run_tts_stage,
+}
+
+
+class StageTimings:
+    """Moving average of stage durations, used to plan later runs"""
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self._averages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(stage: Dict) -> str:
+        return f"{stage['kind']}:{stage.get('agent') or ''}"
+
+    def estimate(self, stage: Dict) -> float:
+        with self._lock:
+            return self._averages.get(self.key(stage), stage.get('estimate_ms', DEFAULT_ESTIMATE_MS))
+
+    def record(self, stage: Dict, duration_ms: float):
+        key = self.key(stage)
+        with self._lock:
+            previous = self._averages.get(key)
+            self._averages[key] = duration_ms if previous is None else \
+                previous + self.alpha * (duration_ms - previous)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {k: round(v, 2) for k, v in self._averages.items()}
+
+
+stage_timings = StageTimings()
+
+
+def render(template: str, values: Dict[str, str]) -> str:
+    """Fill {input}/{stage} placeholders, leaving any other braces (e.g. code) alone"""
+    return _PLACEHOLDER.sub(lambda m: values.get(m.group(1), m.group(0)), template)
+
+
+class Pipeline:
+    def __init__(self, name: str, stages: List[Dict], description: str = '', output: str = None):
+        self.name = name
+        self.description = description
+        self.stages: Dict[str, Dict] = {}
+        if not stages:
+            raise ValueError(f"Pipeline {name} has no stages")
+        for stage in stages:
+            stage = dict(stage)
+            if 'id' not in stage:
+                raise ValueError(f"Pipeline {name}: every stage needs an id")
+            if stage['id'] in self.stages or stage['id'] == 'input':
+                raise ValueError(f"Pipeline {name}: duplicate or reserved stage id {stage['id']}")
+            stage.setdefault('kind', 'agent')
+            stage['needs'] = list(stage.get('needs') or [])
+            if stage['kind'] not in STAGE_RUNNERS:
+                raise ValueError(f"Pipeline {name}: unknown stage kind {stage['kind']}")
+            self.stages[stage['id']] = stage
+        for stage in self.stages.values():
+            missing = [n for n in stage['needs'] if n not in self.stages]
+            if missing:
+                raise ValueError(f"Pipeline {name}: stage {stage['id']} needs unknown {missing}")
+        self.order = self._topological_order()
+        sinks = [sid for sid in self.order if not self.dependents(sid)]
+        self.output = output or sinks[-1]
+        if self.output not in self.stages:
+            raise ValueError(f"Pipeline {name}: unknown output stage {self.output}")
+
+    @classmethod
+    def from_spec(cls, spec: Dict) -> 'Pipeline':
+        return cls(spec['name'], spec.get('stages') or [], spec.get('description', ''), spec.get('output'))
+
+    def dependents(self, stage_id: str) -> List[str]:
+        return [sid for sid, s in self.stages.items() if stage_id in s['needs']]
+
+    def _topological_order(self) -> List[str]:
+        pending = {sid: set(s['needs']) for sid, s in self.stages.items()}
+        order = []
+        while pending:
+            ready = [sid for sid, needs in pending.items() if not needs]
+            if not ready:
+                raise ValueError(f"Pipeline {self.name}: cycle between {sorted(pending)}")
+            for sid in ready:
+                order.append(sid)
+                del pending[sid]
+            for needs in pending.values():
+                needs.difference_update(ready)
+        return order
+
+    # planning
+
+    def plan(self, timings: StageTimings = None) -> Dict:
+        """Estimated critical path and, per stage, the longest path from it to the end"""
+        timings = timings or stage_timings
+        estimates = {sid: timings.estimate(s) for sid, s in self.stages.items()}
+        ranks: Dict[str, float] = {}
+        for sid in reversed(self.order):
+            ranks[sid] = estimates[sid] + max((ranks[d] for d in self.dependents(sid)), default=0.0)
+        path, current = [], max(
+            (sid for sid in self.order if not self.stages[sid]['needs']), key=ranks.get
+        )
+        while current:
+            path.append(current)
+            current = max(self.dependents(current), key=ranks.get, default=None)
+        return {
+            'critical_path': path,
+            'estimated_ms': round(ranks[path[0]], 2),
+            'ranks': {sid: round(r, 2) for sid, r in ranks.items()},
+        }
+
+    def describe(self) -> Dict:
+        return {
+            'name': self.name,
+            'description': self.description,
+            'output': self.output,
+            'stages': [
+                {k: self.stages[sid][k] for k in ('id', 'kind', 'agent', 'needs') if k in self.stages[sid]}
+                for sid in self.order
+            ],
+            'plan': self.plan(),
+        }
+
+    # execution
+
+    def _prompt(self, stage: Dict, outputs: Dict[str, str]) -> str:
+        if 'input' in stage:
+            return render(stage['input'], outputs)
+        if stage['needs']:
+            return '\n\n'.join(outputs[n] for n in stage['needs'])
+        return outputs['input']
+
+    async def _run_stage(self, stage: Dict, prompt: str, emit: Emit) -> Dict:
+        runner = STAGE_RUNNERS[stage['kind']]
+        ran = False
+
+        async def call():
+            nonlocal ran
+            ran = True
+            return await runner(stage, prompt, emit)
+
+        start = time.perf_counter()
+        if stage.get('cache'):
+            request = {
+                'prompt': prompt,
+                'agent': stage.get('agent'),
+                'pipeline': self.name,
+                'stage': stage['id'],
+                'kind': stage['kind'],
+                'params': stage.get('params', {}),
+            }
+            output = await response_cache.fetch('pipeline', request, call)
+        else:
+            output = await call()
+        duration_ms = (time.perf_counter() - start) * 1000
+        if ran:
+            stage_timings.record(stage, duration_ms)
+        return {'output': output, 'duration_ms': round(duration_ms, 2), 'cached': not ran}
+
+    async def events(self, text: str, max_parallel: int = 4, timeout: float = 120) -> AsyncIterator[Dict]:
+        """Run the pipeline, yielding plan, stage_start/token/stage_done events and a final done/error"""
+        plan = self.plan()
+        ranks = plan['ranks']
+        yield {'type': 'plan', 'pipeline': self.name, **plan}
+
+        start = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        outputs = {'input': text}
+        timings: Dict[str, Dict] = {}
+        waiting = {sid: set(s['needs']) for sid, s in self.stages.items()}
+        ready: List[str] = []
+        running: Dict[str, asyncio.Task] = {}
+        queue: "asyncio.Queue[Dict]" = asyncio.Queue()
+
+        async def stage_task(sid: str):
+            try:
+                result = await self._run_stage(self.stages[sid], self._prompt(self.stages[sid], outputs), queue.put)
+                await queue.put({'type': '_finished', 'stage': sid, **result})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await queue.put({'type': '_failed', 'stage': sid, 'error': str(e) or type(e).__name__})
+
+        def schedule():
+            for sid in [s for s, needs in waiting.items() if not needs]:
+                del waiting[sid]
+                ready.append(sid)
+            ready.sort(key=ranks.get)
+            new_events = []
+            while ready and len(running) < max_parallel:
+                sid = ready.pop()
+                running[sid] = asyncio.ensure_future(stage_task(sid))
+                timings[sid] = {'started_ms': round((time.perf_counter() - start) * 1000, 2)}
+                new_events.append({'type': 'stage_start', 'stage': sid})
+            return new_events
+
+        try:
+            for event in schedule():
+                yield event
+            while running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                event = await asyncio.wait_for(queue.get(), remaining)
+                if event['type'] == '_failed':
+                    running.pop(event['stage'])
+                    yield {'type': 'error', 'stage': event['stage'], 'error': event['error'],
+                           'timings': timings}
+                    return
+                if event['type'] != '_finished':
+                    yield event
+                    continue
+                sid = event['stage']
+                running.pop(sid)
+                outputs[sid] = event['output']
+                timings[sid].update(duration_ms=event['duration_ms'], cached=event['cached'])
+                yield {'type': 'stage_done', 'stage': sid, 'output': event['output'],
+                       'duration_ms': event['duration_ms'], 'cached': event['cached']}
+                for needs in waiting.values():
+                    needs.discard(sid)
+                for new_event in schedule():
+                    yield new_event
+        except asyncio.TimeoutError:
+            yield {'type': 'error', 'error': f'pipeline deadline of {timeout:g}s exceeded', 'timings': timings}
+            return
+        finally:
+            for task in running.values():
+                task.cancel()
+
+        yield {
+            'type': 'done',
+            'pipeline': self.name,
+            'output': outputs[self.output],
+            'outputs': {sid: outputs[sid] for sid in self.order},
+            'timings': timings,
+            'critical_path': plan['critical_path'],
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    async def run(self, text: str, max_parallel: int = 4, timeout: float = 120) -> Dict:
+        """Run to completion and return the final done/error event"""
+        last = None
+        async for event in self.events(text, max_parallel, timeout):
+            last = event
+        return last
+
+
+# path -> (mtime, pipelines)
+_loaded: Dict[str, tuple] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_pipelines(path: str = PIPELINES_YAML) -> Dict[str, Pipeline]:
+    """Parse a pipelines file, re-reading it only when it changes"""
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    with _loaded_lock:
+        cached = _loaded.get(path)
+        if cached and cached[0] == mtime:
+            return dict(cached[1])
+    spec = {}
+    if mtime is not None:
+        with open(path, 'r', encoding='utf-8') as f:
+            spec = yaml.safe_load(f) or {}
+    pipelines = {p['name']: Pipeline.from_spec(p) for p in spec.get('pipelines') or []}
+    with _loaded_lock:
+        _loaded[path] = (mtime, pipelines)
+    return dict(pipelines)
+
+
+def get_pipeline(name: str) -> Pipeline:
+    pipelines = load_pipelines()
+    if name not in pipelines:
+        raise ValueError(f"Pipeline {name} not found")
+    return pipelines[name]
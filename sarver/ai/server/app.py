@@ -1,40 +1,56 @@
-from flask import Flask, jsonify, request, send_file, render_template
+from flask import Flask, jsonify, request, send_file, render_template, Response
 from flask_cors import CORS
 import os
 import time
 import sys
 import pyttsx3
 import tempfile
-import psutil
 import json
+from collections import deque
 from datetime import datetime
 from ai.agents.registry import AgentRegistry
+from ai.agents.executor import get_executor
+from ai.agents.jobs import QueueFullError, GATHER_ALL
+from ai.server.mcp.intent_classifier import intent_classifier
+from ai.server.mcp.intent_router import intent_router
 from ai.agents.store.provider_store import ProviderStore
+from dispatcher.accounting import agent_accounting
+from dispatcher.aio import iter_sync, run_sync
+from dispatcher.singleflight import singleflight_stats
+from dispatcher.cache import response_cache
+from dispatcher.ratelimit import rate_limiter
+from dispatcher.context import context_manager
+from dispatcher.sessions import session_store
+from dispatcher.system_stats import system_sampler
+from dispatcher.timeseries import query_args, timeseries
+from dispatcher.metrics import instrument_flask
+from dispatcher.tracing import trace_flask, tracer
+from dispatcher.streaming import (
+    SSE, STREAM_HEADERS, STREAM_MIMETYPES, encode_events, get_stream_mode, measure_stream, stream_metrics
+)
 
 app = Flask(__name__, template_folder='../../templates')
 CORS(app)  # Enable CORS for admin panel integration
+instrument_flask(app, "ai_server")  # GET /metrics
+trace_flask(app, "ai_server")  # Server-Timing header, traces in the admin dashboard
 
 # Global variables for monitoring
-latency_log = []
+latency_log = deque(maxlen=100)  # recent calls for display; history is in dispatcher.timeseries
 agents_status = {}
 system_stats = {}
 
 def update_system_stats():
-    """Update system statistics"""
+    """Latest sample from the background sampler; never blocks the request"""
     global system_stats
-    ram = psutil.virtual_memory()
-    cpu = psutil.cpu_percent(interval=0.5)
-    disk = psutil.disk_usage('/')
-    
-    system_stats = {
-        "ram_percent": ram.percent,
-        "ram_total_gb": round(ram.total / (1024**3), 2),
-        "ram_available_gb": round(ram.available / (1024**3), 2),
-        "cpu_percent": cpu,
-        "disk_percent": disk.percent,
-        "disk_total_gb": round(disk.total / (1024**3), 2),
-        "disk_free_gb": round(disk.free / (1024**3), 2),
-        "timestamp": datetime.now().isoformat()
+    system_stats = system_sampler.snapshot()
+
+def agent_usage(agent_name):
+    """Calls, latency percentiles, CPU time and footprint from dispatcher.accounting"""
+    usage = agent_accounting.snapshot(agent_name) or {}
+    return {
+        "last_used": usage.get("last_used"),
+        "memory_usage": usage.get("memory_usage", "N/A"),
+        "stats": usage or None
     }
 
 def update_agent_status():
@@ -44,20 +60,37 @@ def update_agent_status():
         for agent_name in AgentRegistry._agents.keys():
             try:
                 agent = AgentRegistry.get_agent(agent_name)
-                agents_status[agent_name] = {
-                    "status": "active",
-                    "last_used": datetime.now().isoformat(),
-                    "memory_usage": "0KB"  # Placeholder
-                }
+                agents_status[agent_name] = {"status": "active", **agent_usage(agent_name)}
             except Exception as e:
-                agents_status[agent_name] = {
-                    "status": f"disabled: {str(e)}",
-                    "last_used": None,
-                    "memory_usage": "0KB"
-                }
+                agents_status[agent_name] = {"status": f"disabled: {str(e)}", **agent_usage(agent_name)}
     except Exception as e:
         print(f"Error updating agent status: {e}")
 
+@app.route("/api/traces")
+def get_traces():
+    """Recent request traces of this server, newest first (?limit=&min_ms=&name=)"""
+    return jsonify({
+        "traces": tracer.recent(request.args.get("limit", 50, type=int), request.args.get("min_ms", 0, type=float),
+                                request.args.get("name")),
+        "stats": tracer.stats()
+    })
+
+@app.route("/api/traces/<trace_id>")
+def get_trace(trace_id):
+    """One trace as a span tree"""
+    trace = tracer.get(trace_id)
+    if trace is None:
+        return jsonify({"error": "Trace not found"}), 404
+    return jsonify(trace)
+
+@app.route("/api/timeseries")
+def get_timeseries():
+    """Series names, or ?series=<name>&start=&end=&resolution=1s|1m|1h rollups (min/max/avg/p95)"""
+    try:
+        return jsonify(query_args(timeseries, request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route("/api/status")
 def status():
     """Enhanced status endpoint for admin panel"""
@@ -74,10 +107,20 @@ def status():
     
     return jsonify({
         "dispatcher_active": True,
-        "latency_log": latency_log[-10:],  # Last 10 entries
+        "latency_log": list(latency_log)[-10:],  # Last 10 entries
         "agents_status": agents_status,
         "fallback_info": fallback_info,
         "system": system_stats,
+        "stream_metrics": stream_metrics.snapshot(),
+        "singleflight": singleflight_stats(),
+        "response_cache": response_cache.stats(),
+        "rate_limits": rate_limiter.snapshot(),
+        "context": context_manager.stats(),
+        "sessions": session_store.stats(),
+        "intent_router": intent_router.stats(),
+        "intent_classifier": intent_classifier.stats(),
+        "jobs": get_executor().jobs.stats(),
+        "agent_usage": agent_accounting.stats(),
         "server_info": {
             "port": 8000,
             "uptime": time.time(),
@@ -111,7 +154,7 @@ def get_agent_status(agent_name):
             "agent": agent_name,
             "status": "active",
             "config": agent.config if hasattr(agent, 'config') else {},
-            "memory_usage": "0KB"
+            **agent_usage(agent_name)
         })
     except Exception as e:
         return jsonify({
@@ -129,12 +172,22 @@ def dispatch():
     if not agent_name or not text:
         return jsonify({"error": "Missing agent or text"}), 400
 
+    stream_mode = get_stream_mode(data, request.headers.get("Accept"))
+    if stream_mode:
+        from ai.server.mcp.dispatcher import stream_agent_async
+        events = iter_sync(measure_stream(stream_agent_async(agent_name, prompt=text), "local", agent_name,
+                                          chunked=False))
+        return Response(
+            encode_events(events, stream_mode),
+            mimetype=STREAM_MIMETYPES[stream_mode],
+            headers=STREAM_HEADERS
+        )
+
     start_time = time.time()
     
     try:
         # Import dispatcher
-        sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../server/mcp')))
-        from dispatcher import run_agent
+        from ai.server.mcp.dispatcher import run_agent
         
         result = run_agent(agent_name, prompt=text)
         
@@ -145,10 +198,10 @@ def dispatch():
             "latency_ms": round(latency, 2),
             "agent": agent_name
         })
-        
-        # Keep only last 100 entries
-        if len(latency_log) > 100:
-            latency_log.pop(0)
+        timeseries.record("ai_server.latency_ms", latency)
+        # unroutable task names share one series instead of minting a new one each
+        series_agent = "unknown" if result.get("agent_type") == "unknown" else agent_name
+        timeseries.record(f"ai_server.latency_ms.{series_agent}", latency)
         
         return jsonify({
             "success": True,
@@ -165,6 +218,7 @@ def dispatch():
             "agent": agent_name,
             "error": str(e)
         })
+        timeseries.record("ai_server.errors", 1)
         
         return jsonify({
             "success": False,
@@ -172,6 +226,141 @@ def dispatch():
             "latency_ms": round(latency, 2)
         }), 500
 
+@app.route("/api/jobs", methods=["POST"])
+def submit_job():
+    """Queue an agent job and return its id straight away"""
+    data = request.get_json() or {}
+    agent_name = data.get("agent")
+    text = data.get("text") or data.get("message")
+
+    if not agent_name or not text:
+        return jsonify({"error": "Missing agent or text"}), 400
+
+    try:
+        job = get_executor().submit(
+            agent_name, text,
+            user_role=data.get("user_role", "user"),
+            priority=data.get("priority", "interactive"),
+            deadline=data.get("deadline")
+        )
+    except QueueFullError as e:
+        return jsonify({"success": False, "error": str(e)}), 429, {"Retry-After": "1"}
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    return jsonify({"success": True, "job": job.to_dict()}), 202
+
+@app.route("/api/agents/gather", methods=["POST"])
+def gather_agents():
+    """Scatter tasks across agents and gather them with an all/first/first_n/quorum policy"""
+    data = request.get_json() or {}
+    tasks = data.get("tasks") or []
+
+    if not tasks or any(not t.get("agent") or not t.get("message") for t in tasks):
+        return jsonify({"error": "tasks must be a list of {agent, message}"}), 400
+
+    try:
+        events = get_executor().scatter_gather(
+            tasks,
+            policy=data.get("policy", GATHER_ALL),
+            n=data.get("n"),
+            user_role=data.get("user_role", "user"),
+            priority=data.get("priority", "interactive"),
+            timeout=float(data.get("deadline", 30))
+        )
+    except QueueFullError as e:
+        return jsonify({"success": False, "error": str(e)}), 429, {"Retry-After": "1"}
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    stream_mode = get_stream_mode(data, request.headers.get("Accept"))
+    if stream_mode:
+        return Response(
+            encode_events(events, stream_mode),
+            mimetype=STREAM_MIMETYPES[stream_mode],
+            headers=STREAM_HEADERS
+        )
+
+    results = list(events)
+    summary = results.pop()
+    return jsonify({"success": summary["satisfied"], "results": results, **summary})
+
+@app.route("/api/pipelines")
+def get_pipelines():
+    """List pipelines from ai/agents/pipelines.yaml with their current plan"""
+    from ai.agents.pipeline import load_pipelines, stage_timings
+    try:
+        pipelines = load_pipelines()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    return jsonify({
+        "success": True,
+        "pipelines": [p.describe() for p in pipelines.values()],
+        "stage_timings": stage_timings.snapshot()
+    })
+
+@app.route("/api/pipelines/<name>/run", methods=["POST"])
+def run_pipeline(name):
+    """Run a pipeline; stream=true streams stage events and tokens"""
+    from ai.agents.pipeline import get_pipeline
+    data = request.get_json() or {}
+    text = data.get("input") or data.get("text")
+
+    if not text:
+        return jsonify({"error": "Missing input"}), 400
+
+    try:
+        pipeline = get_pipeline(name)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+
+    max_parallel = int(data.get("max_parallel", 4))
+    timeout = float(data.get("deadline", 120))
+    stream_mode = get_stream_mode(data, request.headers.get("Accept"))
+    if stream_mode:
+        return Response(
+            encode_events(iter_sync(pipeline.events(text, max_parallel, timeout)), stream_mode),
+            mimetype=STREAM_MIMETYPES[stream_mode],
+            headers=STREAM_HEADERS
+        )
+
+    result = run_sync(pipeline.run(text, max_parallel, timeout))
+    success = result["type"] == "done"
+    return jsonify({"success": success, **result}), 200 if success else 500
+
+@app.route("/api/jobs/<job_id>")
+def get_job(job_id):
+    """Poll a job; ?wait=N long-polls for up to N seconds"""
+    job = get_executor().get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    wait = request.args.get("wait", type=float)
+    if wait:
+        job.wait(min(wait, 30))
+    return jsonify({"success": True, "job": job.to_dict()})
+
+@app.route("/api/jobs/<job_id>/stream")
+def stream_job(job_id):
+    """Stream a job's status changes and final result (SSE by default)"""
+    job = get_executor().get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    stream_mode = get_stream_mode(request.args, request.headers.get("Accept")) or SSE
+    return Response(
+        encode_events(job.events(), stream_mode),
+        mimetype=STREAM_MIMETYPES[stream_mode],
+        headers=STREAM_HEADERS
+    )
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    job = get_executor().get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    cancelled = job.cancel()
+    return jsonify({"success": cancelled, "job": job.to_dict()})
+
 @app.route("/api/voice_chat", methods=["POST"])
 def voice_chat():
     """Voice chat endpoint"""
@@ -184,8 +373,7 @@ def voice_chat():
     
     try:
         # Get agent response
-        sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../server/mcp')))
-        from dispatcher import run_agent
+        from ai.server.mcp.dispatcher import run_agent
         result = run_agent(agent, prompt=text)
         
         # Text-to-speech
@@ -9,7 +9,9 @@ class AdminHandler:
             "system status": self.get_system_status,
             "reload providers": self.reload_providers,
             "check health": self.check_system_health,
-            "clear cache": self.clear_system_cache
+            "clear cache": self.clear_system_cache,
+            "memory snapshot": self.memory_snapshot,
+            "memory diff": self.memory_diff
         }
         self.admin_tokens = self._load_admin_tokens()
         
@@ -78,11 +80,22 @@ class AdminHandler:
     def clear_system_cache(self) -> Dict:
         """Clear system cache"""
         try:
-            # Implement cache clearing logic
+            from dispatcher.cache import response_cache
+            response_cache.clear()
             return {"result": "System cache cleared successfully"}
         except Exception as e:
             return {"error": f"Failed to clear cache: {str(e)}"}
             
+    def memory_snapshot(self) -> Dict:
+        """Allocated memory per module (starts tracemalloc); the baseline for memory diff"""
+        from dispatcher.profiling import memory_tracker
+        return {"result": memory_tracker.snapshot()}
+
+    def memory_diff(self) -> Dict:
+        """Memory growth per module since the last memory snapshot"""
+        from dispatcher.profiling import memory_tracker
+        return {"result": memory_tracker.diff()}
+
     def _get_provider_status(self) -> Dict:
         """Get status of all providers"""
         # Implement provider status check
@@ -90,13 +103,13 @@ class AdminHandler:
         
     def _get_cache_size(self) -> int:
         """Get current cache size"""
-        # Implement cache size check
-        return 0
+        from dispatcher.cache import response_cache
+        return response_cache.size()
         
     def _get_active_sessions(self) -> int:
         """Get number of active sessions"""
-        # Implement session counting
-        return 0
+        from dispatcher.sessions import session_store
+        return session_store.active_count()
         
     def _get_cpu_usage(self) -> float:
         """Get current CPU usage"""
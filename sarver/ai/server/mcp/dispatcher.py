@@ -2,6 +2,7 @@ from flask import Flask, request, jsonify, send_file
 import yaml
 import json
 import os
+import importlib.util
 import time
 import threading
 from typing import Dict, Optional
@@ -15,6 +16,17 @@ from utils import load_agent_config, generate_prompt
 from blog_writer_bn import generate_blog
 from helpers import load_yaml_config
 from .fallback_router import get_fallback_model
+from .intent_classifier import intent_classifier
+from .intent_router import intent_router
+from dispatcher.aio import run_sync, to_thread
+from dispatcher.streaming import result_text
+from dispatcher.singleflight import get_group, request_key
+from dispatcher.cache import response_cache
+from dispatcher.ratelimit import rate_limiter
+from dispatcher.deadline import deadline_scope, retry_call, retry_policy
+from dispatcher.accounting import agent_accounting
+from dispatcher.metrics import DISPATCH_SECONDS, PROVIDER_CALL_SECONDS
+from dispatcher.tracing import span
 
 # Load tool registry
 REGISTRY_PATH = os.path.join(os.path.dirname(__file__), '../config/registry.json')
@@ -24,7 +36,11 @@ with open(REGISTRY_PATH, encoding='utf-8') as f:
 # Provider loader
 PROVIDERS_BASE = os.path.join(os.path.dirname(__file__), '../config/providers')
 
+_provider_modules = {}
+
 def load_provider_module(provider_id):
+    if provider_id in _provider_modules:
+        return _provider_modules[provider_id]
     provider_dir = os.path.join(PROVIDERS_BASE, provider_id)
     provider_py = os.path.join(provider_dir, 'provider.py')
     if not os.path.exists(provider_py):
@@ -32,24 +48,83 @@ def load_provider_module(provider_id):
     spec = importlib.util.spec_from_file_location(f"provider_{provider_id}", provider_py)
     module = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(module)
+    _provider_modules[provider_id] = module
     return module
 
-def run_tool_with_fallback(tool_name, input_text):
+async def _call_tool_provider(provider, input_text, provider_id):
+    start = time.perf_counter()
+    status = 'error'
+    try:
+        with span(f'provider.{provider_id}'):
+            if hasattr(provider, 'arun'):
+                result = await provider.arun(input_text)
+            else:
+                result = await to_thread(provider.run, input_text)
+        status = 'error' if isinstance(result, dict) and result.get('error') else 'ok'
+        return result
+    finally:
+        PROVIDER_CALL_SECONDS.labels(provider_id, status).observe(time.perf_counter() - start)
+
+async def run_tool_with_fallback_async(tool_name, input_text):
     providers = TOOL_REGISTRY.get(tool_name, [])
-    for provider_id in providers:
-        try:
-            provider = load_provider_module(provider_id)
-            return provider.run(input_text)
-        except Exception as e:
-            print(f"[Fallback Warning] {provider_id} failed: {e}")
+    with deadline_scope(retry_policy.timeout_seconds) as deadline:
+        for provider_id in providers:
+            try:
+                provider = load_provider_module(provider_id)
+                request = {'prompt': input_text, 'tool': tool_name}
+                return await response_cache.fetch(
+                    provider_id, request,
+                    lambda: retry_call(
+                        lambda: rate_limiter.call(provider_id, request, lambda: _call_tool_provider(provider, input_text, provider_id)),
+                        retry_policy, deadline
+                    )
+                )
+            except Exception as e:
+                print(f"[Fallback Warning] {provider_id} failed: {e}")
     return {"error": f"❌ সব fallback provider ব্যর্থ হয়েছে: {tool_name}"}
 
+def run_tool_with_fallback(tool_name, input_text):
+    return run_sync(run_tool_with_fallback_async(tool_name, input_text))
+
 def instruct_agent(prompt, model=None, **kwargs):
     return {"result": f"[Instruct] {prompt} (model: {model})"}
 
-def run_agent(task_type, **kwargs):
+async def _process_with_agent(agent_name, prompt):
+    from ai.agents.registry import AgentRegistry
+    with span('agent.process', agent=agent_name):
+        agent = await to_thread(AgentRegistry.get_agent, agent_name)
+        if hasattr(agent, 'process_message_async'):
+            return await agent.process_message_async(prompt)
+        return await to_thread(agent.process_message, prompt)
+
+def _sms_reply(prompt):
+    from ai.agents.sms_reply_agent import SMSReplyAgent
+    agent = SMSReplyAgent()
+    return agent.process(prompt)
+
+agent_flight = get_group('run_agent')
+
+async def run_agent_async(task_type, **kwargs):
+    """Identical concurrent prompts to the same agent share one execution"""
+    params = {k: v for k, v in kwargs.items() if k not in ('prompt', 'model')}
+    key = request_key(task_type, kwargs.get('model'), kwargs.get('prompt'), params)
+    start = time.perf_counter()
+    agent, status = task_type, 'error'
+    try:
+        with span('run_agent', agent=task_type):
+            result = await agent_flight.do(key, lambda: _run_agent_async(task_type, **kwargs))
+        if result.get('agent_type') == 'unknown':
+            agent = 'unknown'  # keep arbitrary task names out of the metric labels
+        status = 'error' if result.get('agent_type') in ('error', 'unknown') else 'ok'
+        return result
+    finally:
+        elapsed = time.perf_counter() - start
+        DISPATCH_SECONDS.labels(agent, 'local', status).observe(elapsed)
+        agent_accounting.record(agent, elapsed, error=status != 'ok')
+
+async def _run_agent_async(task_type, **kwargs):
     if task_type == "blog_writer_bn":
-        return {"result": generate_blog(**kwargs), "agent_type": "blog_writer_bn"}
+        return {"result": await to_thread(generate_blog, **kwargs), "agent_type": "blog_writer_bn"}
     if task_type == "instruct":
         return {"result": instruct_agent(**kwargs)["result"], "agent_type": "instruct"}
     if task_type == "girlfriend-gpt":
@@ -63,57 +138,52 @@ def run_agent(task_type, **kwargs):
             reply = f"তুমি বলো, '{prompt}'—আমি শুনছি!"
         return {"result": reply, "agent_type": "girlfriend-gpt"}
     if task_type == "sms_reply":
-        from ai.agents.sms_reply_agent import SMSReplyAgent
-        agent = SMSReplyAgent()
         prompt = kwargs.get('prompt', '')
-        reply = agent.process(prompt)
+        reply = await to_thread(_sms_reply, prompt)
         return {"result": reply['result'], "agent_type": "sms_reply"}
     if task_type == "mcp":
         prompt = kwargs.get('prompt', '')
-        msg = prompt.lower()
-        # Contextual answer for Laravel/Spatie permission error
-        if (
-            "spatie" in msg or "permission" in msg or "role" in msg or "unauthorizedexception" in msg or
-            "user does not have the right roles" in msg
-        ):
-            return {
-                "result": (
-                    "আপনার error: 'User does not have the right roles...' মানে ইউজারের কাছে প্রয়োজনীয় role/permission নেই। "
-                    "সমাধান:\n"
-                    "১. ইউজারকে প্রয়োজনীয় role/permission অ্যাসাইন করুন (assignRole/givePermissionTo)।\n"
-                    "২. কোডে role/permission চেক করুন (hasRole/can)।\n"
-                    "৩. ডাটাবেস ও config/permission.php ফাইল চেক করুন।\n"
-                    "৪. Seeder দিয়ে role/permission তৈরি করুন।\n"
-                    "আরো নির্দিষ্ট error বা কোড দিলে আরও বিস্তারিত সাহায্য করতে পারব।"
-                ),
-                "agent_type": "mcp-contextual"
-            }
-        # Fallback to agent selection
-        from ai.agents.registry import AgentRegistry
+        # Routing rules live in ai/config/intent_routes.yaml
+        with span('route.intent'):
+            route = intent_router.route(prompt)
+        if route.get("response") is not None:
+            return {"result": route["response"], "agent_type": route["agent_type"]}
+        # the local classifier picks the agent when confident; otherwise the keyword rules do
+        with span('route.classifier'):
+            predicted = intent_classifier.predict(prompt)
         try:
-            if any(word in prompt.lower() for word in ["কোড", "code", "python", "bug", "debug"]):
-                agent = AgentRegistry.get_agent("procoder")
-                agent_type = "procoder"
-            elif any(word in prompt.lower() for word in ["ব্লগ", "blog", "লিখ", "write"]):
-                agent = AgentRegistry.get_agent("blog_writer_bn")
-                agent_type = "blog_writer_bn"
-            else:
-                agent = AgentRegistry.get_agent("creative_writer")
-                agent_type = "creative_writer"
-            reply = agent.process_message(prompt)
+            agent_type = predicted["agent"] if predicted else route["agent"]
+            reply = await _process_with_agent(agent_type, prompt)
             return {"result": reply, "agent_type": agent_type}
         except Exception as e:
             return {"result": f"[ERROR] {str(e)}", "agent_type": "error"}
     # fallback
     return {"result": "Sorry, I could not process your request.", "agent_type": "unknown"}
 
-def run_task_with_fallback(task_type, user_input):
-    config = load_yaml_config("blog_writer_bn")
+def run_agent(task_type, **kwargs):
+    return run_sync(run_agent_async(task_type, **kwargs))
+
+async def stream_agent_async(task_type, **kwargs):
+    """Token stream for an agent reply.
+
+    The MCP agents answer locally without a streaming provider, so the reply
+    arrives as one chunk; wrap it with dispatcher.streaming.measure_stream(...,
+    chunked=False) for events and timings without a meaningless TTFT.
+    """
+    result = await run_agent_async(task_type, **kwargs)
+    yield result_text(result)
+
+async def run_task_with_fallback_async(task_type, user_input):
+    with span('config.load_yaml', config="blog_writer_bn"):
+        config = await to_thread(load_yaml_config, "blog_writer_bn")
     try:
-        return run_agent(task_type, prompt=user_input, model=config["primary"])
+        return await run_agent_async(task_type, prompt=user_input, model=config["primary"])
     except Exception:
         fallback_model = get_fallback_model(config)
-        return run_agent(task_type, prompt=user_input, model=fallback_model)
+        return await run_agent_async(task_type, prompt=user_input, model=fallback_model)
+
+def run_task_with_fallback(task_type, user_input):
+    return run_sync(run_task_with_fallback_async(task_type, user_input))
 
 # Example usage (for test)
 if __name__ == "__main__":
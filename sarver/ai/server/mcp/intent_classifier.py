@@ -0,0 +1,284 @@
+"""
+Local intent classifier for run_agent('mcp').
+
+Prompts become hashed character n-gram counts (no vocabulary to store,
+Bengali and English handled alike), and a softmax linear model over those
+features picks the agent. Prediction is a gather-and-sum over the weight rows of
+the n-grams present, which takes well under a millisecond on CPU. The
+dispatcher only trusts predictions at or above `min_confidence`; anything less
+falls back to the keyword router (intent_router.py).
+
+Training data comes from labelled examples (JSON Lines of {"text", "agent"})
+and from logged traffic in logs/agent_activity.log. See
+scripts/train_intent_classifier.py and scripts/benchmark_intent_classifier.py.
+"""
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import yaml
+
+from .intent_router import INTENT_ROUTES_PATH
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..'))
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, 'storage/models/intent_classifier.npz')
+EXAMPLES_PATH = os.path.join(BASE_DIR, 'ai/config/intent_examples.jsonl')
+ACTIVITY_LOG = os.path.join(BASE_DIR, 'logs/agent_activity.log')
+
+DEFAULT_DIM = 2 ** 14
+DEFAULT_NGRAMS = (1, 4)
+
+
+def ngram_indices(text: str, dim: int = DEFAULT_DIM, ngrams: Tuple[int, int] = DEFAULT_NGRAMS) -> np.ndarray:
+    """Feature ids of every character n-gram in the padded, case-folded, whitespace-collapsed text"""
+    text = f" {' '.join((text or '').casefold().split())} "
+    encoded = [c.encode('utf-8') for c in text]
+    indices = []
+    for n in range(ngrams[0], ngrams[1] + 1):
+        for i in range(len(encoded) - n + 1):
+            # crc32 rather than hash(): stable across processes, so saved models stay valid
+            indices.append(zlib.crc32(b''.join(encoded[i:i + n]), n) % dim)
+    return np.asarray(indices, dtype=np.int64)
+
+
+def sparse_features(text: str, dim: int = DEFAULT_DIM,
+                    ngrams: Tuple[int, int] = DEFAULT_NGRAMS) -> Tuple[np.ndarray, np.ndarray]:
+    """(feature ids, L2-normalised counts) of one text"""
+    ids, counts = np.unique(ngram_indices(text, dim, ngrams), return_counts=True)
+    counts = counts.astype(np.float32)
+    counts /= max(float(np.linalg.norm(counts)), 1e-12)
+    return ids, counts
+
+
+def featurize(texts: Sequence[str], dim: int = DEFAULT_DIM,
+              ngrams: Tuple[int, int] = DEFAULT_NGRAMS) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Sparse rows, one (ids, values) pair per text; a dense matrix would cost dim * 4 bytes per example"""
+    return [sparse_features(text, dim, ngrams) for text in texts]
+
+
+def _gather_rows(rows: Sequence[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Concatenated ids and values of a mini-batch, plus the start offset of each row"""
+    ids = np.concatenate([r[0] for r in rows])
+    values = np.concatenate([r[1] for r in rows])
+    offsets = np.cumsum([0] + [len(r[0]) for r in rows[:-1]])
+    return ids, values, offsets
+
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    scores = scores - scores.max(axis=-1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class IntentClassifier:
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels: Sequence[str],
+                 dim: int = DEFAULT_DIM, ngrams: Tuple[int, int] = DEFAULT_NGRAMS):
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.labels = list(labels)
+        self.dim = dim
+        self.ngrams = tuple(ngrams)
+
+    @classmethod
+    def train(cls, texts: Sequence[str], labels: Sequence[str], dim: int = DEFAULT_DIM,
+              ngrams: Tuple[int, int] = DEFAULT_NGRAMS, epochs: int = 100, learning_rate: float = 5.0,
+              l2: float = 1e-4, batch_size: int = 256, seed: int = 0) -> 'IntentClassifier':
+        """Multinomial logistic regression by mini-batch gradient descent"""
+        classes = sorted(set(labels))
+        if len(classes) < 2:
+            raise ValueError("need examples for at least two agents")
+        targets = np.asarray([classes.index(label) for label in labels])
+        rows = featurize(texts, dim, ngrams)
+        onehot = np.eye(len(classes), dtype=np.float32)[targets]
+        weights = np.zeros((dim, len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(texts))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                ids, values, offsets = _gather_rows([rows[i] for i in batch])
+                # every row has at least the padding n-grams, so no segment is empty
+                scores = np.add.reduceat(values[:, None] * weights[ids], offsets, axis=0)
+                error = _softmax(scores + bias) - onehot[batch]
+                per_entry = np.repeat(error, np.diff(np.append(offsets, len(ids))), axis=0)
+                gradient = l2 * weights
+                np.add.at(gradient, ids, values[:, None] * per_entry / len(batch))
+                weights -= learning_rate * gradient
+                bias -= learning_rate * error.mean(axis=0)
+        return cls(weights, bias, classes, dim, ngrams)
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        ids, counts = sparse_features(text, self.dim, self.ngrams)
+        return _softmax(counts @ self.weights[ids] + self.bias)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """(agent, confidence)"""
+        proba = self.predict_proba(text)
+        best = int(proba.argmax())
+        return self.labels[best], float(proba[best])
+
+    def save(self, path: str = DEFAULT_MODEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp.npz'
+        np.savez_compressed(tmp_path, weights=self.weights, bias=self.bias, labels=np.asarray(self.labels),
+                            dim=self.dim, ngrams=np.asarray(self.ngrams))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> 'IntentClassifier':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['weights'], data['bias'], [str(label) for label in data['labels']],
+                       int(data['dim']), tuple(int(n) for n in data['ngrams']))
+
+
+def load_examples(path: str = EXAMPLES_PATH) -> List[Tuple[str, str]]:
+    """Labelled (text, agent) pairs from a JSON Lines file"""
+    examples = []
+    if not os.path.exists(path):
+        return examples
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                examples.append((record['text'], record['agent']))
+    return examples
+
+
+def load_activity_log(path: str = ACTIVITY_LOG, agents: Iterable[str] = None) -> List[Tuple[str, str]]:
+    """(prompt, agent) pairs from successful dispatches in agent_activity.log"""
+    agents = set(agents) if agents else None
+    examples = []
+    if not os.path.exists(path):
+        return examples
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            request = record.get('request') or {}
+            result = record.get('result')
+            prompt = request.get('prompt') or request.get('text')
+            agent = request.get('agent')
+            if not prompt or not agent or (isinstance(result, dict) and result.get('error')):
+                continue
+            if agents is None or agent in agents:
+                examples.append((prompt, agent))
+    return examples
+
+
+def split_examples(examples: Sequence[Tuple[str, str]], holdout: float = 0.2,
+                   seed: int = 0) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Shuffled (train, test) split"""
+    order = np.random.default_rng(seed).permutation(len(examples))
+    cut = len(examples) - max(1, int(len(examples) * holdout))
+    return [examples[i] for i in order[:cut]], [examples[i] for i in order[cut:]]
+
+
+def evaluate(model: IntentClassifier, examples: Sequence[Tuple[str, str]], min_confidence: float = 0.6,
+             fallback=None) -> Dict:
+    """
+    Accuracy and per-prompt latency on labelled examples.
+
+    `fallback(prompt) -> agent` (e.g. the keyword router) answers the prompts the
+    model isn't confident about, giving the accuracy of the combined routing.
+    """
+    latencies, correct, combined, confident = [], 0, 0, 0
+    for text, agent in examples:
+        start = time.perf_counter()
+        predicted, confidence = model.predict(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += predicted == agent
+        if confidence >= min_confidence:
+            confident += 1
+            combined += predicted == agent
+        elif fallback is not None:
+            combined += fallback(text) == agent
+    total = max(len(examples), 1)
+    latencies = np.asarray(latencies or [0.0])
+    report = {
+        'examples': len(examples),
+        'accuracy': round(correct / total, 4),
+        'confident': round(confident / total, 4),
+        'latency_ms': {
+            'p50': round(float(np.percentile(latencies, 50)), 4),
+            'p99': round(float(np.percentile(latencies, 99)), 4),
+            'max': round(float(latencies.max()), 4),
+        },
+    }
+    if fallback is not None:
+        report['fallback_accuracy'] = round(sum(fallback(t) == a for t, a in examples) / total, 4)
+        report['combined_accuracy'] = round(combined / total, 4)
+    return report
+
+
+def load_classifier_config(path: str = INTENT_ROUTES_PATH) -> Dict:
+    config = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config = (yaml.safe_load(f) or {}).get('classifier') or {}
+    config.setdefault('enabled', True)
+    config.setdefault('min_confidence', 0.6)
+    model = config.get('model') or DEFAULT_MODEL_PATH
+    config['model'] = model if os.path.isabs(model) else os.path.join(BASE_DIR, model)
+    return config
+
+
+class ClassifierRouter:
+    """Loads the trained model if there is one and tracks how often it is trusted"""
+
+    def __init__(self, config: Dict = None):
+        self.config = config or load_classifier_config()
+        self._model: Optional[IntentClassifier] = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.stats_counts = {'predictions': 0, 'confident': 0, 'fallbacks': 0, 'latency_ms_total': 0.0}
+
+    def model(self) -> Optional[IntentClassifier]:
+        path = self.config['model']
+        if not self.config.get('enabled') or not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._model, self._mtime = IntentClassifier.load(path), mtime
+        return self._model
+
+    def predict(self, prompt: str) -> Optional[Dict]:
+        """{'agent', 'confidence'} when the model is confident enough, else None"""
+        model = self.model()
+        if model is None:
+            return None
+        start = time.perf_counter()
+        agent, confidence = model.predict(prompt)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        confident = confidence >= self.config['min_confidence']
+        with self._lock:
+            self.stats_counts['predictions'] += 1
+            self.stats_counts['confident' if confident else 'fallbacks'] += 1
+            self.stats_counts['latency_ms_total'] += elapsed_ms
+        return {'agent': agent, 'confidence': round(confidence, 4)} if confident else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self.stats_counts)
+        predictions = counts.pop('predictions')
+        total = counts.pop('latency_ms_total')
+        return {
+            'loaded': self._model is not None,
+            'labels': self._model.labels if self._model else [],
+            'min_confidence': self.config['min_confidence'],
+            'predictions': predictions,
+            **counts,
+            'avg_latency_ms': round(total / predictions, 4) if predictions else 0.0,
+        }
+
+
+intent_classifier = ClassifierRouter()
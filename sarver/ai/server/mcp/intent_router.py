@@ -0,0 +1,176 @@
+"""
+Config-driven intent routing for run_agent('mcp').
+
+Rules live in ai/config/intent_routes.yaml. All keywords are compiled into a
+single Aho-Corasick automaton, so keyword routing is one pass over the
+case-folded prompt however many rules there are. Each rule's regexes are
+compiled into one pattern per rule and searched separately (a rule already
+matched by a keyword is skipped), so overlapping regexes of different rules
+all match before priority picks one. The file is re-read when it changes; a
+broken edit keeps the previous rules.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Pattern, Set, Tuple
+
+import yaml
+
+INTENT_ROUTES_PATH = os.path.join(os.path.dirname(__file__), '../../config/intent_routes.yaml')
+DEFAULT_AGENT = 'creative_writer'
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: one linear scan reports every pattern present"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, int]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        for pattern, value in patterns:
+            self._add(pattern, value)
+        self._link()
+
+    def _add(self, pattern: str, value: int):
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        if value not in self._out[state]:
+            self._out[state] += (value,)
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] += tuple(v for v in self._out[self._fail[nxt]] if v not in self._out[nxt])
+
+    def search(self, text: str) -> Iterator[int]:
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                yield from out[state]
+
+
+class CompiledRules:
+    def __init__(self, spec: Dict):
+        self.default_agent = spec.get('default_agent', DEFAULT_AGENT)
+        self.rules: List[Dict] = []
+        keywords = []
+        self.regexes: List[Tuple[int, Pattern]] = []  # (rule index, its regexes as one pattern)
+        for index, rule in enumerate(spec.get('rules') or []):
+            if not rule.get('name'):
+                raise ValueError(f"intent rule #{index} has no name")
+            if not rule.get('agent') and rule.get('response') is None:
+                raise ValueError(f"intent rule {rule['name']} needs an agent or a response")
+            self.rules.append(dict(rule, priority=rule.get('priority', 0)))
+            keywords += [(str(k).casefold(), index) for k in rule.get('keywords') or [] if str(k)]
+            patterns = [str(p) for p in rule.get('regexes') or []]
+            for pattern in patterns:
+                re.compile(pattern)  # report the bad pattern on its own
+            if patterns:
+                self.regexes.append((index, re.compile('|'.join(f'(?:{p})' for p in patterns))))
+        self.automaton = AhoCorasick(keywords)
+
+    def matches(self, prompt: str) -> Set[int]:
+        text = (prompt or '').casefold()
+        found = set(self.automaton.search(text))
+        for index, regex in self.regexes:
+            if index not in found and regex.search(text):
+                found.add(index)
+        return found
+
+    def best(self, prompt: str) -> Optional[int]:
+        found = self.matches(prompt)
+        if not found:
+            return None
+        return min(found, key=lambda i: (-self.rules[i]['priority'], i))
+
+
+class IntentRouter:
+    def __init__(self, path: str = INTENT_ROUTES_PATH, reload_interval: float = 1.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._compiled = CompiledRules({})
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.reloads = 0
+        self.last_error = None
+        self.reload()
+
+    def reload(self) -> bool:
+        """Recompile from disk; on a bad file keep serving the old rules"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                compiled = CompiledRules(yaml.safe_load(f) or {})
+        except (OSError, ValueError, re.error, yaml.YAMLError) as e:
+            self.last_error = str(e)
+            return False
+        with self._lock:
+            self._compiled, self._mtime = compiled, mtime
+            self.reloads += 1
+            self.last_error = None
+        return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def route(self, prompt: str) -> Dict:
+        """{'rule', 'agent'} or {'rule', 'response', 'agent_type'} for the best matching rule"""
+        self._maybe_reload()
+        compiled = self._compiled
+        index = compiled.best(prompt)
+        if index is None:
+            route = {'rule': 'default', 'agent': compiled.default_agent}
+        else:
+            rule = compiled.rules[index]
+            route = {'rule': rule['name']}
+            if rule.get('response') is not None:
+                route.update(response=rule['response'], agent_type=rule.get('agent_type', rule['name']))
+            else:
+                route['agent'] = rule['agent']
+        with self._lock:
+            self.hits[route['rule']] = self.hits.get(route['rule'], 0) + 1
+        return route
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'rules': [r['name'] for r in self._compiled.rules],
+                'hits': dict(self.hits),
+                'reloads': self.reloads,
+                'last_error': self.last_error,
+            }
+
+
+intent_router = IntentRouter()
@@ -1,8 +1,9 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from .system_monitor import system_monitor
 from ..mcp.admin_handler import AdminHandler
 from typing import Dict, List
 import json
+import time
 
 admin_bp = Blueprint('admin', __name__)
 admin_handler = AdminHandler()
@@ -69,6 +70,80 @@ def execute_admin_command():
     result = admin_handler.process_admin_command(command, request.headers.get('Admin-Token'))
     return jsonify(result)
 
+@admin_bp.route('/dashboard/traces', methods=['GET'])
+def get_traces():
+    """Recent request traces, newest first (?limit=&min_ms=&name=)"""
+    if not admin_handler.validate_admin_token(request.headers.get('Admin-Token')):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    from dispatcher.tracing import tracer
+    return jsonify({
+        'traces': tracer.recent(int(request.args.get('limit', 50)), float(request.args.get('min_ms', 0)),
+                                request.args.get('name')),
+        'stats': tracer.stats()
+    })
+
+@admin_bp.route('/dashboard/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    """One trace as a span tree"""
+    if not admin_handler.validate_admin_token(request.headers.get('Admin-Token')):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    from dispatcher.tracing import tracer
+    trace = tracer.get(trace_id)
+    if trace is None:
+        return jsonify({'error': 'Trace not found'}), 404
+    return jsonify(trace)
+
+@admin_bp.route('/profile', methods=['GET'])
+def profile_cpu():
+    """Sample all threads for ?seconds=N (default 10, max 60); ?format=collapsed returns a flamegraph input file"""
+    if not admin_handler.validate_admin_token(request.headers.get('Admin-Token')):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    from dispatcher.profiling import collapsed, profile_report, sample_stacks
+    seconds = request.args.get('seconds', 10, type=float)
+    interval = request.args.get('interval_ms', 5, type=float) / 1000
+    include_idle = request.args.get('idle') == '1'
+    lines = request.args.get('lines') == '1'
+    try:
+        if request.args.get('format') == 'collapsed':
+            result = sample_stacks(seconds, interval, include_idle, lines)
+            return Response(collapsed(result['stacks']), mimetype='text/plain', headers={
+                'Content-Disposition': f'attachment; filename=profile-{int(time.time())}.collapsed'
+            })
+        return jsonify(profile_report(seconds, interval, include_idle, lines, request.args.get('limit', 25, type=int)))
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+
+@admin_bp.route('/profile/memory', methods=['GET'])
+def profile_memory():
+    """tracemalloc snapshot per module; starts tracing on first use and becomes the baseline for /diff"""
+    if not admin_handler.validate_admin_token(request.headers.get('Admin-Token')):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    from dispatcher.profiling import memory_tracker
+    return jsonify(memory_tracker.snapshot(request.args.get('limit', 25, type=int)))
+
+@admin_bp.route('/profile/memory/diff', methods=['GET'])
+def profile_memory_diff():
+    """Memory growth per module since the last snapshot (?reset=1 moves the baseline to now)"""
+    if not admin_handler.validate_admin_token(request.headers.get('Admin-Token')):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    from dispatcher.profiling import memory_tracker
+    return jsonify(memory_tracker.diff(request.args.get('limit', 25, type=int), request.args.get('reset') == '1'))
+
+@admin_bp.route('/profile/memory/stop', methods=['POST'])
+def profile_memory_stop():
+    """Turn tracemalloc off again"""
+    if not admin_handler.validate_admin_token(request.headers.get('Admin-Token')):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    from dispatcher.profiling import memory_tracker
+    memory_tracker.stop()
+    return jsonify({'tracing': False})
+
 def _get_provider_status() -> Dict:
     """Get current status of all providers"""
     return {
@@ -82,7 +157,8 @@ def _get_provider_status() -> Dict:
 
 def _get_active_sessions() -> List[Dict]:
     """Get list of active sessions"""
-    return []
+    from dispatcher.sessions import session_store
+    return session_store.recent()
 
 def _get_recent_activities() -> List[Dict]:
     """Get recent system activities"""
@@ -1,10 +1,10 @@
 from typing import Dict, List, Optional
 import threading
-import json
 import websockets
 import asyncio
 import logging
 from datetime import datetime
+from dispatcher.wire import decode, offered_subprotocols
 
 class EditorMonitor:
     def __init__(self):
@@ -18,10 +18,13 @@ class EditorMonitor:
     async def start_websocket_server(self):
         """Start WebSocket server"""
         try:
+            # editors may send msgpack (binary frames) instead of JSON; see dispatcher.wire
             self.server = await websockets.serve(
                 self.handle_editor_connection,
                 "localhost",
-                8766  # Different port from system monitor
+                8766,  # Different port from system monitor
+                subprotocols=offered_subprotocols(),
+                compression="deflate"
             )
             self.logger.info("Editor WebSocket server started on port 8766")
             await self.server.wait_closed()
@@ -44,7 +47,7 @@ class EditorMonitor:
         try:
             # Registration
             registration = await websocket.recv()
-            editor_info = json.loads(registration)
+            editor_info = decode(registration)
             editor_id = editor_info['editor_id']
             
             with self.lock:
@@ -73,7 +76,7 @@ class EditorMonitor:
     async def process_editor_event(self, editor_id: str, message: str):
         """Process incoming editor event"""
         try:
-            event = json.loads(message)
+            event = decode(message)
             event['editor_id'] = editor_id
             event['timestamp'] = datetime.now().isoformat()
             
@@ -96,8 +99,8 @@ class EditorMonitor:
             elif event['type'] == 'diagnostic':
                 await self.handle_diagnostic(editor_id, event)
                 
-        except json.JSONDecodeError:
-            self.logger.error(f'Invalid JSON from editor {editor_id}')
+        except ValueError:
+            self.logger.error(f'Invalid JSON or msgpack from editor {editor_id}')
         except Exception as e:
             self.logger.error(f'Error processing editor event: {str(e)}')
             
@@ -1,29 +1,44 @@
 import psutil
 import threading
 import time
-import json
 from datetime import datetime
 from typing import Dict, List, Optional
 import os
 from collections import deque
-from websockets.server import serve
 import asyncio
 import logging
+from dispatcher.aio import get_loop, in_loop_thread
+from dispatcher.pubsub import Hub
+from dispatcher.wire import negotiate, offered_subprotocols
+from dispatcher.timeseries import timeseries
 
 class SystemMonitor:
-    def __init__(self):
+    """
+    Live system, API and editor metrics over a WebSocket (port 8765).
+
+    Everything runs as tasks on the shared dispatch loop (dispatcher.aio):
+    the collectors publish to a pub/sub hub, which sends each client only
+    what changed, serialized once for all clients. Clients get JSON unless
+    they negotiate msgpack deltas (dispatcher.wire); permessage-deflate is
+    on for both. Constructing the monitor starts nothing; start_monitoring()
+    schedules the tasks and returns.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 8765):
+        self.host = host
+        self.port = port
+        # CPU, memory and network history live in dispatcher.timeseries (system.* series)
+        self._previous_net = None
         self.metrics_history = {
-            'cpu': deque(maxlen=100),
-            'memory': deque(maxlen=100),
-            'network': deque(maxlen=100),
             'api_calls': deque(maxlen=1000),
             'editor_events': deque(maxlen=1000),
             'provider_status': deque(maxlen=100)
         }
-        self.connected_clients = set()
+        self.hub = Hub()
         self.logger = self._setup_logger()
-        self.start_monitoring()
-        
+        self._task: Optional[asyncio.Future] = None
+        self._lock = threading.Lock()
+
     def _setup_logger(self):
         logger = logging.getLogger('system_monitor')
         logger.setLevel(logging.INFO)
@@ -33,58 +48,98 @@ class SystemMonitor:
         logger.addHandler(handler)
         return logger
 
-    def start_monitoring(self):
-        """Start all monitoring threads"""
-        threading.Thread(target=self._monitor_system_metrics, daemon=True).start()
-        threading.Thread(target=self._monitor_api_usage, daemon=True).start()
-        threading.Thread(target=self._monitor_editor_integration, daemon=True).start()
-        asyncio.get_event_loop().run_until_complete(self._start_websocket_server())
+    @property
+    def connected_clients(self) -> int:
+        return len(self.hub.subscribers)
+
+    def start_monitoring(self, serve_clients: bool = True):
+        """Schedule the collectors (and the WebSocket server) on the dispatch loop; returns at once"""
+        with self._lock:
+            if self._task is not None and not self._task.done():
+                return self._task
+            self._task = asyncio.run_coroutine_threadsafe(self._run(serve_clients), get_loop())
+            return self._task
+
+    def stop_monitoring(self):
+        with self._lock:
+            if self._task is not None:
+                self._task.cancel()
+                self._task = None
+
+    async def _run(self, serve_clients: bool):
+        collectors = [
+            self._every(1, self._collect_system_metrics),
+            self._every(5, self._collect_api_metrics),
+            self._every(1, self._collect_editor_events),
+        ]
+        if serve_clients:
+            collectors.append(self._start_websocket_server())
+        await asyncio.gather(*collectors)
+
+    async def _every(self, interval: float, collect):
+        """Call collect() every `interval` seconds, keeping to the schedule"""
+        loop = asyncio.get_running_loop()
+        next_run = loop.time()
+        while True:
+            try:
+                collect()
+            except Exception as e:
+                self.logger.error(f"{collect.__name__} failed: {e}")
+            next_run += interval
+            await asyncio.sleep(max(next_run - loop.time(), 0))
 
     async def _start_websocket_server(self):
         """Start WebSocket server for real-time updates"""
-        async with serve(self._handle_client, "localhost", 8765):
-            await asyncio.Future()  # run forever
+        from websockets.server import serve
+        async with serve(self._handle_client, self.host, self.port,
+                         subprotocols=offered_subprotocols(), compression="deflate"):
+            self.logger.info(f"System monitor WebSocket server started on port {self.port}")
+            await asyncio.Future()  # run until cancelled
 
     async def _handle_client(self, websocket):
-        """Handle WebSocket client connection"""
-        self.connected_clients.add(websocket)
+        """Send the current snapshot, then every published change, to one client"""
+        from websockets.exceptions import ConnectionClosed
+        fmt, _ = negotiate([websocket.subprotocol] if websocket.subprotocol else [], getattr(websocket, 'path', ''))
+        subscriber = self.hub.subscribe(fmt)
         try:
             while True:
-                # Send real-time updates to client
-                metrics = self.get_current_metrics()
-                await websocket.send(json.dumps(metrics))
-                await asyncio.sleep(1)
+                await websocket.send(await subscriber.get())
+        except ConnectionClosed:
+            pass
         finally:
-            self.connected_clients.remove(websocket)
+            self.hub.unsubscribe(subscriber)
 
-    def _monitor_system_metrics(self):
-        """Monitor system metrics (CPU, Memory, Network)"""
-        while True:
-            metrics = {
-                'timestamp': datetime.now().isoformat(),
-                'cpu_percent': psutil.cpu_percent(interval=1),
-                'memory_percent': psutil.virtual_memory().percent,
-                'network_io': self._get_network_io()
-            }
-            self.metrics_history['cpu'].append(metrics)
-            self.broadcast_update('system_metrics', metrics)
-            time.sleep(1)
-
-    def _monitor_api_usage(self):
-        """Monitor API calls and performance"""
-        while True:
-            metrics = self._get_api_metrics()
-            self.metrics_history['api_calls'].append(metrics)
-            self.broadcast_update('api_metrics', metrics)
-            time.sleep(5)
+    def _collect_system_metrics(self):
+        """CPU (since the previous tick, so nothing sleeps), memory and network I/O"""
+        metrics = {
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_percent': psutil.virtual_memory().percent,
+            'network_io': self._get_network_io()
+        }
+        self._record_system_metrics(metrics)
+        self.hub.publish('system_metrics', metrics)
 
-    def _monitor_editor_integration(self):
-        """Monitor editor events and integrations"""
-        while True:
-            events = self._get_editor_events()
-            self.metrics_history['editor_events'].append(events)
-            self.broadcast_update('editor_events', events)
-            time.sleep(1)
+    def _collect_api_metrics(self):
+        metrics = self._get_api_metrics()
+        self.metrics_history['api_calls'].append(dict(metrics, timestamp=datetime.now().isoformat()))
+        self.hub.publish('api_metrics', metrics)
+
+    def _collect_editor_events(self):
+        events = self._get_editor_events()
+        self.metrics_history['editor_events'].append(dict(events, timestamp=datetime.now().isoformat()))
+        self.hub.publish('editor_events', events)
+
+    def _record_system_metrics(self, metrics: Dict):
+        """Add a system sample to the system.* time series (network as bytes per second)"""
+        timeseries.record('system.cpu_percent', metrics['cpu_percent'])
+        timeseries.record('system.memory_percent', metrics['memory_percent'])
+        now, net = time.time(), metrics['network_io']
+        previous = self._previous_net
+        if previous:
+            elapsed = max(now - previous[0], 1e-6)
+            timeseries.record('system.net_sent_per_sec', max(net['bytes_sent'] - previous[1]['bytes_sent'], 0) / elapsed)
+            timeseries.record('system.net_recv_per_sec', max(net['bytes_recv'] - previous[1]['bytes_recv'], 0) / elapsed)
+        self._previous_net = (now, net)
 
     def _get_network_io(self) -> Dict:
         """Get network I/O statistics"""
@@ -98,7 +153,6 @@ class SystemMonitor:
         """Get API performance metrics"""
         # Implement API metrics collection
         return {
-            'timestamp': datetime.now().isoformat(),
             'total_requests': 0,
             'response_times': [],
             'error_rate': 0.0
@@ -108,7 +162,6 @@ class SystemMonitor:
         """Get editor integration events"""
         # Implement editor event collection
         return {
-            'timestamp': datetime.now().isoformat(),
             'active_editors': [],
             'event_count': 0
         }
@@ -116,25 +169,18 @@ class SystemMonitor:
     def get_current_metrics(self) -> Dict:
         """Get current system metrics"""
         return {
-            'system': list(self.metrics_history['cpu'])[-1],
-            'api': list(self.metrics_history['api_calls'])[-1],
-            'editor': list(self.metrics_history['editor_events'])[-1]
+            'system': self.hub.state('system_metrics'),
+            'api': self.hub.state('api_metrics'),
+            'editor': self.hub.state('editor_events'),
+            'hub': self.hub.stats()
         }
 
     def broadcast_update(self, event_type: str, data: Dict):
-        """Broadcast updates to all connected clients"""
-        message = json.dumps({
-            'type': event_type,
-            'data': data
-        })
-        asyncio.get_event_loop().run_until_complete(self._broadcast(message))
-
-    async def _broadcast(self, message: str):
-        """Send message to all connected WebSocket clients"""
-        if self.connected_clients:
-            await asyncio.gather(
-                *[client.send(message) for client in self.connected_clients]
-            )
+        """Publish an update to all connected clients; callable from any thread"""
+        if in_loop_thread():
+            self.hub.publish(event_type, data)
+        else:
+            get_loop().call_soon_threadsafe(self.hub.publish, event_type, data)
 
     def log_event(self, event_type: str, message: str):
         """Log monitoring events"""
@@ -1,12 +1,17 @@
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from flask import Flask, jsonify, render_template, send_file, request, Response
+from flask import Flask, jsonify, render_template, send_file, request, Response, after_this_request
 from flask_cors import CORS
 import logging
 import yaml
 from gtts import gTTS
 import tempfile
-from ai.server.mcp.dispatcher import run_agent
+from ai.server.mcp.dispatcher import run_agent, stream_agent_async
+from dispatcher.aio import iter_sync
+from dispatcher.streaming import STREAM_HEADERS, STREAM_MIMETYPES, encode_events, get_stream_mode, measure_stream
+from dispatcher.sessions import session_store
+from dispatcher.metrics import TTS_SECONDS, instrument_flask, language_label
+from dispatcher.tracing import span, trace_flask
 import requests
 import socket
 import time
@@ -39,13 +44,32 @@ logger.addHandler(file_handler)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+instrument_flask(app, 'api')  # GET /metrics
+trace_flask(app, 'api')  # Server-Timing header, traces in the admin dashboard
 
 # Template directory path
 TEMPLATE_DIR = os.path.join(os.path.dirname(APP_ROOT), 'templates')
 app.template_folder = TEMPLATE_DIR
 
-# Global variable to store the currently selected agent
-selected_agent_id = None
+# Selected agent, language and recent turns are kept per session (dispatcher/sessions.py)
+SESSION_COOKIE = 'zc_session'
+SESSION_HEADER = 'X-Session-ID'
+MAX_SESSION_ID_LENGTH = 128
+
+def current_session_id():
+    """Session id from the X-Session-ID header, the JSON body or the cookie; a new one (set as a cookie) otherwise"""
+    data = request.get_json(silent=True) if request.is_json else None
+    session_id = (request.headers.get(SESSION_HEADER) or (data or {}).get('session_id')
+                  or request.cookies.get(SESSION_COOKIE))
+    if session_id and len(str(session_id)) <= MAX_SESSION_ID_LENGTH:
+        return str(session_id)
+    session_id = session_store.new_id()
+
+    @after_this_request
+    def set_session_cookie(response):
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+        return response
+    return session_id
 
 @app.route('/api/status')
 def api_status():
@@ -56,7 +80,8 @@ def api_status():
             "api_server": "running",
             "agent_dispatcher": "running",
             "database": "connected"
-        }
+        },
+        "sessions": session_store.stats()
     })
 
 @app.route('/api/tts', methods=['POST'])
@@ -66,13 +91,17 @@ def tts_api():
     lang = data.get('lang', 'bn')
     if not text.strip():
         return {'success': False, 'error': 'No text provided'}, 400
+    start = time.perf_counter()
     try:
-        tts = gTTS(text=text, lang=lang)
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        tts.save(tmp.name)
-        tmp.close()
+        with span('tts.synthesize', language=lang, text_length=len(text)):
+            tts = gTTS(text=text, lang=lang)
+            tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
+            tts.save(tmp.name)
+            tmp.close()
+        TTS_SECONDS.labels(language_label(lang), 'ok').observe(time.perf_counter() - start)
         return send_file(tmp.name, as_attachment=True, download_name='reply.mp3', mimetype='audio/mpeg')
     except Exception as e:
+        TTS_SECONDS.labels(language_label(lang), 'error').observe(time.perf_counter() - start)
         return {'success': False, 'error': str(e)}, 500
 
 def load_agent_config(agent_id=None):
@@ -262,30 +291,52 @@ def api_chat():
     try:
         data = request.get_json()
         message = data.get('message', '').strip()
-        language = data.get('language', 'bn')
         if not message:
             return jsonify({'success': False, 'error': 'No message provided.'}), 400
+        session_id = current_session_id()
+        session = session_store.get(session_id)
+        language = data.get('language') or session.get('language') or 'bn'
+        session_store.set(session_id, language=language)
+        session_store.add_turn(session_id, 'user', message)
         if message.startswith('@him'):
             prompt = f"তুমি একজন কল্পিত প্রেমিকা, খুব কিউট, দুষ্টুমি করো, সবসময় বাংলা ভাষায় কথা বলো। ইউজার: {message[4:].strip()}"
             agent_type = 'girlfriend-gpt'
-            response = run_agent(agent_type, prompt=prompt, model=None)
         elif message.lower().startswith('sms:'):
             prompt = message[4:].strip()
             agent_type = 'sms_reply'
-            response = run_agent(agent_type, prompt=prompt, model=None)
         else:
-            response = run_agent('mcp', prompt=message, model=None)
+            prompt = message
+            agent_type = 'mcp'
+        stream_mode = get_stream_mode(data, request.headers.get('Accept'))
+        if stream_mode:
+            events = iter_sync(measure_stream(stream_agent_async(agent_type, prompt=prompt, model=None), 'local', agent_type,
+                                              chunked=False))
+            return Response(encode_events(_record_reply(session_id, events), stream_mode),
+                            mimetype=STREAM_MIMETYPES[stream_mode], headers=STREAM_HEADERS)
+        response = run_agent(agent_type, prompt=prompt, model=None)
+        if agent_type == 'mcp':
             agent_type = response.get('agent_type', 'unknown') if isinstance(response, dict) else 'unknown'
         text = response["result"] if isinstance(response, dict) else str(response)
+        session_store.add_turn(session_id, 'assistant', text)
         return jsonify({
             'success': True,
             'user_message': message,
             'agent_message': text,
-            'agent_type': agent_type
+            'agent_type': agent_type,
+            'session_id': session_id
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _record_reply(session_id, events):
+    """Pass stream events through, saving the streamed reply as the session's assistant turn"""
+    reply = []
+    for event in events:
+        if event.get('type') == 'token':
+            reply.append(event['token'])
+        yield event
+    session_store.add_turn(session_id, 'assistant', ''.join(reply))
+
 def check_provider_health(provider_id: str, config: dict) -> dict:
     """Check provider health via API call or TCP ping"""
     start_time = time.time()
@@ -511,7 +562,6 @@ def stream_chat_audio():
 
 @app.route('/api/agents/select', methods=['POST'])
 def select_agent():
-    global selected_agent_id
     data = request.get_json()
     agent_id = data.get('agent_id')
     if not agent_id:
@@ -521,8 +571,15 @@ def select_agent():
     all_agents = [aid for cat in agent_categories.values() for aid in cat]
     if agent_id not in all_agents:
         return jsonify({'success': False, 'error': 'Invalid agent_id.'}), 404
-    selected_agent_id = agent_id
-    return jsonify({'success': True, 'selected_agent_id': selected_agent_id})
+    session_id = current_session_id()
+    session_store.set(session_id, agent_id=agent_id)
+    return jsonify({'success': True, 'selected_agent_id': agent_id, 'session_id': session_id})
+
+@app.route('/api/session')
+def get_session():
+    """The caller's session: selected agent, language and recent turns"""
+    session_id = current_session_id()
+    return jsonify({'success': True, 'session': session_store.get(session_id)})
 
 if __name__ == '__main__':
     logger.info("Starting Flask server...")
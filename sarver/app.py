@@ -10,6 +10,8 @@ import threading
 from concurrent.futures import ThreadPoolExecutor
 from api.voice_api import voice_bp
 from api.docs_api import docs_bp
+from dispatcher.metrics import instrument_flask
+from dispatcher.tracing import trace_flask
 
 # Load environment variables
 load_dotenv()
@@ -28,6 +30,8 @@ logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
+instrument_flask(app, 'main')  # GET /metrics
+trace_flask(app, 'main')  # Server-Timing header, traces in the admin dashboard
 app.register_blueprint(admin_bp, url_prefix='/admin')
 app.register_blueprint(voice_bp, url_prefix='/api/voice')
 app.register_blueprint(docs_bp, url_prefix='/api/docs')
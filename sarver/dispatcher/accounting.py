@@ -0,0 +1,203 @@
+"""
+Per-agent resource accounting: calls, wall and CPU time, latency percentiles
+and an approximate memory footprint.
+
+Wrap an agent call in `agent_accounting.measure(agent)` (sync code) or
+`agent_accounting.ameasure(agent)` (coroutines). Wall time covers the whole
+block. CPU time is thread CPU (time.thread_time), counted in the thread that
+does the work: measure() counts its own thread, functions sent to a worker
+thread with dispatcher.aio.to_thread() count theirs (it runs them through
+`run()`), and other code can report its share with `cpu_block()`. ameasure()
+doesn't count the event-loop thread, which is shared with other requests.
+
+Latency percentiles come from the last `window` calls per agent. The footprint
+is kept up to date by the code that changes it: BaseAgent records its config
+and personality size when it is built, and MemoryManager records the size of
+the agent's memory store whenever it writes.
+"""
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_WINDOW = 512
+
+
+class _Call:
+    __slots__ = ('agent', 'cpu', 'error')
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self.cpu = 0.0
+        self.error = False
+
+
+_current_call: ContextVar[Optional[_Call]] = ContextVar('zombiecoder_agent_call', default=None)
+
+
+def approx_size(obj, limit: int = 10000) -> int:
+    """sys.getsizeof summed over nested dicts, lists, tuples and sets (at most `limit` objects)"""
+    seen, stack, total = set(), [obj], 0
+    while stack and len(seen) < limit:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return total
+
+
+def format_bytes(size: Optional[float]) -> str:
+    if size is None:
+        return 'N/A'
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+    return f'{size:.1f}GB'
+
+
+class _AgentStats:
+    __slots__ = ('calls', 'errors', 'wall_total', 'cpu_total', 'last_used', 'latencies', 'footprint')
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0
+        self.wall_total = 0.0
+        self.cpu_total = 0.0
+        self.last_used: Optional[float] = None
+        self.latencies = deque(maxlen=window)  # wall ms of the latest calls
+        self.footprint: Dict[str, int] = {}
+
+
+class AgentAccounting:
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self._agents: Dict[str, _AgentStats] = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, agent: str) -> _AgentStats:
+        stats = self._agents.get(agent)
+        if stats is None:
+            stats = self._agents.setdefault(agent, _AgentStats(self.window))
+        return stats
+
+    def record(self, agent: str, wall_seconds: float, cpu_seconds: float = 0.0, error: bool = False):
+        with self._lock:
+            stats = self._stats(agent)
+            stats.calls += 1
+            stats.errors += error
+            stats.wall_total += wall_seconds
+            stats.cpu_total += cpu_seconds
+            stats.last_used = time.time()
+            stats.latencies.append(wall_seconds * 1000)
+
+    @contextmanager
+    def measure(self, agent: str):
+        """Account the enclosed sync block (and cpu_block()s it starts elsewhere) to `agent`"""
+        call = _Call(agent)
+        token = _current_call.set(call)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield call
+        except BaseException:
+            call.error = True
+            raise
+        finally:
+            call.cpu += time.thread_time() - cpu
+            _current_call.reset(token)
+            self.record(agent, time.perf_counter() - wall, call.cpu, call.error)
+
+    @asynccontextmanager
+    async def ameasure(self, agent: str):
+        """measure() for coroutines; CPU comes only from cpu_block()s in worker threads"""
+        call = _Call(agent)
+        token = _current_call.set(call)
+        wall = time.perf_counter()
+        try:
+            yield call
+        except BaseException:
+            call.error = True
+            raise
+        finally:
+            _current_call.reset(token)
+            self.record(agent, time.perf_counter() - wall, call.cpu, call.error)
+
+    def run(self, func, *args, **kwargs):
+        """func(*args, **kwargs) inside cpu_block(); what to_thread() runs in the worker thread"""
+        with self.cpu_block():
+            return func(*args, **kwargs)
+
+    @contextmanager
+    def cpu_block(self):
+        """Add this thread's CPU time for the block to the current call, if there is one"""
+        call = _current_call.get()
+        if call is None:
+            yield
+            return
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            call.cpu += time.thread_time() - cpu
+
+    def set_footprint(self, agent: str, **sizes: int):
+        """Update parts of an agent's memory footprint, e.g. instance=, memory_store=, memory_entries="""
+        with self._lock:
+            self._stats(agent).footprint.update(sizes)
+
+    def agents(self) -> List[str]:
+        with self._lock:
+            return sorted(self._agents)
+
+    def snapshot(self, agent: str) -> Optional[Dict]:
+        with self._lock:
+            stats = self._agents.get(agent)
+            if stats is None:
+                return None
+            latencies = np.fromiter(stats.latencies, dtype=np.float64, count=len(stats.latencies))
+            calls, errors, wall_total, cpu_total = stats.calls, stats.errors, stats.wall_total, stats.cpu_total
+            last_used, footprint = stats.last_used, dict(stats.footprint)
+        p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) if latencies.size else (None, None, None)
+        memory_bytes = footprint.get('instance', 0) + footprint.get('memory_store', 0) if footprint else None
+        return {
+            'calls': calls,
+            'errors': errors,
+            'last_used': datetime.fromtimestamp(last_used).isoformat() if last_used else None,
+            'wall_ms': {
+                'total': round(wall_total * 1000, 2),
+                'avg': round(wall_total * 1000 / calls, 2) if calls else None,
+                'p50': round(float(p50), 2) if p50 is not None else None,
+                'p95': round(float(p95), 2) if p95 is not None else None,
+                'p99': round(float(p99), 2) if p99 is not None else None,
+                'window': int(latencies.size),
+            },
+            'cpu_ms': {
+                'total': round(cpu_total * 1000, 2),
+                'avg': round(cpu_total * 1000 / calls, 2) if calls else None,
+            },
+            'footprint': footprint,
+            'memory_bytes': memory_bytes,
+            'memory_usage': format_bytes(memory_bytes),
+        }
+
+    def stats(self) -> Dict[str, Dict]:
+        return {agent: self.snapshot(agent) for agent in self.agents()}
+
+    def reset(self):
+        with self._lock:
+            self._agents.clear()
+
+
+agent_accounting = AgentAccounting()
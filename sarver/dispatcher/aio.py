@@ -0,0 +1,110 @@
+"""
+Async runtime shared by the dispatch pipeline.
+
+One event loop runs in a daemon thread per process and owns a pooled
+httpx.AsyncClient. Sync callers (Flask views, CLI) hand coroutines to it with
+run_sync(), so a single worker can keep many provider calls in flight.
+Coroutines handed over and functions sent to worker threads see the caller's
+context variables (e.g. the current trace span), and a worker thread's CPU
+time counts towards the agent call that sent it there (dispatcher.accounting).
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import weakref
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+import httpx
+
+from dispatcher.accounting import agent_accounting
+
+MAX_CONNECTIONS = 200
+MAX_KEEPALIVE_CONNECTIONS = 50
+DEFAULT_TIMEOUT = 10
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+# one pooled client per running loop; connections can't cross loops
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared event loop, starting its thread on first use"""
+    global _loop, _loop_thread
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name='dispatch-loop', daemon=True)
+            _loop_thread.start()
+        return _loop
+
+
+def in_loop_thread() -> bool:
+    return _loop_thread is not None and threading.current_thread() is _loop_thread
+
+
+async def _in_context(context: contextvars.Context, coro: Awaitable) -> Any:
+    """Await coro with the caller's context variables set (the task has its own copy)"""
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def run_sync(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the shared loop and block until it finishes"""
+    if in_loop_thread():
+        coro.close()
+        raise RuntimeError("run_sync() called from the dispatch loop; await the async API instead")
+    future = asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), get_loop())
+    try:
+        return future.result(timeout)
+    except Exception:
+        future.cancel()
+        raise
+
+
+def iter_sync(agen: AsyncIterator, timeout: Optional[float] = None) -> Iterator:
+    """Drive an async generator on the shared loop from sync code (e.g. a Flask response)"""
+    loop = get_loop()
+    context = contextvars.copy_context()
+    try:
+        while True:
+            try:
+                item = asyncio.run_coroutine_threadsafe(_in_context(context, agen.__anext__()), loop).result(timeout)
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        # runs on normal exit and when the client goes away mid-stream
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result(timeout)
+
+
+async def to_thread(func: Callable, *args, **kwargs) -> Any:
+    """Run blocking code (file I/O, sync agents) off the event loop"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, agent_accounting.run, func, *args, **kwargs))
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Pooled AsyncClient for the running loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
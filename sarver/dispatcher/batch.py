@@ -0,0 +1,161 @@
+"""
+Bulk dispatch.
+
+A batch is a list of dispatch requests (a JSON array or JSON Lines). Identical
+requests are sent once and fanned back out, requests are grouped by the
+provider they will hit first, and each provider gets its own concurrency limit
+from providers.yaml (`max_concurrency`). Results are yielded in completion
+order, tagged with the index of the input they answer.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+
+import yaml
+
+from dispatcher.aio import to_thread
+from dispatcher.cache import PROVIDERS_CONFIG_PATH, PROVIDER_ALIASES
+from dispatcher.core import dispatch_async, dispatch_key, load_agent_profile, provider_chain
+
+MAX_BATCH_ITEMS = 10000
+DEFAULT_PROVIDER_CONCURRENCY = 4
+
+
+def parse_batch(body, content_type: Optional[str] = None) -> List[Dict]:
+    """Items from a JSON array, {"items": [...]} or one JSON object per line"""
+    if isinstance(body, bytes):
+        body = body.decode('utf-8-sig')
+    body = body.strip()
+    if not body:
+        return []
+    if body[0] == '[' or (body[0] == '{' and 'json' in (content_type or '') and 'ndjson' not in content_type):
+        data = json.loads(body)
+        items = data.get('items', []) if isinstance(data, dict) else data
+    else:
+        items = []
+        for number, line in enumerate(body.splitlines(), 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"line {number}: {e}")
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError("batch must be a list of JSON objects")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValueError(f"batch of {len(items)} items exceeds the limit of {MAX_BATCH_ITEMS}")
+    return items
+
+
+def load_provider_concurrency(path: str = PROVIDERS_CONFIG_PATH) -> Dict[str, int]:
+    """Per-provider max_concurrency from providers.yaml"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        providers = (yaml.safe_load(f) or {}).get('providers') or {}
+    limits = {}
+    for name, p in providers.items():
+        if p and p.get('max_concurrency'):
+            # the agent profile may use either spelling (together / togetherai)
+            limits[name] = limits[PROVIDER_ALIASES.get(name, name)] = int(p['max_concurrency'])
+    return limits
+
+
+def _normalize(item: Dict) -> Dict:
+    request = dict(item)
+    # results are written out as whole NDJSON lines, so providers must not stream
+    request.pop('stream', None)
+    prompt = request.get('prompt') or request.get('text')
+    request['prompt'] = request['text'] = prompt
+    return request
+
+
+def _failed(result) -> bool:
+    return not isinstance(result, dict) or bool(result.get('error')) or result.get('status') == 'fallback'
+
+
+async def dispatch_batch_async(items: List[Dict], concurrency: int = None,
+                               provider_limits: Dict[str, int] = None) -> AsyncIterator[Dict]:
+    """Yield a 'result' event per input item as results arrive, then a 'done' summary"""
+    start = time.perf_counter()
+    if provider_limits is None:
+        provider_limits = await to_thread(load_provider_concurrency)
+    profile = await to_thread(load_agent_profile)
+
+    # dedupe: one call per distinct request, answering every index that asked for it
+    groups: "OrderedDict[str, List[int]]" = OrderedDict()
+    requests: Dict[str, Dict] = {}
+    invalid = []
+    for index, item in enumerate(items):
+        request = _normalize(item)
+        if not request['prompt']:
+            invalid.append(index)
+            continue
+        key = dispatch_key(request)
+        groups.setdefault(key, []).append(index)
+        requests.setdefault(key, request)
+
+    for index in invalid:
+        yield {'type': 'result', 'index': index, 'ok': False, 'error': 'Missing text or prompt'}
+
+    overall = asyncio.Semaphore(concurrency) if concurrency else None
+    limits: Dict[str, asyncio.Semaphore] = {}
+    provider_counts: Dict[str, int] = {}
+    done: "asyncio.Queue[tuple]" = asyncio.Queue()
+
+    async def run(key: str, provider: str):
+        async with limits[provider]:
+            if overall:
+                await overall.acquire()
+            call_start = time.perf_counter()
+            try:
+                result = await dispatch_async(requests[key])
+            except Exception as e:
+                result = {'error': str(e)}
+            finally:
+                if overall:
+                    overall.release()
+        await done.put((key, provider, result, (time.perf_counter() - call_start) * 1000))
+
+    tasks = []
+    for key, request in requests.items():
+        provider = provider_chain(profile, request)[0]
+        if provider not in limits:
+            limits[provider] = asyncio.Semaphore(provider_limits.get(provider, DEFAULT_PROVIDER_CONCURRENCY))
+        provider_counts[provider] = provider_counts.get(provider, 0) + 1
+        tasks.append(asyncio.ensure_future(run(key, provider)))
+
+    errors = len(invalid)
+    try:
+        for _ in range(len(tasks)):
+            key, provider, result, latency_ms = await done.get()
+            indices = groups[key]
+            failed = _failed(result)
+            errors += len(indices) if failed else 0
+            for index in indices:
+                yield {
+                    'type': 'result',
+                    'index': index,
+                    'ok': not failed,
+                    'provider': provider,
+                    'result': result,
+                    'latency_ms': round(latency_ms, 2),
+                    'duplicate': index != indices[0],
+                }
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        'type': 'done',
+        'total': len(items),
+        'unique': len(requests),
+        'deduplicated': len(items) - len(invalid) - len(requests),
+        'errors': errors,
+        'providers': provider_counts,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+    }
@@ -0,0 +1,175 @@
+"""
+Batched Socket.IO broadcasts for dashboards.
+
+Emitting an event to every connected client on every dispatch or TTS call
+makes the cost of a request grow with the number of viewers. EmitAggregator
+queues events instead and emits them once per room per tick (SOCKETIO_TICK_MS,
+250 ms by default) as a single batch:
+
+    {"batch": true, "count": 42, "window_ms": 250,
+     "events": [...the latest raw events, at most max_events...],
+     "collapsed": {"procoder": {"count": 40, "avg": 812.5, "max": 1903.2, "last": {...}}}}
+
+Events given a `key` (an agent, a language) are also collapsed into a
+counter per key, with min/avg/max of an optional `value` such as latency, so
+a burst of status events costs one entry per key. Nothing is sent to a room
+that had no events. Clients pick rooms with the `subscribe`/`unsubscribe`
+Socket.IO events (see register_rooms()).
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+from prometheus_client import Counter
+
+from dispatcher.metrics import registry
+
+DEFAULT_TICK = float(os.getenv('SOCKETIO_TICK_MS', 250)) / 1000
+DEFAULT_MAX_EVENTS = 20
+
+EVENTS_QUEUED = Counter(
+    'zombiecoder_socketio_events', 'Events handed to the Socket.IO aggregator', ('event',), registry=registry)
+BATCHES_SENT = Counter(
+    'zombiecoder_socketio_batches', 'Batched Socket.IO emits, one per room per tick with events', ('event',),
+    registry=registry)
+
+
+class _Batch:
+    __slots__ = ('count', 'events', 'collapsed')
+
+    def __init__(self):
+        self.count = 0
+        self.events: List[Dict] = []
+        self.collapsed: Dict[Hashable, Dict] = {}
+
+    def add(self, data: Dict, key: Hashable, value: Optional[float], max_events: int):
+        self.count += 1
+        self.events.append(data)
+        if len(self.events) > max_events:
+            del self.events[0]
+        if key is None:
+            return
+        entry = self.collapsed.get(key)
+        if entry is None:
+            entry = self.collapsed[key] = {'count': 0, 'total': 0.0, 'min': None, 'max': None}
+        entry['count'] += 1
+        entry['last'] = data
+        if value is not None:
+            entry['total'] += value
+            entry['min'] = value if entry['min'] is None else min(entry['min'], value)
+            entry['max'] = value if entry['max'] is None else max(entry['max'], value)
+
+    def payload(self, window: float) -> Dict:
+        collapsed = {}
+        for key, entry in self.collapsed.items():
+            summary = {'count': entry['count'], 'last': entry['last']}
+            if entry['min'] is not None:
+                summary.update(avg=round(entry['total'] / entry['count'], 2),
+                               min=round(entry['min'], 2), max=round(entry['max'], 2))
+            collapsed[str(key)] = summary
+        return {'batch': True, 'count': self.count, 'window_ms': round(window * 1000),
+                'events': self.events, 'collapsed': collapsed}
+
+
+class EmitAggregator:
+    def __init__(self, emit: Callable, tick: float = DEFAULT_TICK, max_events: int = DEFAULT_MAX_EVENTS,
+                 start_task: Callable = None, sleep: Callable = time.sleep):
+        """
+        `emit(event, payload, to=room)` sends one batch; `start_task(fn)` runs the
+        flush loop in the background (socketio.start_background_task, so it
+        works with any async_mode) and `sleep` is its matching sleep.
+        """
+        self.emit = emit
+        self.tick = tick
+        self.max_events = max_events
+        self._start_task = start_task or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self._sleep = sleep
+        self._pending: Dict[tuple, _Batch] = {}  # (event, room) -> batch
+        self._lock = threading.Lock()
+        self._running = False
+        self.counts = {'events': 0, 'batches': 0, 'ticks': 0, 'errors': 0}
+
+    def add(self, event: str, data: Dict, rooms: Iterable[str], key: Hashable = None, value: float = None):
+        """Queue an event for the next tick in each of `rooms`; never blocks on clients"""
+        with self._lock:
+            for room in rooms:
+                batch = self._pending.get((event, room))
+                if batch is None:
+                    batch = self._pending[(event, room)] = _Batch()
+                batch.add(data, key, value, self.max_events)
+            self.counts['events'] += 1
+            start = not self._running
+            self._running = True
+        EVENTS_QUEUED.labels(event).inc()
+        if start:
+            self._start_task(self._run)
+
+    def flush(self) -> int:
+        """Emit what is pending, one batch per event and room; returns the number of emits"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for (event, room), batch in pending.items():
+            try:
+                self.emit(event, batch.payload(self.tick), to=room)
+                BATCHES_SENT.labels(event).inc()
+            except Exception:
+                self.counts['errors'] += 1
+        self.counts['batches'] += len(pending)
+        return len(pending)
+
+    def _run(self):
+        while True:
+            self._sleep(self.tick)
+            self.counts['ticks'] += 1
+            self.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = sum(batch.count for batch in self._pending.values())
+        return {'tick_ms': round(self.tick * 1000), 'pending': pending, **self.counts}
+
+
+def register_rooms(socketio, default_rooms: Iterable[str] = (), allowed_prefixes: Iterable[str] = ()) -> Callable:
+    """
+    Room subscriptions for a flask_socketio server.
+
+    Clients change their rooms with `subscribe` / `unsubscribe` events
+    carrying {"rooms": [...]}; only rooms in default_rooms or starting with
+    one of `allowed_prefixes` can be joined. The reply is a `subscribed` event
+    listing the client's rooms. Returns a function for the app's connect
+    handler that joins the client to `default_rooms`, so plain clients keep
+    getting every update.
+    """
+    from flask import request
+    from flask_socketio import emit, join_room, leave_room, rooms
+
+    default_rooms, allowed_prefixes = tuple(default_rooms), tuple(allowed_prefixes)
+
+    def allowed(room) -> bool:
+        return isinstance(room, str) and (room in default_rooms or (allowed_prefixes and room.startswith(allowed_prefixes)))
+
+    def requested(data) -> List[str]:
+        names = (data or {}).get('rooms', []) if isinstance(data, dict) else data
+        return [room for room in (names if isinstance(names, list) else [names]) if allowed(room)]
+
+    def current() -> List[str]:
+        return sorted(room for room in rooms() if room != request.sid)
+
+    def join_default_rooms():
+        for room in default_rooms:
+            join_room(room)
+
+    @socketio.on('subscribe')
+    def _subscribe(data):
+        for room in requested(data):
+            join_room(room)
+        emit('subscribed', {'rooms': current()})
+
+    @socketio.on('unsubscribe')
+    def _unsubscribe(data):
+        for room in requested(data):
+            leave_room(room)
+        emit('subscribed', {'rooms': current()})
+
+    return join_default_rooms
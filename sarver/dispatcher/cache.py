@@ -0,0 +1,277 @@
+"""
+Provider-level response cache.
+
+Two tiers: an in-memory LRU in front of JSON files under storage/<provider>/cache/.
+Entries are keyed by (provider, model, prompt hash, temperature, params) and
+expire after a per-provider TTL. Requests sampled at a temperature above
+`max_temperature` are non-deterministic and bypass the cache. The temperature
+is the one the provider is actually sent: the request's own, else the
+providers.yaml value for providers whose client applies it (ollama). openai
+and together send none unless the request has one.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import yaml
+
+from dispatcher.aio import to_thread
+
+STORAGE_DIR = os.path.join(os.path.dirname(__file__), '../storage')
+PROVIDERS_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../ai/config/providers.yaml')
+
+# dispatcher/tool names -> storage/<provider> directory names
+PROVIDER_ALIASES = {
+    'together': 'togetherai',
+    'together_ai': 'togetherai',
+}
+
+# providers whose client sends its providers.yaml temperature on every call
+CONFIG_TEMPERATURE_PROVIDERS = ('ollama',)
+
+# hashed on their own (or not at all) rather than as params; 'agent' stays a param
+KEY_FIELDS = ('prompt', 'text', 'model', 'temperature', 'stream', 'cache', 'session_id')
+
+# agent results that must not be replayed: failures and unroutable task names
+ERROR_PREFIX = '[ERROR]'
+UNCACHEABLE_AGENT_TYPES = ('error', 'unknown')
+
+
+def load_cache_config(path: str = PROVIDERS_CONFIG_PATH) -> Dict:
+    """Read the response_cache section and per-provider cache_ttl/temperature"""
+    config = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    cache_config = dict(config.get('response_cache') or {})
+    providers = config.get('providers') or {}
+    cache_config['provider_ttls'] = {
+        PROVIDER_ALIASES.get(name, name): p['cache_ttl'] for name, p in providers.items() if p and 'cache_ttl' in p
+    }
+    cache_config['provider_temperatures'] = {
+        PROVIDER_ALIASES.get(name, name): p['temperature'] for name, p in providers.items()
+        if p and 'temperature' in p and name in CONFIG_TEMPERATURE_PROVIDERS
+    }
+    return cache_config
+
+
+class ResponseCache:
+    def __init__(self, base_dir: str = STORAGE_DIR, memory_entries: int = 1024, default_ttl: float = 3600,
+                 max_temperature: float = 0.2, provider_ttls: Dict[str, float] = None,
+                 provider_temperatures: Dict[str, float] = None, enabled: bool = True, disk: bool = True):
+        self.base_dir = base_dir
+        self.memory_entries = memory_entries
+        self.default_ttl = default_ttl
+        self.max_temperature = max_temperature
+        self.provider_ttls = provider_ttls or {}
+        self.provider_temperatures = provider_temperatures or {}
+        self.enabled = enabled
+        self.disk = disk
+        # key -> (provider, expires_at, latency_ms, encoded value)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def from_config(cls, path: str = PROVIDERS_CONFIG_PATH) -> 'ResponseCache':
+        config = load_cache_config(path)
+        return cls(
+            memory_entries=config.get('memory_entries', 1024),
+            default_ttl=config.get('default_ttl_seconds', 3600),
+            max_temperature=config.get('max_temperature', 0.2),
+            provider_ttls=config['provider_ttls'],
+            provider_temperatures=config['provider_temperatures'],
+            enabled=config.get('enabled', True),
+            disk=config.get('disk', True),
+        )
+
+    # keys and policy
+
+    @staticmethod
+    def storage_name(provider: str) -> str:
+        return PROVIDER_ALIASES.get(provider, provider)
+
+    def temperature_for(self, provider: str, request: Dict) -> Optional[float]:
+        """Temperature the provider is sent; None when it gets none and uses its API default"""
+        options = request.get('options') or {}
+        if options.get('temperature') is not None:
+            return options['temperature']
+        if request.get('temperature') is not None:
+            return request['temperature']
+        return self.provider_temperatures.get(self.storage_name(provider), self.provider_temperatures.get(provider))
+
+    def ttl_for(self, provider: str) -> float:
+        return self.provider_ttls.get(self.storage_name(provider), self.provider_ttls.get(provider, self.default_ttl))
+
+    def make_key(self, provider: str, request: Dict) -> str:
+        prompt = request.get('prompt') or request.get('text') or ''
+        if not isinstance(prompt, str):
+            prompt = json.dumps(prompt, sort_keys=True, ensure_ascii=False, default=str)
+        params = {k: v for k, v in request.items() if k not in KEY_FIELDS}
+        material = json.dumps([
+            self.storage_name(provider),
+            request.get('model') or '',
+            hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+            self.temperature_for(provider, request),
+            params,
+        ], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def should_bypass(self, provider: str, request: Dict) -> bool:
+        if not self.enabled or request.get('cache') is False or request.get('stream'):
+            return True
+        if request.get('session_id'):
+            # multi-turn calls depend on server-side context, not just the prompt
+            return True
+        temperature = self.temperature_for(provider, request)
+        return temperature is not None and temperature > self.max_temperature
+
+    @staticmethod
+    def is_cacheable(result: Any) -> bool:
+        if isinstance(result, str):
+            return not result.startswith(ERROR_PREFIX)
+        if isinstance(result, dict):
+            if result.get('error') or 'stream' in result or result.get('status') == 'fallback':
+                return False
+            if result.get('agent_type') in UNCACHEABLE_AGENT_TYPES:
+                return False
+            return not (isinstance(result.get('result'), str) and result['result'].startswith(ERROR_PREFIX))
+        return result is not None
+
+    # tiers
+
+    def _disk_path(self, provider: str, key: str) -> str:
+        return os.path.join(self.base_dir, self.storage_name(provider), 'cache', key[:2], f'{key}.json')
+
+    def get(self, provider: str, key: str) -> Optional[Dict]:
+        """Return {'value', 'latency_ms', 'tier'} or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    return {'value': json.loads(entry[3]), 'latency_ms': entry[2], 'tier': 'memory'}
+                del self._memory[key]
+        if not self.disk:
+            return None
+        path = self._disk_path(provider, key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get('expires_at', 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        self._remember(key, provider, record['expires_at'], record.get('latency_ms', 0.0),
+                       json.dumps(record['value'], ensure_ascii=False))
+        return {'value': record['value'], 'latency_ms': record.get('latency_ms', 0.0), 'tier': 'disk'}
+
+    def set(self, provider: str, key: str, value: Any, latency_ms: float = 0.0):
+        expires_at = time.time() + self.ttl_for(provider)
+        encoded = json.dumps(value, ensure_ascii=False)
+        self._remember(key, provider, expires_at, latency_ms, encoded)
+        if not self.disk:
+            return
+        path = self._disk_path(provider, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'provider': provider,
+                'created_at': time.time(),
+                'expires_at': expires_at,
+                'latency_ms': latency_ms,
+                'value': value,
+            }, ensure_ascii=False))
+        os.replace(tmp_path, path)
+
+    def _remember(self, key: str, provider: str, expires_at: float, latency_ms: float, encoded: str):
+        with self._lock:
+            self._memory[key] = (provider, expires_at, latency_ms, encoded)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def clear(self, provider: Optional[str] = None):
+        with self._lock:
+            if provider is None:
+                self._memory.clear()
+            else:
+                for key in [k for k, e in self._memory.items() if e[0] == provider]:
+                    del self._memory[key]
+        if not self.disk or not os.path.isdir(self.base_dir):
+            return
+        names = [self.storage_name(provider)] if provider else os.listdir(self.base_dir)
+        for name in names:
+            cache_dir = os.path.join(self.base_dir, name, 'cache')
+            for root, _, files in os.walk(cache_dir):
+                for file in files:
+                    if file.endswith('.json'):
+                        os.remove(os.path.join(root, file))
+
+    # the read-through entry point
+
+    async def fetch(self, provider: str, request: Dict, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Serve from cache or await call() and store its result"""
+        if self.should_bypass(provider, request):
+            self._count(provider, 'bypassed')
+            return await call()
+        key = self.make_key(provider, request)
+        cached = await to_thread(self.get, provider, key)
+        if cached is not None:
+            self._count(provider, f"hits_{cached['tier']}")
+            self._count(provider, 'saved_latency_ms', cached['latency_ms'])
+            return cached['value']
+        self._count(provider, 'misses')
+        start = time.perf_counter()
+        result = await call()
+        latency_ms = (time.perf_counter() - start) * 1000
+        if self.is_cacheable(result):
+            await to_thread(self.set, provider, key, result, latency_ms)
+            self._count(provider, 'stores')
+        return result
+
+    # metrics
+
+    def _count(self, provider: str, field: str, amount: float = 1):
+        with self._lock:
+            stats = self._stats.setdefault(provider, {})
+            stats[field] = stats.get(field, 0) + amount
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._memory)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            providers = {p: dict(s) for p, s in self._stats.items()}
+            entries = len(self._memory)
+        totals = {'hits_memory': 0, 'hits_disk': 0, 'misses': 0, 'bypassed': 0, 'saved_latency_ms': 0.0}
+        for stats in providers.values():
+            for field in totals:
+                totals[field] += stats.get(field, 0)
+            lookups = stats.get('hits_memory', 0) + stats.get('hits_disk', 0) + stats.get('misses', 0)
+            hits = stats.get('hits_memory', 0) + stats.get('hits_disk', 0)
+            stats['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        lookups = totals['hits_memory'] + totals['hits_disk'] + totals['misses']
+        hits = totals['hits_memory'] + totals['hits_disk']
+        return {
+            'enabled': self.enabled,
+            'memory_entries': entries,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'saved_latency_ms': round(totals['saved_latency_ms'], 2),
+            'totals': totals,
+            'providers': providers,
+        }
+
+
+response_cache = ResponseCache.from_config()
@@ -0,0 +1,281 @@
+"""
+Per-session conversation context for multi-turn dispatch.
+
+A request with a `session_id` gets the earlier turns of its session sent along
+with it: as chat `messages` for the OpenAI-style providers and as a rendered
+transcript in `prompt` for the completion-style ones. Each provider has a
+token budget (`context_window` in providers.yaml minus the completion
+reserve). When the history outgrows it, the oldest turns are folded into a
+short summary and the window restarts at a low-water mark, so between trims
+the assembled prefix is reused and each turn only renders and counts itself.
+A stable prefix also lets providers reuse their own prompt caches.
+"""
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, List, Sequence
+
+import yaml
+
+from dispatcher.cache import PROVIDERS_CONFIG_PATH, PROVIDER_ALIASES
+
+DEFAULT_CONTEXT_WINDOW = 4096
+ROLE_LABELS = {'system': 'System', 'user': 'User', 'assistant': 'Assistant'}
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators per chat message
+
+_ASCII = re.compile(r'[\x00-\x7f]')
+_BENGALI_SIGNS = re.compile(r'[ঁ-ঃ়া-্ৗৢৣ]')  # vowel signs, hasant
+_BENGALI = re.compile(r'[ঀ-৿]')
+_SENTENCE_END = re.compile(r'(?<=[.!?।])\s|\n')
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """
+    Fast BPE token estimate. ASCII runs ~4 chars per token; Bengali
+    consonants and independent vowels ~1 token each and their vowel signs and
+    hasant ~half a token; other scripts ~2 chars per token.
+    """
+    if not text:
+        return 0
+    ascii_chars = len(_ASCII.findall(text))
+    bengali = len(_BENGALI.findall(text))
+    signs = len(_BENGALI_SIGNS.findall(text))
+    other = len(text) - ascii_chars - bengali
+    return max(1, round(ascii_chars / 4 + (bengali - signs) + signs / 2 + other / 2))
+
+
+class Turn:
+    __slots__ = ('role', 'content', 'tokens', 'text')
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        self.text = f"{ROLE_LABELS.get(role, role.title())}: {content}\n"
+        self.tokens = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+    def message(self) -> Dict:
+        return {'role': self.role, 'content': self.content}
+
+
+def extractive_summary(previous: str, turns: Sequence[Turn], max_tokens: int) -> str:
+    """Default summarizer: the first sentence of each dropped turn, oldest lines dropped to fit"""
+    lines = previous.splitlines() if previous else []
+    for turn in turns:
+        first = _SENTENCE_END.split(turn.content.strip(), 1)[0][:200]
+        if first:
+            lines.append(f"{ROLE_LABELS.get(turn.role, turn.role)}: {first}")
+    while lines and count_tokens('\n'.join(lines)) > max_tokens:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+
+class _Window:
+    """The assembled prefix for one token budget: turns[start:end] plus the summary of turns[:start]"""
+    __slots__ = ('start', 'end', 'summary', 'summary_tokens', 'messages', 'text', 'tokens')
+
+    def __init__(self, start: int, summary: str):
+        self.start = self.end = start
+        self.summary = summary
+        self.summary_tokens = count_tokens(summary) + MESSAGE_OVERHEAD_TOKENS if summary else 0
+        self.messages: List[Dict] = []
+        self.text = ''
+        self.tokens = 0
+
+    def extend(self, turns: Sequence[Turn], end: int):
+        for turn in turns[self.end:end]:
+            self.messages.append(turn.message())
+            self.text += turn.text
+            self.tokens += turn.tokens
+        self.end = end
+
+
+class Conversation:
+    def __init__(self, session_id: str, system: str = None, summary_tokens: int = 256,
+                 low_water: float = 0.75, max_turns: int = 200,
+                 summarizer: Callable[[str, Sequence[Turn], int], str] = extractive_summary):
+        self.session_id = session_id
+        self.system = system
+        self.summary_tokens = summary_tokens
+        self.low_water = low_water
+        self.max_turns = max_turns
+        self.summarizer = summarizer
+        self.turns: List[Turn] = []
+        self._cumulative = [0]  # tokens of turns[:i]
+        self.base_summary = ''  # turns compacted away for good
+        self._windows: Dict[int, _Window] = {}
+        self.lock = threading.Lock()
+        self.stats = {'builds': 0, 'reused': 0, 'trims': 0, 'summarized_turns': 0}
+
+    @property
+    def tokens(self) -> int:
+        return self._cumulative[-1]
+
+    def add(self, role: str, content: str) -> Turn:
+        turn = Turn(role, content or '')
+        self.turns.append(turn)
+        self._cumulative.append(self._cumulative[-1] + turn.tokens)
+        if len(self.turns) > self.max_turns:
+            self._compact(len(self.turns) // 2)
+        return turn
+
+    def _compact(self, count: int):
+        """Fold the oldest `count` turns into the base summary and forget them"""
+        dropped, self.turns = self.turns[:count], self.turns[count:]
+        self.base_summary = self.summarizer(self.base_summary, dropped, self.summary_tokens)
+        self._cumulative = [0]
+        for turn in self.turns:
+            self._cumulative.append(self._cumulative[-1] + turn.tokens)
+        self._windows.clear()
+        self.stats['summarized_turns'] += count
+
+    def _window(self, budget: int, reserved: int) -> _Window:
+        """The cached window for `budget`, trimmed if it no longer leaves room for `reserved` tokens"""
+        n = len(self.turns)
+        available = max(budget - reserved, 0)
+        window = self._windows.get(budget)
+        if window is None:
+            window = self._windows[budget] = _Window(0, self.base_summary)
+        history = self._cumulative[n] - self._cumulative[window.start]
+        if history + window.summary_tokens <= available:
+            self.stats['reused'] += window.end > window.start
+            window.extend(self.turns, n)
+            return window
+
+        # trim to the low-water mark so the next turns can reuse the new prefix
+        self.stats['trims'] += 1
+        target = max(int(available * self.low_water) - self.summary_tokens - MESSAGE_OVERHEAD_TOKENS, 0)
+        start = max(bisect_left(self._cumulative, self._cumulative[n] - target), window.start)
+        summary = window.summary
+        if start > window.start:
+            summary = self.summarizer(summary, self.turns[window.start:start], self.summary_tokens)
+            self.stats['summarized_turns'] += start - window.start
+        window = self._windows[budget] = _Window(start, summary)
+        window.extend(self.turns, n)
+        return window
+
+    def build(self, prompt: str, budget: int) -> Dict:
+        """Messages and a rendered transcript for `prompt` that fit within `budget` tokens"""
+        self.stats['builds'] += 1
+        system_tokens = count_tokens(self.system) + MESSAGE_OVERHEAD_TOKENS if self.system else 0
+        prompt_tokens = count_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS
+        window = self._window(budget, system_tokens + prompt_tokens)
+
+        messages, header = [], ''
+        if self.system:
+            messages.append({'role': 'system', 'content': self.system})
+            header += f"{self.system}\n\n"
+        if window.summary:
+            summary = f"Summary of the earlier conversation:\n{window.summary}"
+            messages.append({'role': 'system', 'content': summary})
+            header += f"{summary}\n\n"
+        messages += window.messages
+        messages.append({'role': 'user', 'content': prompt})
+        return {
+            'messages': messages,
+            'prompt': f"{header}{window.text}User: {prompt}\nAssistant:",
+            'tokens': system_tokens + window.summary_tokens + window.tokens + prompt_tokens,
+            'history_turns': window.end - window.start,
+            'summarized': bool(window.summary),
+        }
+
+
+def load_context_config(path: str = PROVIDERS_CONFIG_PATH) -> Dict:
+    """The `context` section and per-provider `context_window` sizes from providers.yaml"""
+    data = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f) or {}
+    config = dict(data.get('context') or {})
+    windows = {}
+    for name, provider in (data.get('providers') or {}).items():
+        if provider and provider.get('context_window'):
+            # the agent profile may use either spelling (together / togetherai)
+            windows[name] = windows[PROVIDER_ALIASES.get(name, name)] = int(provider['context_window'])
+    config['windows'] = windows
+    return config
+
+
+class ContextManager:
+    def __init__(self, windows: Dict[str, int] = None, default_window: int = DEFAULT_CONTEXT_WINDOW,
+                 reserve_tokens: int = 512, summary_tokens: int = 256, low_water: float = 0.75,
+                 max_turns: int = 200, max_sessions: int = 1024, summarizer=extractive_summary):
+        self.windows = windows or {}
+        self.default_window = default_window
+        self.reserve_tokens = reserve_tokens
+        self.summary_tokens = summary_tokens
+        self.low_water = low_water
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.summarizer = summarizer
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    @classmethod
+    def from_config(cls, path: str = PROVIDERS_CONFIG_PATH) -> 'ContextManager':
+        config = load_context_config(path)
+        keys = ('default_window', 'reserve_tokens', 'summary_tokens', 'low_water', 'max_turns', 'max_sessions')
+        return cls(config['windows'], **{k: config[k] for k in keys if k in config})
+
+    def budget(self, provider: str, request: Dict = None) -> int:
+        """Prompt tokens the provider can take, leaving room for the completion"""
+        window = self.windows.get(provider, self.default_window)
+        return window - int((request or {}).get('max_tokens') or self.reserve_tokens)
+
+    def get(self, session_id: str, system: str = None) -> Conversation:
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is None:
+                conversation = Conversation(session_id, system, self.summary_tokens, self.low_water,
+                                            self.max_turns, self.summarizer)
+                self._sessions[session_id] = conversation
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            if system is not None:
+                conversation.system = system
+            return conversation
+
+    def prepare(self, session_id: str, provider: str, request: Dict) -> Dict:
+        """A copy of the request carrying the session's history, fitted to the provider's budget"""
+        prompt = request.get('prompt') or request.get('text') or ''
+        conversation = self.get(session_id, request.get('system'))
+        with conversation.lock:
+            built = conversation.build(prompt, self.budget(provider, request))
+        return dict(request, prompt=built['prompt'], messages=built['messages'],
+                    context_tokens=built['tokens'], system=None)
+
+    def record(self, session_id: str, prompt: str, reply: str):
+        """Append a finished exchange to the session"""
+        conversation = self.get(session_id)
+        with conversation.lock:
+            conversation.add('user', prompt)
+            conversation.add('assistant', reply)
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            conversations = list(self._sessions.values())
+        totals = {'builds': 0, 'reused': 0, 'trims': 0, 'summarized_turns': 0}
+        for conversation in conversations:
+            for key in totals:
+                totals[key] += conversation.stats[key]
+        return {
+            'sessions': len(conversations),
+            'evicted': self.evicted,
+            'turns': sum(len(c.turns) for c in conversations),
+            **totals,
+            'token_cache': count_tokens.cache_info()._asdict(),
+        }
+
+
+context_manager = ContextManager.from_config()
@@ -1,7 +1,19 @@
 import os
 import json
+import time
 from dispatcher.fallback import fallback_router
 from dispatcher.model_loader import load_provider
+from dispatcher.aio import run_sync, to_thread
+from dispatcher.streaming import measure_stream, result_text, single_chunk
+from dispatcher.singleflight import get_group, request_key
+from dispatcher.cache import response_cache
+from dispatcher.ratelimit import is_rate_limit_error, rate_limiter, streamed_tokens
+from dispatcher.deadline import deadline_scope, retry_call, retry_policy
+from dispatcher.context import context_manager
+from dispatcher.sessions import session_store
+from dispatcher.accounting import agent_accounting
+from dispatcher.metrics import DISPATCH_SECONDS, PROVIDER_CALL_SECONDS, agent_label
+from dispatcher.tracing import span, traced
 import datetime
 
 AGENT_PROFILE_PATH = os.path.join(os.path.dirname(__file__), '../agents/profile_zombie.json')
@@ -12,35 +24,181 @@ USAGE_LOG = os.path.join(os.path.dirname(__file__), '../logs/usage.log')
 def log_event(logfile, data):
     os.makedirs(os.path.dirname(logfile), exist_ok=True)
     with open(logfile, 'a') as f:
-        f.write(json.dumps(data, ensure_ascii=False) + '\n')
+        f.write(json.dumps(data, ensure_ascii=False, default=str) + '\n')
 
 def log_usage(agent, provider, success):
     os.makedirs(os.path.dirname(USAGE_LOG), exist_ok=True)
     with open(USAGE_LOG, 'a') as f:
         f.write(f"{datetime.datetime.now().isoformat()}, {agent}, {provider}, {success}\n")
 
+@traced('config.load_profile')
 def load_agent_profile():
     with open(AGENT_PROFILE_PATH, 'r') as f:
         return json.load(f)
 
-def dispatch(request):
-    agent = load_agent_profile()
+def provider_chain(agent, request):
+    """Providers to try in order; a request may pin its first choice with 'provider', a session sticks to its last one"""
     providers = [agent['preferred_provider']] + agent.get('fallback_order', [])
-    last_error = None
-    for provider_name in providers:
-        provider = load_provider(provider_name)
-        try:
-            result = provider.run(request)
-            log_event(LOG_ACTIVITY, {'provider': provider_name, 'request': request, 'result': result})
-            log_usage(agent['name'], provider_name, 'success')
+    pinned = request.get('provider')
+    if not pinned and request.get('session_id'):
+        pinned = session_store.sticky_provider(request['session_id'])
+    if pinned:
+        providers = [pinned] + [p for p in providers if p != pinned]
+    return providers
+
+def with_context(provider_name, request):
+    """The request as sent to one provider: a session's history, fitted to its context window"""
+    if not request.get('session_id'):
+        return request
+    with span('context.prepare', provider=provider_name):
+        return context_manager.prepare(request['session_id'], provider_name, request)
+
+def record_turn(request, reply, provider_name):
+    session_id = request.get('session_id')
+    if session_id:
+        prompt = request.get('prompt') or request.get('text') or ''
+        context_manager.record(session_id, prompt, reply)
+        session_store.add_turn(session_id, 'user', prompt)
+        session_store.add_turn(session_id, 'assistant', reply)
+        session_store.stick_provider(session_id, provider_name)
+
+async def call_provider(provider, request, provider_name=None):
+    """Await a provider, using its async entry point when it has one; timed when provider_name is given"""
+    start = time.perf_counter()
+    status = 'error'
+    try:
+        with span(f'provider.{provider_name or "call"}') as current:
+            if hasattr(provider, 'arun'):
+                result = await provider.arun(request)
+            else:
+                result = await to_thread(provider.run, request)
+            status = 'error' if isinstance(result, dict) and result.get('error') else 'ok'
+            if current is not None:
+                current.set(status=status)
             return result
-        except Exception as e:
-            last_error = str(e)
-            log_event(LOG_FALLBACK, {'provider': provider_name, 'error': last_error, 'request': request})
-            log_usage(agent['name'], provider_name, 'fail')
-    log_usage(agent['name'], 'fallback', 'fail')
+    finally:
+        if provider_name:
+            PROVIDER_CALL_SECONDS.labels(provider_name, status).observe(time.perf_counter() - start)
+
+dispatch_flight = get_group('dispatch')
+
+def observe_dispatch(agent_name, provider_name, status, start):
+    """Dispatch latency and per-agent accounting, with unregistered agent names folded into 'unknown'"""
+    elapsed = time.perf_counter() - start
+    agent_name = agent_label(agent_name)
+    DISPATCH_SECONDS.labels(agent_name, provider_name, status).observe(elapsed)
+    agent_accounting.record(agent_name, elapsed, error=status != 'ok')
+
+def dispatch_key(request):
+    params = {k: v for k, v in request.items() if k not in ('agent', 'model', 'prompt', 'text')}
+    return request_key(request.get('agent'), request.get('model'),
+                       request.get('prompt') or request.get('text'), params)
+
+async def dispatch_async(request):
+    """Identical concurrent requests share one provider call; stream=True results are one-shot iterators, so those don't"""
+    with span('dispatch', agent=request.get('agent') or ''):
+        if request.get('stream'):
+            return await _dispatch_async(request)
+        return await dispatch_flight.do(dispatch_key(request), lambda: _dispatch_async(request))
+
+async def _dispatch_async(request):
+    start = time.perf_counter()
+    agent = await to_thread(load_agent_profile)
+    agent_name = request.get('agent') or agent['name']
+    providers = provider_chain(agent, request)
+    last_error = None
+    with deadline_scope(request.get('timeout_seconds') or retry_policy.timeout_seconds) as deadline:
+        for provider_name in providers:
+            if deadline.remaining() < retry_policy.min_attempt_seconds:
+                last_error = f"deadline of {deadline.seconds:g}s exceeded"
+                break
+            try:
+                provider = load_provider(provider_name)
+                call_request = with_context(provider_name, request)
+                result = await response_cache.fetch(
+                    provider_name, call_request,
+                    lambda: retry_call(
+                        lambda: rate_limiter.call(provider_name, call_request, lambda: call_provider(provider, call_request, provider_name)),
+                        retry_policy, deadline
+                    )
+                )
+                record_turn(request, result_text(result), provider_name)
+                await to_thread(log_event, LOG_ACTIVITY, {'provider': provider_name, 'request': request, 'result': result})
+                await to_thread(log_usage, agent['name'], provider_name, 'success')
+                observe_dispatch(agent_name, provider_name, 'ok', start)
+                return result
+            except Exception as e:
+                last_error = str(e)
+                await to_thread(log_event, LOG_FALLBACK, {'provider': provider_name, 'error': last_error, 'request': request})
+                await to_thread(log_usage, agent['name'], provider_name, 'fail')
+    await to_thread(log_usage, agent['name'], 'fallback', 'fail')
+    observe_dispatch(agent_name, 'fallback', 'error', start)
     return fallback_router(request, error=last_error)
 
+def dispatch(request):
+    return run_sync(dispatch_async(request))
+
+async def _provider_tokens(provider, request, provider_name=None):
+    if hasattr(provider, 'astream'):
+        async for token in provider.astream(request):
+            yield token
+        return
+    result = await call_provider(provider, request, provider_name)
+    if isinstance(result, dict) and result.get('error'):
+        raise RuntimeError(result['error'])
+    yield result_text(result)
+
+async def stream_dispatch_async(request):
+    """Streaming twin of dispatch_async(); yields token/done/error events.
+
+    Falls back to the next provider only until the first token has been sent,
+    and not once the request's deadline has passed.
+    """
+    start = time.perf_counter()
+    agent = await to_thread(load_agent_profile)
+    agent_name = request.get('agent') or agent['name']
+    providers = provider_chain(agent, request)
+    last_error = None
+    with deadline_scope(request.get('timeout_seconds') or retry_policy.timeout_seconds) as deadline:
+        for provider_name in providers:
+            if deadline.remaining() < retry_policy.min_attempt_seconds:
+                last_error = f"deadline of {deadline.seconds:g}s exceeded"
+                break
+            started = False
+            limiter, reply = None, []
+            try:
+                provider = load_provider(provider_name)
+                call_request = with_context(provider_name, request)
+                limiter, reserved = await rate_limiter.acquire(provider_name, call_request)
+                tokens = _provider_tokens(provider, call_request, provider_name)
+                async for event in measure_stream(tokens, provider_name, agent_name, chunked=hasattr(provider, 'astream')):
+                    started = True
+                    if event['type'] == 'token':
+                        reply.append(event['token'])
+                    yield event
+                if limiter is not None:
+                    limiter.settle(reserved, streamed_tokens(call_request, ''.join(reply)))
+                record_turn(request, ''.join(reply), provider_name)
+                await to_thread(log_usage, agent['name'], provider_name, 'success')
+                observe_dispatch(agent_name, provider_name, 'ok', start)
+                return
+            except Exception as e:
+                last_error = str(e)
+                if limiter is not None:
+                    if is_rate_limit_error(e):
+                        limiter.throttled()
+                    if started:
+                        limiter.settle(reserved, streamed_tokens(call_request, ''.join(reply)))
+                await to_thread(log_event, LOG_FALLBACK, {'provider': provider_name, 'error': last_error, 'request': request})
+                await to_thread(log_usage, agent['name'], provider_name, 'fail')
+                if started:
+                    observe_dispatch(agent_name, provider_name, 'error', start)
+                    yield {'type': 'error', 'provider': provider_name, 'error': last_error}
+                    return
+    await to_thread(log_usage, agent['name'], 'fallback', 'fail')
+    observe_dispatch(agent_name, 'fallback', 'error', start)
+    yield {'type': 'error', **fallback_router(request, error=last_error)}
+
 if __name__ == '__main__':
     import sys
     req = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
@@ -0,0 +1,159 @@
+"""
+Request deadlines and retry policy for the fallback chain.
+
+A dispatch gets one deadline (fallback_chain.timeout_seconds in
+master_config.yaml unless the request sets `timeout_seconds`). It lives in a
+context variable, so provider calls read their HTTP timeout from whatever is
+left of it instead of a fixed 10 s. Retryable failures (timeouts, 429s, 5xx,
+dropped connections) are retried up to fallback_chain.max_retries times with
+exponential backoff and full jitter, based on fallback_chain.retry_delay. No
+attempt or backoff sleep starts once the deadline can't be met.
+"""
+import asyncio
+import contextvars
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+import yaml
+
+MASTER_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../ai/agents/config/master_config.yaml')
+
+RETRYABLE_MARKERS = (
+    '429', 'rate limit', 'too many requests', 'timeout', 'timed out',
+    '500', '502', '503', '504', 'temporarily unavailable', 'connection',
+)
+
+
+class DeadlineExceeded(Exception):
+    """No time left in the request's budget for another attempt"""
+    retryable = False
+
+
+class ProviderError(Exception):
+    """A provider answered with an error result instead of raising"""
+
+    def __init__(self, result: dict):
+        super().__init__(str(result.get('error')))
+        self.result = result
+
+
+class RetryPolicy:
+    def __init__(self, max_retries: int = 3, timeout_seconds: float = 30, retry_delay: float = 5,
+                 max_delay: float = 30, min_attempt_seconds: float = 0.5):
+        self.max_retries = max_retries
+        self.timeout_seconds = timeout_seconds
+        self.retry_delay = retry_delay
+        self.max_delay = max_delay
+        self.min_attempt_seconds = min_attempt_seconds
+
+    @classmethod
+    def from_config(cls, path: str = MASTER_CONFIG_PATH) -> 'RetryPolicy':
+        config = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                config = (yaml.safe_load(f) or {}).get('fallback_chain') or {}
+        return cls(**{k: config[k] for k in ('max_retries', 'timeout_seconds', 'retry_delay') if k in config})
+
+    def backoff(self, retry: int) -> float:
+        """Full jitter: uniform between 0 and the exponential step"""
+        return random.uniform(0, min(self.max_delay, self.retry_delay * (2 ** retry)))
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = float(seconds)
+        self.expires = time.monotonic() + self.seconds
+
+    def remaining(self) -> float:
+        return max(self.expires - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar('dispatch_deadline', default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[Deadline]:
+    """Set a deadline for the enclosed calls; an outer, earlier deadline still wins"""
+    outer = _deadline.get()
+    deadline = Deadline(seconds)
+    if outer is not None and outer.expires < deadline.expires:
+        deadline = outer
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        try:
+            _deadline.reset(token)
+        except ValueError:
+            # exited in another context: an async generator resumed by a new task (iter_sync)
+            _deadline.set(outer)
+
+
+def attempt_timeout(default: float) -> float:
+    """Timeout for one provider call: what's left of the deadline, else `default`"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    return max(deadline.remaining(), 0.001)
+
+
+def is_retryable(error: BaseException) -> bool:
+    flag = getattr(error, 'retryable', None)
+    if flag is not None:
+        return bool(flag)
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    message = str(error).lower()
+    return any(marker in message for marker in RETRYABLE_MARKERS)
+
+
+async def retry_call(call: Callable[[], Awaitable[Any]], policy: RetryPolicy, deadline: Deadline,
+                     on_retry: Callable[[BaseException, float], None] = None) -> Any:
+    """
+    Await call() within the deadline, retrying retryable failures with backoff.
+
+    An error result ({'error': ...}) counts as a failure. Raises the last error
+    once it isn't retryable, retries run out, or the deadline can't be met.
+    """
+    retry = 0
+    while True:
+        remaining = deadline.remaining()
+        if remaining < policy.min_attempt_seconds:
+            raise DeadlineExceeded(f"deadline of {deadline.seconds:g}s exceeded")
+        try:
+            result = await asyncio.wait_for(call(), remaining)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"deadline of {deadline.seconds:g}s exceeded")
+        except Exception as e:
+            error = e
+        else:
+            if not (isinstance(result, dict) and result.get('error')):
+                return result
+            error = ProviderError(result)
+
+        if retry >= policy.max_retries or not is_retryable(error):
+            raise error
+        delay = policy.backoff(retry)
+        if delay + policy.min_attempt_seconds > deadline.remaining():
+            raise error
+        retry += 1
+        if on_retry:
+            on_retry(error, delay)
+        await asyncio.sleep(delay)
+
+
+retry_policy = RetryPolicy.from_config()
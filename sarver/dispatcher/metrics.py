@@ -0,0 +1,246 @@
+"""
+Prometheus metrics for every server (GET /metrics).
+
+Counters, gauges and histograms are prometheus_client metrics in one
+CollectorRegistry per process (`registry`), and /metrics is generate_latest()
+of that registry in the Prometheus text format (0.0.4), which OpenMetrics
+scrapers also accept. Define new metrics with `registry=registry` so they land
+in the same scrape.
+
+Figures that other modules already keep (cache hit rates, job queue depth,
+single-flight in-flight calls, sessions) are pulled by collectors at scrape
+time rather than pushed on every request: register a function yielding metric
+families (gauge_family() / counter_family() build them from (labels, value)
+pairs) with @collector. A collector only reports modules the process has
+already imported, so scraping never loads anything new.
+
+instrument_flask(app, server) / instrument_fastapi(app, server) add the
+/metrics route plus an in-flight gauge and a latency histogram for HTTP
+requests.
+
+Label values must come from a small, known set. Agent names and languages
+arrive in request bodies, so pass them through agent_label(), which folds any
+name that isn't a registered agent into "unknown", and language_label(),
+which folds languages other than LANGUAGE_LABELS into "other".
+"""
+import json
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, Sequence, Tuple
+
+import yaml
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Gauge, Histogram, disable_created_metrics, generate_latest
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+AGENT_REGISTRY_PATH = os.path.join(os.path.dirname(__file__), '../ai/agents/registry.yaml')
+AGENT_PROFILE_PATH = os.path.join(os.path.dirname(__file__), '../agents/profile_zombie.json')
+UNKNOWN_AGENT = 'unknown'
+LANGUAGE_LABELS = frozenset(('bn', 'en'))
+OTHER_LANGUAGE = 'other'
+
+# seconds; covers a cached reply (~1 ms) up to a slow cloud completion
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# no <name>_created series: they would double what every scrape carries
+disable_created_metrics()
+registry = CollectorRegistry()
+
+DISPATCH_SECONDS = Histogram(
+    'zombiecoder_dispatch_seconds', 'Agent dispatch latency, including fallbacks', ('agent', 'provider', 'status'),
+    buckets=LATENCY_BUCKETS, registry=registry)
+PROVIDER_CALL_SECONDS = Histogram(
+    'zombiecoder_provider_call_seconds', 'Latency of one provider call', ('provider', 'status'),
+    buckets=LATENCY_BUCKETS, registry=registry)
+TTS_SECONDS = Histogram(
+    'zombiecoder_tts_seconds', 'Text-to-speech synthesis latency', ('language', 'status'),
+    buckets=LATENCY_BUCKETS, registry=registry)
+STT_SECONDS = Histogram(
+    'zombiecoder_stt_seconds', 'Speech-to-text recognition latency', ('language', 'status'),
+    buckets=LATENCY_BUCKETS, registry=registry)
+HTTP_REQUEST_SECONDS = Histogram(
+    'zombiecoder_http_request_seconds', 'HTTP request latency', ('server', 'method', 'endpoint', 'status'),
+    buckets=LATENCY_BUCKETS, registry=registry)
+HTTP_IN_FLIGHT = Gauge(
+    'zombiecoder_http_requests_in_flight', 'HTTP requests being served', ('server',), registry=registry)
+
+
+def _family(family_class, name: str, documentation: str, samples: Sequence[Tuple[Dict[str, str], float]]):
+    samples = list(samples)
+    labelnames = list(samples[0][0]) if samples else []
+    family = family_class(name, documentation, labels=labelnames)
+    for labels, value in samples:
+        family.add_metric([str(labels[label]) for label in labelnames], value)
+    return family
+
+
+def gauge_family(name: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> GaugeMetricFamily:
+    """A scrape-time gauge from (labels, value) pairs that all share the same label names"""
+    return _family(GaugeMetricFamily, name, documentation, samples)
+
+
+def counter_family(name: str, documentation: str,
+                   samples: Iterable[Tuple[Dict[str, str], float]]) -> CounterMetricFamily:
+    """A scrape-time counter from (labels, value) pairs; rendered as <name>_total"""
+    return _family(CounterMetricFamily, name, documentation, samples)
+
+
+class _FunctionCollector:
+    """Adapts a generator function to prometheus_client's collector interface"""
+
+    def __init__(self, collect: Callable[[], Iterable]):
+        self.function = collect
+
+    def collect(self):
+        try:
+            return list(self.function())
+        except Exception as e:
+            # a broken collector must not break the scrape
+            logger.warning(f"metrics collector {getattr(self.function, '__name__', self.function)} failed: {e}")
+            return []
+
+    def describe(self):
+        # nothing up front, so registering doesn't run the collector
+        return []
+
+
+def collector(collect: Callable[[], Iterable], target: CollectorRegistry = None):
+    """
+    Register collect() -> iterable of metric families, called at scrape time.
+    Usable as a decorator.
+    """
+    (target or registry).register(_FunctionCollector(collect))
+    return collect
+
+
+_registered_agents = None
+
+
+def known_agents() -> FrozenSet[str]:
+    """Agents in ai/agents/registry.yaml and the dispatcher profile, plus any registered at runtime"""
+    global _registered_agents
+    if _registered_agents is None:
+        names = set()
+        try:
+            with open(AGENT_REGISTRY_PATH, 'r', encoding='utf-8') as f:
+                names.update(a['name'] for a in (yaml.safe_load(f) or {}).get('agents') or [] if a.get('name'))
+        except (OSError, yaml.YAMLError):
+            pass
+        try:
+            with open(AGENT_PROFILE_PATH, 'r', encoding='utf-8') as f:
+                names.add(json.load(f)['name'])
+        except (OSError, ValueError, KeyError):
+            pass
+        _registered_agents = frozenset(names)
+    agent_registry = sys.modules.get('ai.agents.registry')
+    if agent_registry is not None:
+        return _registered_agents | frozenset(agent_registry.AgentRegistry._agents)
+    return _registered_agents
+
+
+def agent_label(name) -> str:
+    """`name` if it is a known agent, else "unknown"; use for labels, series names and accounting"""
+    return name if name in known_agents() else UNKNOWN_AGENT
+
+
+def language_label(language) -> str:
+    return language if language in LANGUAGE_LABELS else OTHER_LANGUAGE
+
+
+@collector
+def _dispatcher_collector():
+    """Cache hit rates, job queue depth, single-flight and session counts, for modules in use"""
+    cache = sys.modules.get('dispatcher.cache')
+    if cache is not None:
+        stats = cache.response_cache.stats()
+        lookups = []
+        for provider, counts in stats['providers'].items():
+            for result in ('hits_memory', 'hits_disk', 'misses', 'bypassed'):
+                lookups.append(({'provider': provider, 'result': result}, counts.get(result, 0)))
+        yield counter_family('zombiecoder_cache_lookups', 'Response cache lookups by result', lookups)
+        yield gauge_family('zombiecoder_cache_hit_ratio', 'Response cache hit ratio',
+                           [({'provider': p}, c['hit_rate']) for p, c in stats['providers'].items()])
+        yield gauge_family('zombiecoder_cache_entries', 'Responses held in memory', [({}, stats['memory_entries'])])
+
+    singleflight = sys.modules.get('dispatcher.singleflight')
+    if singleflight is not None:
+        yield gauge_family('zombiecoder_singleflight_in_flight', 'Distinct calls in flight per single-flight group',
+                           [({'group': name}, stats['inflight']) for name, stats in singleflight.singleflight_stats().items()])
+
+    executor = sys.modules.get('ai.agents.executor')
+    if executor is not None and executor._executor is not None:
+        stats = executor._executor.jobs.stats()
+        yield gauge_family('zombiecoder_job_queue_depth', 'Queued agent jobs by priority',
+                           [({'priority': p}, n) for p, n in stats['queued'].items()])
+        yield gauge_family('zombiecoder_jobs_running', 'Agent jobs being run', [({}, stats['running'])])
+
+    sessions = sys.modules.get('dispatcher.sessions')
+    if sessions is not None:
+        yield gauge_family('zombiecoder_sessions_active', 'Live sessions',
+                           [({}, sessions.session_store.active_count())])
+
+
+def instrument_flask(app, server: str):
+    """Add GET /metrics and in-flight/latency tracking for every request to a Flask app"""
+    from flask import Response, g, request
+
+    in_flight = HTTP_IN_FLIGHT.labels(server)
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_start = time.perf_counter()
+        in_flight.inc()
+
+    @app.after_request
+    def _metrics_observe(response):
+        start = g.get('metrics_start')
+        if start is not None:
+            HTTP_REQUEST_SECONDS.labels(server, request.method, request.endpoint or 'unmatched',
+                                        response.status_code).observe(time.perf_counter() - start)
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(error=None):
+        if g.pop('metrics_start', None) is not None:
+            in_flight.dec()
+
+    def metrics():
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE.split(';')[0], content_type=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    return app
+
+
+def instrument_fastapi(app, server: str):
+    """Add GET /metrics and in-flight/latency tracking for every HTTP request to a FastAPI app"""
+    from starlette.responses import Response
+
+    in_flight = HTTP_IN_FLIGHT.labels(server)
+
+    @app.middleware('http')
+    async def _metrics_middleware(request, call_next):
+        start = time.perf_counter()
+        in_flight.inc()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            in_flight.dec()
+            route = request.scope.get('route')
+            HTTP_REQUEST_SECONDS.labels(server, request.method, getattr(route, 'path', 'unmatched'),
+                                        status).observe(time.perf_counter() - start)
+
+    async def metrics():
+        return Response(generate_latest(registry), headers={'Content-Type': CONTENT_TYPE})
+
+    app.add_api_route('/metrics', metrics, methods=['GET'], include_in_schema=False)
+    return app
@@ -0,0 +1,239 @@
+"""
+On-demand diagnostics for a running server: a statistical CPU sampler and
+tracemalloc memory snapshots.
+
+sample_stacks() wakes every `interval` seconds, reads every thread's current
+frame with sys._current_frames() and counts each distinct stack. Nothing is
+hooked into the profiled code, so the cost is one stack walk per thread per
+tick, and the run can be used in production. Results come back as collapsed
+stacks ("thread;module:function;... count"), which flamegraph.pl, speedscope
+and inferno read directly, plus the hottest functions by self and total
+samples.
+
+MemoryTracker wraps tracemalloc: snapshot() reports allocated memory per
+module and keeps the snapshot as a baseline, and diff() reports growth per
+module since that baseline. tracemalloc slows allocation down while it is on,
+so it starts with the first snapshot and stop() turns it off again.
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+MAX_SECONDS = 60
+DEFAULT_INTERVAL = 0.005
+
+# innermost frames that mean a thread is waiting rather than running
+IDLE_FUNCTIONS = {
+    ('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock'), ('queue.py', 'get'),
+    ('selectors.py', 'select'), ('socket.py', 'accept'), ('socketserver.py', 'serve_forever'),
+    ('base_events.py', '_run_once'), ('thread.py', '_worker'), ('connection.py', 'wait'),
+}
+
+_profile_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4096)
+def module_name(filename: str) -> str:
+    """Dotted module for a source path, relative to the longest matching sys.path entry"""
+    filename = os.path.abspath(filename)
+    best = ''
+    for entry in sys.path:
+        entry = os.path.abspath(entry or '.')
+        if filename.startswith(entry + os.sep) and len(entry) > len(best):
+            best = entry
+    relative = filename[len(best) + 1:] if best else os.path.basename(filename)
+    if relative.endswith('.py'):
+        relative = relative[:-3]
+    return relative.replace(os.sep, '.').replace('.__init__', '') or filename
+
+
+class _Labels:
+    """Caches a label per code object, so repeat samples cost a dict lookup per frame"""
+
+    def __init__(self, lines: bool):
+        self.lines = lines
+        self._cache: Dict[object, str] = {}
+
+    def __call__(self, frame) -> str:
+        code = frame.f_code
+        if self.lines:
+            return f'{module_name(code.co_filename)}:{code.co_name}:{frame.f_lineno}'
+        label = self._cache.get(code)
+        if label is None:
+            label = self._cache[code] = f'{module_name(code.co_filename)}:{code.co_name}'
+        return label
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FUNCTIONS
+
+
+def sample_stacks(seconds: float, interval: float = DEFAULT_INTERVAL, include_idle: bool = False,
+                  lines: bool = False) -> Dict:
+    """
+    Sample all other threads for `seconds` (at most MAX_SECONDS).
+
+    Only one run at a time per process; a second concurrent call raises
+    RuntimeError.
+    """
+    seconds = min(max(float(seconds), 0.01), MAX_SECONDS)
+    interval = max(float(interval), 0.001)
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError('a profile is already running')
+    try:
+        label = _Labels(lines)
+        stacks: Counter = Counter()
+        own = threading.get_ident()
+        samples = idle = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while True:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if not include_idle and _is_idle(frame):
+                    idle += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f'thread-{ident}'))
+                stacks[tuple(reversed(stack))] += 1
+            samples += 1
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            time.sleep(min(interval, deadline - now))
+        elapsed = time.perf_counter() - started
+    finally:
+        _profile_lock.release()
+    return {
+        'seconds': round(elapsed, 3),
+        'ticks': samples,
+        'interval_ms': round(elapsed / samples * 1000, 3) if samples else None,
+        'idle_samples_skipped': idle,
+        'stacks': stacks,
+    }
+
+
+def collapsed(stacks: Counter) -> str:
+    """Brendan Gregg's collapsed format, one `frame;frame;... count` line per stack"""
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_functions(stacks: Counter, limit: int = 25) -> List[Dict]:
+    """Functions by samples spent in them (self) and under them (total)"""
+    own, total = Counter(), Counter()
+    all_samples = sum(stacks.values()) or 1
+    for stack, count in stacks.items():
+        frames = stack[1:]  # drop the thread name
+        if frames:
+            own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return [{
+        'function': frame,
+        'self': own[frame],
+        'total': count,
+        'self_percent': round(own[frame] * 100 / all_samples, 2),
+        'total_percent': round(count * 100 / all_samples, 2),
+    } for frame, count in sorted(total.items(), key=lambda item: (own[item[0]], item[1]), reverse=True)[:limit]]
+
+
+def profile_report(seconds: float, interval: float = DEFAULT_INTERVAL, include_idle: bool = False,
+                   lines: bool = False, limit: int = 25) -> Dict:
+    """sample_stacks() summarised for JSON: hottest functions plus the collapsed stacks"""
+    result = sample_stacks(seconds, interval, include_idle, lines)
+    stacks = result.pop('stacks')
+    result['samples'] = sum(stacks.values())
+    result['top'] = top_functions(stacks, limit)
+    result['collapsed'] = collapsed(stacks)
+    return result
+
+
+class MemoryTracker:
+    """tracemalloc snapshots per module, with growth since a baseline"""
+
+    def __init__(self, frames: int = 1):
+        self.frames = frames
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.baseline_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+
+    @staticmethod
+    def _by_module(stats) -> Dict[str, Tuple[int, int, int, int]]:
+        """module -> (size, count, size_diff, count_diff) from filename-grouped stats"""
+        modules: Dict[str, List[int]] = {}
+        for stat in stats:
+            name = module_name(stat.traceback[0].filename)
+            totals = modules.setdefault(name, [0, 0, 0, 0])
+            totals[0] += stat.size
+            totals[1] += stat.count
+            totals[2] += getattr(stat, 'size_diff', 0)
+            totals[3] += getattr(stat, 'count_diff', 0)
+        return {name: tuple(totals) for name, totals in modules.items()}
+
+    def snapshot(self, limit: int = 25, set_baseline: bool = True) -> Dict:
+        """Memory allocated since tracing started, largest modules first"""
+        with self._lock:
+            snapshot = self._snapshot()
+            if set_baseline or self.baseline is None:
+                self.baseline, self.baseline_at = snapshot, time.time()
+        modules = self._by_module(snapshot.statistics('filename'))
+        current, peak = tracemalloc.get_traced_memory()
+        ranked = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return {
+            'traced_kb': round(current / 1024, 1),
+            'peak_kb': round(peak / 1024, 1),
+            'modules': [{'module': name, 'size_kb': round(size / 1024, 1), 'blocks': count}
+                        for name, (size, count, _, _) in ranked],
+        }
+
+    def diff(self, limit: int = 25, reset: bool = False) -> Dict:
+        """Growth per module since the baseline snapshot, largest growth first"""
+        with self._lock:
+            snapshot = self._snapshot()
+            if self.baseline is None:
+                self.baseline, self.baseline_at = snapshot, time.time()
+            baseline, since = self.baseline, self.baseline_at
+            if reset:
+                self.baseline, self.baseline_at = snapshot, time.time()
+        modules = self._by_module(snapshot.compare_to(baseline, 'filename'))
+        ranked = sorted(modules.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return {
+            'since_seconds': round(time.time() - since, 1),
+            'growth_kb': round(sum(m[2] for m in modules.values()) / 1024, 1),
+            'modules': [{'module': name, 'size_kb': round(size / 1024, 1), 'growth_kb': round(size_diff / 1024, 1),
+                         'blocks': count, 'block_growth': count_diff}
+                        for name, (size, count, size_diff, count_diff) in ranked],
+        }
+
+    def stop(self):
+        with self._lock:
+            tracemalloc.stop()
+            self.baseline = self.baseline_at = None
+
+
+memory_tracker = MemoryTracker()
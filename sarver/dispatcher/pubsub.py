@@ -0,0 +1,203 @@
+"""
+In-process pub/sub hub for pushing live updates to WebSocket clients.
+
+Collectors publish a topic's latest state; the hub keeps the full state per
+topic and sends subscribers only the fields that changed (a delta), so an
+unchanged metric costs nothing on the wire. Each message is serialized once
+per wire format (dispatcher.wire: JSON or msgpack) and the same frame is
+queued for every subscriber of that format, however many there are. A new
+subscriber first gets one `snapshot` message with the full state of all
+topics, then the deltas, tagged with a sequence number. A subscriber whose
+queue overflows would miss a delta, so instead its queue is replaced by a
+fresh snapshot (a resync).
+
+Every client has its own bounded Subscriber queue, drained by its own sender
+task, so a slow client only ever delays itself. When its queue is full the
+slow-consumer policy decides what gives:
+
+- drop_oldest: discard the oldest queued message
+- coalesce: a message with the same key as a queued one replaces it in
+  place (the client only misses intermediate states); otherwise as
+  drop_oldest
+- disconnect: close the subscriber; its sender should close the connection
+
+Each subscriber tracks how long messages wait in its queue (lag).
+
+The hub is not thread-safe: publish/subscribe on the event loop that drains
+the queues (dispatcher.aio's loop for the monitors); other threads hand over
+with loop.call_soon_threadsafe(hub.publish, ...).
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set
+
+from dispatcher.wire import JSON, diff, encode, frame
+
+DEFAULT_QUEUE_SIZE = 100
+POLICIES = ('drop_oldest', 'coalesce', 'disconnect')
+
+
+def dumps(message: Dict) -> str:
+    return json.dumps(message, ensure_ascii=False, default=str, separators=(',', ':'))
+
+
+class SubscriberClosed(Exception):
+    pass
+
+
+class Subscriber:
+    """One client's bounded queue of serialized messages, with a slow-consumer policy"""
+
+    def __init__(self, maxsize: int = DEFAULT_QUEUE_SIZE, policy: str = 'drop_oldest', fmt: str = JSON):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown slow-consumer policy {policy!r}; expected one of {', '.join(POLICIES)}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.format = fmt
+        self._pending: 'OrderedDict[Hashable, tuple]' = OrderedDict()  # key -> (message, enqueued at)
+        self._ids = itertools.count()
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.dropped = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.resyncs = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def oldest_wait(self) -> float:
+        """Seconds the oldest queued message has been waiting"""
+        if not self._pending:
+            return 0.0
+        return time.monotonic() - next(iter(self._pending.values()))[1]
+
+    def offer(self, message: str, key: Hashable = None) -> bool:
+        """Queue a message without blocking; False if the subscriber is (or just got) closed"""
+        if self.closed:
+            return False
+        if key is not None and self.policy == 'coalesce' and key in self._pending:
+            self._pending[key] = (message, self._pending[key][1])  # keeps its place and age
+            self.coalesced += 1
+            return True
+        if len(self._pending) >= self.maxsize:
+            if self.policy == 'disconnect':
+                self.close()
+                return False
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        if key is None or self.policy != 'coalesce':
+            key = next(self._ids)
+        self._pending[key] = (message, time.monotonic())
+        self._ready.set()
+        return True
+
+    def get_nowait(self) -> str:
+        if not self._pending:
+            raise SubscriberClosed() if self.closed else asyncio.QueueEmpty()
+        _, (message, enqueued) = self._pending.popitem(last=False)
+        self.last_lag = time.monotonic() - enqueued
+        self.max_lag = max(self.max_lag, self.last_lag)
+        self.sent += 1
+        return message
+
+    async def get(self) -> str:
+        """Next message, waiting for one; raises SubscriberClosed once closed"""
+        while not self._pending and not self.closed:
+            self._ready.clear()
+            await self._ready.wait()
+        if self.closed:
+            raise SubscriberClosed()
+        return self.get_nowait()
+
+    def clear(self):
+        """Discard everything queued (counted as dropped)"""
+        self.dropped += len(self._pending)
+        self._pending.clear()
+
+    def close(self):
+        self.closed = True
+        self._pending.clear()
+        self._ready.set()
+
+
+class Hub:
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: Set[Subscriber] = set()
+        self._state: Dict[str, Dict] = {}
+        self._snapshots: Dict[str, object] = {}  # format -> encoded full state, until the next publish
+        self.seq = 0
+        self.counts = {'published': 0, 'unchanged': 0, 'sent': 0, 'bytes': 0, 'resyncs': 0}
+
+    def publish(self, topic: str, data: Dict, delta: bool = True) -> Optional[str]:
+        """Merge `data` into the topic's state and fan the change out; returns the message, None if nothing changed"""
+        previous = self._state.get(topic, {})
+        changes = {k: v for k, v in data.items() if k not in previous or previous[k] != v} if delta else dict(data)
+        if not changes:
+            self.counts['unchanged'] += 1
+            return None
+        state = self._state[topic] = {**previous, **changes} if delta else dict(data)
+        self.seq += 1
+        self._snapshots = {}
+        message = dumps({'type': topic, 'data': changes, 'seq': self.seq, 'delta': delta, 'ts': round(time.time(), 3)})
+        encoded = {JSON: message}
+        sent = 0
+        for subscriber in self.subscribers:
+            if subscriber.depth >= subscriber.maxsize:
+                # dropping a delta would leave the client with the wrong state: start it over instead
+                subscriber.clear()
+                subscriber.offer(self.snapshot_message(subscriber.format))
+                subscriber.resyncs += 1
+                self.counts['resyncs'] += 1
+                continue
+            out = encoded.get(subscriber.format)
+            if out is None:
+                # binary clients get a nested diff against the topic's previous state
+                out = encoded[subscriber.format] = encode(frame('delta', topic, self.seq, *diff(previous, state)),
+                                                          subscriber.format)
+            subscriber.offer(out)
+            sent += 1
+            self.counts['bytes'] += len(out)
+        self.counts['published'] += 1
+        self.counts['sent'] += sent
+        return message
+
+    def snapshot_message(self, fmt: str = JSON):
+        snapshot = self._snapshots.get(fmt)
+        if snapshot is None:
+            if fmt == JSON:
+                snapshot = dumps({'type': 'snapshot', 'data': self._state, 'seq': self.seq, 'ts': round(time.time(), 3)})
+            else:
+                snapshot = encode(frame('snapshot', None, self.seq, self._state), fmt)
+            self._snapshots[fmt] = snapshot
+        return snapshot
+
+    def subscribe(self, fmt: str = JSON) -> Subscriber:
+        subscriber = Subscriber(self.queue_size, fmt=fmt)
+        subscriber.offer(self.snapshot_message(fmt))
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def state(self, topic: str) -> Dict:
+        """Full current state of a topic; safe to call from any thread"""
+        return self._state.get(topic, {})
+
+    def stats(self) -> Dict:
+        subscribers = list(self.subscribers)  # may be called from another thread
+        return {
+            'topics': sorted(self._state),
+            'subscribers': len(subscribers),
+            'seq': self.seq,
+            'dropped': sum(s.dropped for s in subscribers),
+            **self.counts,
+        }
@@ -0,0 +1,269 @@
+"""
+Per-provider, per-API-key rate limiting.
+
+Each provider with a `rate_limit` section in providers.yaml gets two token
+buckets per API key: one for requests/min and one for tokens/min. A call
+reserves one request plus an estimate of its tokens (prompt + max_tokens)
+before it is sent, and the reservation is corrected from the usage the
+provider reports (for a streamed call, which reports none, from the prompt and
+the streamed reply). Calls that would wait longer than `max_wait_seconds` raise
+RateLimited, which the dispatcher treats like any other provider failure and
+diverts to the next provider in the chain. A 429 from the provider, returned
+or raised, drains the buckets for `cooldown_seconds`.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import yaml
+
+from dispatcher.cache import PROVIDERS_CONFIG_PATH, PROVIDER_ALIASES
+from dispatcher.context import count_tokens
+
+DEFAULT_COMPLETION_TOKENS = 256
+
+
+class RateLimited(Exception):
+    """The provider's budget can't cover this call within max_wait_seconds"""
+    retryable = False  # divert to the next provider instead
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Rough BPE token count (the cached, script-aware estimate from dispatcher.context)"""
+    return count_tokens(text) if text else 0
+
+
+def usage_tokens(result: Any) -> Optional[int]:
+    """Total tokens reported by a provider result (OpenAI-style usage or Ollama counters)"""
+    if not isinstance(result, dict):
+        return None
+    for source in (result, result.get('response')):
+        if isinstance(source, dict):
+            usage = source.get('usage')
+            if isinstance(usage, dict) and usage.get('total_tokens') is not None:
+                return int(usage['total_tokens'])
+    if result.get('eval_count') is not None:
+        return int(result['eval_count']) + int(result.get('prompt_eval_count') or 0)
+    return None
+
+
+def is_rate_limit_error(result: Any) -> bool:
+    """A provider 429, as an error result or as the exception a streaming call raised"""
+    if isinstance(result, BaseException):
+        if isinstance(result, RateLimited):
+            return False  # our own budget, not the provider's answer
+        if getattr(getattr(result, 'response', None), 'status_code', None) == 429:
+            return True
+        error = str(result).lower()
+    elif isinstance(result, dict) and result.get('error'):
+        error = str(result['error']).lower()
+    else:
+        return False
+    return '429' in error or 'rate limit' in error or 'too many requests' in error
+
+
+def streamed_tokens(request: Dict, reply: str) -> int:
+    """Usage of a streamed call, which reports none: the prompt plus the reply streamed so far"""
+    prompt = request.get('prompt') or request.get('text') or ''
+    return estimate_tokens(prompt if isinstance(prompt, str) else str(prompt)) + estimate_tokens(reply)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+    def give(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self, seconds: float, now: float):
+        """Empty the bucket so it only becomes usable again after `seconds`"""
+        self._refill(now)
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class ProviderLimiter:
+    def __init__(self, provider: str, key_id: str, requests_per_minute: float = None,
+                 tokens_per_minute: float = None, max_wait_seconds: float = 5.0,
+                 cooldown_seconds: float = 5.0, completion_tokens: int = DEFAULT_COMPLETION_TOKENS):
+        self.provider = provider
+        self.key_id = key_id
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_wait_seconds = max_wait_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.completion_tokens = completion_tokens
+        self._lock = threading.Lock()
+        self.stats = {'admitted': 0, 'queued': 0, 'diverted': 0, 'throttled_by_provider': 0,
+                      'waited_ms': 0.0, 'tokens_estimated': 0, 'tokens_used': 0}
+
+    def estimate(self, request: Dict) -> int:
+        prompt = request.get('prompt') or request.get('text') or ''
+        return estimate_tokens(prompt if isinstance(prompt, str) else str(prompt)) + \
+            int(request.get('max_tokens') or self.completion_tokens)
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        waits = [0.0]
+        if self.requests:
+            waits.append(self.requests.wait_time(1, now))
+        if self.tokens:
+            waits.append(self.tokens.wait_time(tokens, now))
+        return max(waits)
+
+    async def acquire(self, tokens: int, max_wait: float = None) -> int:
+        """Reserve one request and `tokens`, sleeping while the budget refills"""
+        max_wait = self.max_wait_seconds if max_wait is None else max_wait
+        start = time.monotonic()
+        queued = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._wait_time(tokens, now)
+                if wait <= 0:
+                    if self.requests:
+                        self.requests.take(1)
+                    if self.tokens:
+                        self.tokens.take(tokens)
+                    self.stats['admitted'] += 1
+                    self.stats['tokens_estimated'] += tokens
+                    self.stats['queued'] += int(queued)
+                    self.stats['waited_ms'] += (now - start) * 1000
+                    return tokens
+                if now - start + wait > max_wait:
+                    self.stats['diverted'] += 1
+                    raise RateLimited(f"{self.provider} rate limit: budget frees up in {wait:.1f}s")
+            queued = True
+            await asyncio.sleep(wait)
+
+    def settle(self, reserved: int, actual: Optional[int]):
+        """Correct the token bucket once the real usage is known"""
+        if actual is None:
+            return
+        with self._lock:
+            self.stats['tokens_used'] += actual
+            if self.tokens:
+                if actual < reserved:
+                    self.tokens.give(reserved - actual)
+                else:
+                    self.tokens.take(actual - reserved)
+
+    def throttled(self):
+        """The provider answered 429: stop sending for cooldown_seconds"""
+        with self._lock:
+            now = time.monotonic()
+            self.stats['throttled_by_provider'] += 1
+            for bucket in (self.requests, self.tokens):
+                if bucket:
+                    bucket.drain(self.cooldown_seconds, now)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            budget = {}
+            for name, bucket in (('requests', self.requests), ('tokens', self.tokens)):
+                if bucket:
+                    bucket._refill(now)
+                    budget[name] = {
+                        'available': round(max(bucket.tokens, 0), 1),
+                        'per_minute': bucket.capacity,
+                        'ready_in_s': round(max(-bucket.tokens, 0) / bucket.rate, 2),
+                    }
+            stats = dict(self.stats, waited_ms=round(self.stats['waited_ms'], 2))
+            return {'key': self.key_id, 'budget': budget, **stats}
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Dict] = None, api_keys: Dict[str, str] = None):
+        self.limits = limits or {}
+        self.api_keys = api_keys or {}
+        self._limiters: Dict[tuple, ProviderLimiter] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path: str = PROVIDERS_CONFIG_PATH) -> 'RateLimiter':
+        providers = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                providers = (yaml.safe_load(f) or {}).get('providers') or {}
+        limits, api_keys = {}, {}
+        for name, config in providers.items():
+            if config and config.get('rate_limit'):
+                limits[name] = dict(config['rate_limit'])
+                api_keys[name] = config.get('api_key') or ''
+        return cls(limits, api_keys)
+
+    def _config_name(self, provider: str) -> Optional[str]:
+        if provider in self.limits:
+            return provider
+        for name in self.limits:
+            if PROVIDER_ALIASES.get(provider, provider) == PROVIDER_ALIASES.get(name, name):
+                return name
+        return None
+
+    def _key_id(self, name: str) -> str:
+        api_key = os.path.expandvars(self.api_keys.get(name, ''))
+        if not api_key or '$' in api_key:
+            return 'default'
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:8]
+
+    def get(self, provider: str) -> Optional[ProviderLimiter]:
+        """The limiter for the provider's current API key, or None if it isn't limited"""
+        name = self._config_name(provider)
+        if name is None:
+            return None
+        key_id = self._key_id(name)
+        with self._lock:
+            limiter = self._limiters.get((name, key_id))
+            if limiter is None:
+                limiter = ProviderLimiter(name, key_id, **self.limits[name])
+                self._limiters[(name, key_id)] = limiter
+            return limiter
+
+    async def acquire(self, provider: str, request: Dict):
+        """Reserve budget for a call; returns (limiter, reserved) for settle()"""
+        limiter = self.get(provider)
+        if limiter is None:
+            return None, 0
+        return limiter, await limiter.acquire(limiter.estimate(request), request.get('max_wait_seconds'))
+
+    async def call(self, provider: str, request: Dict, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Run call() within the provider's budget, settling the reservation from its usage"""
+        limiter, reserved = await self.acquire(provider, request)
+        result = await call()
+        if limiter is not None:
+            if is_rate_limit_error(result):
+                limiter.throttled()
+            limiter.settle(reserved, usage_tokens(result))
+        return result
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        snapshot = {name: {} for name in self.limits}
+        for limiter in limiters:
+            snapshot[limiter.provider][limiter.key_id] = limiter.snapshot()
+        return snapshot
+
+
+rate_limiter = RateLimiter.from_config()
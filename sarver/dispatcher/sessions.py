@@ -0,0 +1,240 @@
+"""
+Per-session state: selected agent, language, recent turns and provider stickiness.
+
+Sessions are plain JSON-able dicts keyed by session id, kept by a backend:
+`MemorySessionBackend` (an LRU with a sliding TTL, one process) or
+`RedisSessionBackend` (shared across workers and nodes). Both look a session up
+in O(1) and expire it `ttl_seconds` after it was last used. Settings live in
+ai/config/sessions.yaml; SESSION_BACKEND and SESSION_REDIS_URL override them.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import yaml
+
+SESSIONS_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../ai/config/sessions.yaml')
+
+
+def new_session(session_id: str, now: float = None) -> Dict:
+    now = time.time() if now is None else now
+    return {
+        'id': session_id,
+        'agent_id': None,
+        'language': None,
+        'turns': [],
+        'provider': None,
+        'provider_until': 0.0,
+        'created': now,
+        'last_seen': now,
+    }
+
+
+class MemorySessionBackend:
+    """LRU of sessions in this process; the least recently used are also the first to expire"""
+
+    def __init__(self, ttl_seconds: float = 1800, max_sessions: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'evicted': 0, 'expired': 0}
+
+    def _purge(self, now: float):
+        """Drop expired sessions from the LRU end; stops at the first live one"""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session['last_seen'] < self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self.stats['expired'] += 1
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            now = time.time()
+            self._purge(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session['last_seen'] = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def put(self, session: Dict):
+        with self._lock:
+            self._sessions[session['id']] = session
+            self._sessions.move_to_end(session['id'])
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats['evicted'] += 1
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def count(self) -> int:
+        with self._lock:
+            self._purge(time.time())
+            return len(self._sessions)
+
+    def recent(self, limit: int) -> List[Dict]:
+        with self._lock:
+            self._purge(time.time())
+            sessions = []
+            for session_id in reversed(self._sessions):
+                if len(sessions) >= limit:
+                    break
+                sessions.append(self._sessions[session_id])
+            return sessions
+
+
+class RedisSessionBackend:
+    """Sessions as JSON strings with a Redis TTL, plus a sorted set of last-seen times for counting"""
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', ttl_seconds: float = 1800,
+                 prefix: str = 'zombiecoder:session:', client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.redis = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.index = f'{prefix}index'
+        self.stats = {'evicted': 0, 'expired': 0}
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        raw = self.redis.get(self.prefix + session_id)
+        if not raw:
+            return None
+        session = json.loads(raw)
+        session['last_seen'] = time.time()
+        pipe = self.redis.pipeline()
+        pipe.expire(self.prefix + session_id, int(self.ttl_seconds))
+        pipe.zadd(self.index, {session_id: session['last_seen']})
+        pipe.execute()
+        return session
+
+    def put(self, session: Dict):
+        pipe = self.redis.pipeline()
+        pipe.set(self.prefix + session['id'], json.dumps(session, ensure_ascii=False), ex=int(self.ttl_seconds))
+        pipe.zadd(self.index, {session['id']: session['last_seen']})
+        pipe.execute()
+
+    def delete(self, session_id: str):
+        pipe = self.redis.pipeline()
+        pipe.delete(self.prefix + session_id)
+        pipe.zrem(self.index, session_id)
+        pipe.execute()
+
+    def _purge(self):
+        self.stats['expired'] += int(self.redis.zremrangebyscore(self.index, '-inf', time.time() - self.ttl_seconds))
+
+    def count(self) -> int:
+        self._purge()
+        return int(self.redis.zcard(self.index))
+
+    def recent(self, limit: int) -> List[Dict]:
+        self._purge()
+        ids = [i.decode() if isinstance(i, bytes) else i for i in self.redis.zrevrange(self.index, 0, limit - 1)]
+        if not ids:
+            return []
+        return [json.loads(raw) for raw in self.redis.mget([self.prefix + i for i in ids]) if raw]
+
+
+class SessionStore:
+    def __init__(self, backend=None, max_turns: int = 20, provider_stickiness_seconds: float = 300):
+        self.backend = backend or MemorySessionBackend()
+        self.max_turns = max_turns
+        self.provider_stickiness_seconds = provider_stickiness_seconds
+        # serialises read-modify-write within this process; a shared backend is last-writer-wins
+        self._lock = threading.Lock()
+        self.counts = {'hits': 0, 'misses': 0, 'created': 0}
+
+    @classmethod
+    def from_config(cls, path: str = SESSIONS_CONFIG_PATH) -> 'SessionStore':
+        config = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                config = (yaml.safe_load(f) or {}).get('sessions') or {}
+        ttl = config.get('ttl_seconds', 1800)
+        kind = os.getenv('SESSION_BACKEND', config.get('backend', 'memory'))
+        if kind == 'redis':
+            backend = RedisSessionBackend(os.getenv('SESSION_REDIS_URL', config.get('redis_url', 'redis://localhost:6379/0')), ttl)
+        else:
+            backend = MemorySessionBackend(ttl, config.get('max_sessions', 10000))
+        return cls(backend, config.get('max_turns', 20), config.get('provider_stickiness_seconds', 300))
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str, create: bool = True) -> Optional[Dict]:
+        session = self.backend.get(session_id)
+        with self._lock:
+            self.counts['hits' if session is not None else 'misses'] += 1
+        if session is None and create:
+            session = new_session(session_id)
+            with self._lock:
+                self.counts['created'] += 1
+            self.backend.put(session)
+        return session
+
+    def update(self, session_id: str, change: Callable[[Dict], None]) -> Dict:
+        """Apply change(session) and save it, touching last_seen"""
+        with self._lock:
+            session = self.backend.get(session_id)
+            if session is None:
+                session = new_session(session_id)
+                self.counts['created'] += 1
+            change(session)
+            session['last_seen'] = time.time()
+            self.backend.put(session)
+            return session
+
+    def set(self, session_id: str, **fields) -> Dict:
+        return self.update(session_id, lambda session: session.update(fields))
+
+    def add_turn(self, session_id: str, role: str, content: str) -> Dict:
+        def change(session):
+            session['turns'].append({'role': role, 'content': content, 'ts': time.time()})
+            del session['turns'][:-self.max_turns]
+        return self.update(session_id, change)
+
+    def stick_provider(self, session_id: str, provider: str) -> Dict:
+        """Prefer `provider` for this session for the next provider_stickiness_seconds"""
+        return self.set(session_id, provider=provider,
+                        provider_until=time.time() + self.provider_stickiness_seconds)
+
+    def sticky_provider(self, session_id: str) -> Optional[str]:
+        session = self.backend.get(session_id)
+        if session and session.get('provider') and session.get('provider_until', 0) > time.time():
+            return session['provider']
+        return None
+
+    def delete(self, session_id: str):
+        self.backend.delete(session_id)
+
+    def active_count(self) -> int:
+        return self.backend.count()
+
+    def recent(self, limit: int = 50) -> List[Dict]:
+        """Most recently used sessions, without their turns"""
+        return [dict(session, turns=len(session.get('turns', []))) for session in self.backend.recent(limit)]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+        lookups = counts['hits'] + counts['misses']
+        return {
+            'backend': type(self.backend).__name__,
+            'active': self.active_count(),
+            **counts,
+            'hit_rate': round(counts['hits'] / lookups, 4) if lookups else 0.0,
+            **self.backend.stats,
+        }
+
+
+session_store = SessionStore.from_config()
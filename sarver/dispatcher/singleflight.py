@@ -0,0 +1,105 @@
+"""
+Single-flight request coalescing.
+
+Identical concurrent calls (same agent, model, prompt and params) share one
+in-flight execution on the dispatch loop instead of each hitting the LLM and
+racing to write the same memory entry.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(prompt: Optional[str]) -> str:
+    """Canonical form used for keys: NFC, trimmed, runs of whitespace collapsed"""
+    prompt = unicodedata.normalize('NFC', prompt or '')
+    return _WHITESPACE.sub(' ', prompt).strip()
+
+
+def request_key(agent: Optional[str], model: Optional[str], prompt: Optional[str],
+                params: Optional[Dict] = None) -> str:
+    """Stable hash of (agent, model, normalized prompt, params)"""
+    material = json.dumps(
+        [agent or '', model or '', normalize_prompt(prompt), params or {}],
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        # in-flight tasks per event loop; a task can only be awaited on its own loop
+        self._inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Task]]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run func() once per key at a time; concurrent callers share its result"""
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.setdefault(loop, {})
+        task = inflight.get(key)
+        with self._lock:
+            self.calls += 1
+            if task is not None:
+                self.coalesced += 1
+            else:
+                self.executed += 1
+        if task is not None:
+            # followers get their own copy so nobody mutates the leader's result
+            return copy.deepcopy(await asyncio.shield(task))
+
+        task = loop.create_task(func())
+        inflight[key] = task
+        task.add_done_callback(lambda t: self._finish(inflight, key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, inflight: Dict[str, asyncio.Task], key: str, task: asyncio.Task):
+        if inflight.get(key) is task:
+            del inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            with self._lock:
+                self.errors += 1
+
+    def inflight_count(self) -> int:
+        return sum(len(tasks) for tasks in list(self._inflight.values()))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'inflight': self.inflight_count(),
+                'coalesce_rate': round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+            }
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_group(name: str) -> SingleFlight:
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+        return _groups[name]
+
+
+def singleflight_stats() -> Dict[str, Dict]:
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.stats() for name, group in groups.items()}
@@ -0,0 +1,175 @@
+"""
+Token streaming helpers shared by the HTTP servers.
+
+Streams are async iterators of text chunks. measure_stream() wraps one into
+events ({"type": "token"|"done"|"error", ...}) and records time-to-first-token
+and tokens/sec per provider and agent. A source that only produces a finished
+answer (the local MCP agents, providers without astream) is measured with
+chunked=False: its one chunk arrives at the total latency, so no TTFT is
+reported for it. encode_events() renders events as SSE or JSON lines for a
+chunked HTTP response.
+"""
+import json
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional
+
+SSE = 'sse'
+NDJSON = 'ndjson'
+
+STREAM_MIMETYPES = {
+    SSE: 'text/event-stream',
+    NDJSON: 'application/x-ndjson',
+}
+
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # stop nginx from buffering the stream
+}
+
+
+class StreamMetrics:
+    """Running TTFT and throughput figures per provider and agent"""
+
+    def __init__(self):
+        self._stats: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, agent: str, ttft_ms: Optional[float], tokens: int, duration_s: float):
+        tokens_per_sec = tokens / duration_s if duration_s > 0 else 0.0
+        with self._lock:
+            stats = self._stats.setdefault((provider, agent), {
+                'streams': 0,
+                'tokens': 0,
+                'ttft_ms_total': 0.0,
+                'ttft_samples': 0,
+                'tokens_per_sec_total': 0.0,
+                'last_ttft_ms': None,
+                'last_tokens_per_sec': None,
+            })
+            stats['streams'] += 1
+            stats['tokens'] += tokens
+            stats['tokens_per_sec_total'] += tokens_per_sec
+            stats['last_tokens_per_sec'] = round(tokens_per_sec, 2)
+            if ttft_ms is not None:
+                stats['ttft_ms_total'] += ttft_ms
+                stats['ttft_samples'] += 1
+                stats['last_ttft_ms'] = round(ttft_ms, 2)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict]]:
+        """Return {provider: {agent: {...}}} with averages filled in"""
+        result: Dict[str, Dict[str, Dict]] = {}
+        with self._lock:
+            for (provider, agent), stats in self._stats.items():
+                samples = stats['ttft_samples']
+                result.setdefault(provider, {})[agent] = {
+                    'streams': stats['streams'],
+                    'tokens': stats['tokens'],
+                    'avg_ttft_ms': round(stats['ttft_ms_total'] / samples, 2) if samples else None,
+                    'avg_tokens_per_sec': round(stats['tokens_per_sec_total'] / stats['streams'], 2),
+                    'last_ttft_ms': stats['last_ttft_ms'],
+                    'last_tokens_per_sec': stats['last_tokens_per_sec'],
+                }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+stream_metrics = StreamMetrics()
+
+
+async def measure_stream(tokens: AsyncIterator[str], provider: str, agent: str,
+                         metrics: StreamMetrics = stream_metrics, chunked: bool = True) -> AsyncIterator[Dict]:
+    """Relay chunks as token events and finish with a timing summary (ttft_ms None unless chunked)"""
+    start = time.perf_counter()
+    ttft_ms = None
+    count = 0
+    async for token in tokens:
+        if not token:
+            continue
+        if ttft_ms is None and chunked:
+            ttft_ms = (time.perf_counter() - start) * 1000
+        count += 1
+        yield {'type': 'token', 'token': token}
+    duration = time.perf_counter() - start
+    metrics.record(provider, agent, ttft_ms, count, duration)
+    yield {
+        'type': 'done',
+        'provider': provider,
+        'agent': agent,
+        'tokens': count,
+        'ttft_ms': round(ttft_ms, 2) if ttft_ms is not None else None,
+        'latency_ms': round(duration * 1000, 2),
+        'tokens_per_sec': round(count / duration, 2) if duration > 0 else 0.0,
+    }
+
+
+async def single_chunk(text: str) -> AsyncIterator[str]:
+    """Stream for sources that only produce a finished answer"""
+    yield text
+
+
+async def iter_chat_deltas(response) -> AsyncIterator[str]:
+    """Yield content deltas from an OpenAI-compatible SSE chat completion"""
+    async for line in response.aiter_lines():
+        if not line.startswith('data:'):
+            continue
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            break
+        chunk = json.loads(data)
+        for choice in chunk.get('choices', []):
+            content = (choice.get('delta') or {}).get('content')
+            if content:
+                yield content
+
+
+def result_text(result) -> str:
+    """Pull the answer text out of the different provider/agent result shapes"""
+    if isinstance(result, str):
+        return result
+    if isinstance(result, dict):
+        if isinstance(result.get('result'), str):
+            return result['result']
+        response = result.get('response')
+        if isinstance(response, str):
+            return response
+        if isinstance(response, dict):
+            choices = response.get('choices') or []
+            if choices:
+                message = choices[0].get('message') or {}
+                return message.get('content') or choices[0].get('text', '')
+    return json.dumps(result, ensure_ascii=False, default=str)
+
+
+def get_stream_mode(data: Optional[Dict], accept: Optional[str] = None) -> Optional[str]:
+    """Work out the requested stream format; None keeps the plain JSON reply"""
+    stream = (data or {}).get('stream')
+    accept = accept or ''
+    if stream in (SSE, NDJSON):
+        return stream
+    if stream is True or str(stream).lower() in ('1', 'true', 'yes'):
+        return NDJSON if STREAM_MIMETYPES[NDJSON] in accept else SSE
+    if STREAM_MIMETYPES[SSE] in accept:
+        return SSE
+    if STREAM_MIMETYPES[NDJSON] in accept:
+        return NDJSON
+    return None
+
+
+def format_event(event: Dict, mode: str) -> str:
+    payload = json.dumps(event, ensure_ascii=False)
+    if mode == SSE:
+        return f"event: {event.get('type', 'message')}\ndata: {payload}\n\n"
+    return payload + '\n'
+
+
+def encode_events(events: Iterable[Dict], mode: str) -> Iterator[str]:
+    """Render events for a chunked response, turning failures into an error event"""
+    try:
+        for event in events:
+            yield format_event(event, mode)
+    except Exception as e:
+        yield format_event({'type': 'error', 'error': str(e)}, mode)
@@ -0,0 +1,97 @@
+"""
+Background CPU/RAM/disk/network sampler.
+
+psutil.cpu_percent(interval=...) sleeps for the interval, so calling it from a
+status endpoint held a worker for up to a second per poll. Instead one daemon
+thread per process samples every `interval` seconds into a snapshot that
+readers get instantly, together with its age. CPU is measured between
+consecutive samples and network counters become bytes per second.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import psutil
+
+DEFAULT_INTERVAL = float(os.getenv('SYSTEM_STATS_INTERVAL', 2.0))
+GB = 1024 ** 3
+
+
+class SystemSampler:
+    def __init__(self, interval: float = DEFAULT_INTERVAL, disk_path: str = '/'):
+        self.interval = interval
+        self.disk_path = disk_path
+        self._snapshot: Optional[Dict] = None
+        self._sampled_at = 0.0
+        self._net = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.errors = 0
+
+    def sample(self) -> Dict:
+        """Take one sample now and publish it as the current snapshot"""
+        now = time.monotonic()
+        ram = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        net = psutil.net_io_counters()
+        snapshot = {
+            "ram_percent": ram.percent,
+            "ram_total_gb": round(ram.total / GB, 2),
+            "ram_available_gb": round(ram.available / GB, 2),
+            "cpu_percent": psutil.cpu_percent(interval=None),  # since the previous sample
+            "disk_percent": disk.percent,
+            "disk_total_gb": round(disk.total / GB, 2),
+            "disk_free_gb": round(disk.free / GB, 2),
+            "net_bytes_sent": net.bytes_sent,
+            "net_bytes_recv": net.bytes_recv,
+            "net_sent_per_sec": 0.0,
+            "net_recv_per_sec": 0.0,
+            "timestamp": datetime.now().isoformat(),
+        }
+        if self._net is not None:
+            elapsed = max(now - self._net[0], 1e-6)
+            snapshot["net_sent_per_sec"] = round(max(net.bytes_sent - self._net[1], 0) / elapsed, 1)
+            snapshot["net_recv_per_sec"] = round(max(net.bytes_recv - self._net[2], 0) / elapsed, 1)
+        self._net = (now, net.bytes_sent, net.bytes_recv)
+        self._snapshot, self._sampled_at = snapshot, now
+        self.samples += 1
+        return snapshot
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                self.errors += 1
+
+    def start(self):
+        """Start the sampling thread once per process (again after a fork)"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            if self._snapshot is None or self._pid != os.getpid():
+                self.sample()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='system-stats', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self) -> Dict:
+        """The latest sample plus its age in seconds; never waits for a new one"""
+        self.start()
+        snapshot = self._snapshot
+        return dict(snapshot, age_seconds=round(time.monotonic() - self._sampled_at, 3),
+                    interval_seconds=self.interval)
+
+
+system_sampler = SystemSampler()
@@ -0,0 +1,293 @@
+"""
+Time-series store for dashboard metrics.
+
+Each series (e.g. "ai_server.latency_ms") is kept at three resolutions, 1 s,
+1 min and 1 h. Each resolution is a fixed-size NumPy ring buffer of buckets
+holding count, sum, min, max and a log-scale histogram. A recorded value goes
+straight into its bucket at every resolution, so rollups need no background
+pass. Histograms merge exactly, so p95 works at any resolution to within one
+histogram bin (~±20%).
+
+Closed 1 min and 1 h buckets can be written to SQLite (storage/metrics/
+timeseries.db by default) and are pruned by per-resolution retention. query()
+reads memory first and falls back to SQLite for older buckets. Settings are
+in ai/config/metrics.yaml; TIMESERIES_DB overrides the database path (empty
+disables persistence). A series costs about 355 KB of memory, so at most
+`max_series` are kept; observations for new series past the cap are dropped
+and counted. Callers keep names bounded (per-agent series use
+dispatcher.metrics.agent_label()).
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import yaml
+
+METRICS_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../ai/config/metrics.yaml')
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+RESOLUTIONS = {'1s': 1, '1m': 60, '1h': 3600}
+DEFAULT_SLOTS = {'1s': 120, '1m': 360, '1h': 720}  # 2 minutes, 6 hours, 30 days
+DEFAULT_RETENTION_DAYS = {'1m': 7, '1h': 90}
+DEFAULT_MAX_SERIES = 256
+
+# histogram bin edges: geometric from 1e-3 to 1e7, so latency in ms, percentages and byte counts all fit
+BINS = 64
+EDGES = np.geomspace(1e-3, 1e7, BINS - 1)
+BIN_VALUES = np.concatenate(([EDGES[0]], np.sqrt(EDGES[:-1] * EDGES[1:]), [EDGES[-1]]))
+
+
+def bin_index(value: float) -> int:
+    return int(np.searchsorted(EDGES, value, side='right'))
+
+
+def percentile(hist: np.ndarray, q: float, low: float, high: float) -> float:
+    """Approximate q-th percentile (0-100) from histogram counts, clipped to the bucket's min/max"""
+    total = hist.sum()
+    if not total:
+        return 0.0
+    index = int(np.searchsorted(np.cumsum(hist), total * q / 100.0))
+    return float(min(max(BIN_VALUES[min(index, BINS - 1)], low), high))
+
+
+class Ring:
+    """Fixed number of buckets of one resolution; slot = bucket % slots"""
+
+    def __init__(self, resolution: int, slots: int):
+        self.resolution = resolution
+        self.slots = slots
+        self.bucket = np.full(slots, -1, dtype=np.int64)
+        self.count = np.zeros(slots, dtype=np.int64)
+        self.sum = np.zeros(slots, dtype=np.float64)
+        self.min = np.zeros(slots, dtype=np.float64)
+        self.max = np.zeros(slots, dtype=np.float64)
+        self.hist = np.zeros((slots, BINS), dtype=np.uint32)
+
+    def add(self, ts: float, value: float, index: int):
+        bucket = int(ts // self.resolution)
+        slot = bucket % self.slots
+        if self.bucket[slot] != bucket:
+            if self.bucket[slot] > bucket:
+                return  # older than the ring remembers
+            self.bucket[slot] = bucket
+            self.count[slot] = 0
+            self.sum[slot] = 0.0
+            self.min[slot] = value
+            self.max[slot] = value
+            self.hist[slot] = 0
+        self.count[slot] += 1
+        self.sum[slot] += value
+        if value < self.min[slot]:
+            self.min[slot] = value
+        if value > self.max[slot]:
+            self.max[slot] = value
+        self.hist[slot, index] += 1
+
+    def points(self, first: int, last: int) -> List[Dict]:
+        """Buckets first..last (inclusive bucket numbers), oldest first"""
+        mask = (self.bucket >= first) & (self.bucket <= last) & (self.count > 0)
+        slots = np.flatnonzero(mask)
+        slots = slots[np.argsort(self.bucket[slots])]
+        return [self._point(slot) for slot in slots]
+
+    def _point(self, slot: int) -> Dict:
+        count = int(self.count[slot])
+        low, high = float(self.min[slot]), float(self.max[slot])
+        return {
+            't': int(self.bucket[slot]) * self.resolution,
+            'count': count,
+            'min': low,
+            'max': high,
+            'avg': float(self.sum[slot]) / count,
+            'p95': percentile(self.hist[slot], 95, low, high),
+        }
+
+    def oldest(self) -> Optional[int]:
+        live = self.bucket[self.count > 0]
+        return int(live.min()) if live.size else None
+
+
+class Series:
+    def __init__(self, name: str, slots: Dict[str, int]):
+        self.name = name
+        self.rings = {res: Ring(RESOLUTIONS[res], slots[res]) for res in RESOLUTIONS}
+        self.persisted = {res: -1 for res in DEFAULT_RETENTION_DAYS}  # last bucket written to SQLite
+        self.last = None
+
+    def add(self, ts: float, value: float):
+        index = bin_index(value)
+        for ring in self.rings.values():
+            ring.add(ts, value, index)
+        self.last = (ts, value)
+
+
+class TimeSeriesStore:
+    def __init__(self, db_path: Optional[str] = None, slots: Dict[str, int] = None,
+                 retention_days: Dict[str, float] = None, flush_interval: float = 60,
+                 max_series: int = DEFAULT_MAX_SERIES):
+        self.slots = dict(DEFAULT_SLOTS, **(slots or {}))
+        self.retention_days = dict(DEFAULT_RETENTION_DAYS, **(retention_days or {}))
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_series = max_series
+        self.dropped = 0
+        self._series: Dict[str, Series] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid = None
+
+    @classmethod
+    def from_config(cls, path: str = METRICS_CONFIG_PATH) -> 'TimeSeriesStore':
+        config = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                config = (yaml.safe_load(f) or {}).get('timeseries') or {}
+        db_path = os.getenv('TIMESERIES_DB', config.get('sqlite_path') if config.get('persist', True) else '')
+        if db_path and not os.path.isabs(db_path):
+            db_path = os.path.join(BASE_DIR, db_path)
+        return cls(db_path or None, config.get('slots'), config.get('retention_days'),
+                   config.get('flush_interval_seconds', 60), config.get('max_series', DEFAULT_MAX_SERIES))
+
+    def record(self, name: str, value: float, ts: float = None) -> bool:
+        """Add one observation to a series (created on first use); False if the series cap dropped it"""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                if len(self._series) >= self.max_series:
+                    self.dropped += 1
+                    return False
+                series = self._series[name] = Series(name, self.slots)
+            series.add(ts, float(value))
+        if self.db_path:
+            self._start_flusher()
+        return True
+
+    def series(self) -> List[str]:
+        with self._lock:
+            return sorted(self._series)
+
+    def latest(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            series = self._series.get(name)
+            return {'t': series.last[0], 'value': series.last[1]} if series and series.last else None
+
+    @staticmethod
+    def pick_resolution(span_seconds: float, slots: Dict[str, int] = None) -> str:
+        """Finest resolution whose ring still covers the span"""
+        slots = slots or DEFAULT_SLOTS
+        for res in ('1s', '1m'):
+            if span_seconds <= RESOLUTIONS[res] * slots[res]:
+                return res
+        return '1h'
+
+    def query(self, name: str, start: float = None, end: float = None, resolution: str = None) -> Dict:
+        """Rolled-up points for `name` between start and end (epoch seconds; default the last hour)"""
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        resolution = resolution or self.pick_resolution(end - start, self.slots)
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"unknown resolution {resolution!r}; use one of {', '.join(RESOLUTIONS)}")
+        seconds = RESOLUTIONS[resolution]
+        first, last = int(start // seconds), int(end // seconds)
+        with self._lock:
+            series = self._series.get(name)
+            ring = series.rings[resolution] if series else None
+            points = ring.points(first, last) if ring else []
+            oldest = ring.oldest() if ring else None
+        if self.db_path and resolution in self.retention_days and (oldest is None or first < oldest):
+            older = self._load(name, resolution, first, (oldest - 1) if oldest is not None else last)
+            points = older + points
+        return {'series': name, 'resolution': resolution, 'start': start, 'end': end, 'points': points}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            names = list(self._series)
+        per_series = sum(r.bucket.nbytes + r.count.nbytes + r.sum.nbytes + r.min.nbytes + r.max.nbytes + r.hist.nbytes
+                         for r in Series('', self.slots).rings.values())
+        return {'series': len(names), 'max_series': self.max_series, 'dropped': self.dropped,
+                'memory_bytes': per_series * len(names), 'persistence': self.db_path}
+
+    # SQLite tier
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('''CREATE TABLE IF NOT EXISTS rollups (
+                series TEXT NOT NULL, resolution TEXT NOT NULL, t INTEGER NOT NULL,
+                count INTEGER, min REAL, max REAL, avg REAL, p95 REAL,
+                PRIMARY KEY (series, resolution, t))''')
+            self._db = db
+        return self._db
+
+    def flush(self, now: float = None) -> int:
+        """Write closed 1 min / 1 h buckets to SQLite and apply retention; returns rows written"""
+        if not self.db_path:
+            return 0
+        now = time.time() if now is None else now
+        rows = []
+        with self._lock:
+            for series in self._series.values():
+                for res in self.retention_days:
+                    ring = series.rings[res]
+                    current = int(now // ring.resolution)
+                    for point in ring.points(series.persisted[res] + 1, current - 1):
+                        rows.append((series.name, res, point['t'], point['count'], point['min'],
+                                     point['max'], point['avg'], point['p95']))
+                    series.persisted[res] = current - 1
+        with self._db_lock:
+            db = self._connect()
+            with db:
+                db.executemany('INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                for res, days in self.retention_days.items():
+                    db.execute('DELETE FROM rollups WHERE resolution = ? AND t < ?', (res, now - days * 86400))
+        return len(rows)
+
+    def _load(self, name: str, resolution: str, first: int, last: int) -> List[Dict]:
+        seconds = RESOLUTIONS[resolution]
+        with self._db_lock:
+            cursor = self._connect().execute(
+                'SELECT t, count, min, max, avg, p95 FROM rollups '
+                'WHERE series = ? AND resolution = ? AND t BETWEEN ? AND ? ORDER BY t',
+                (name, resolution, first * seconds, last * seconds))
+            return [dict(zip(('t', 'count', 'min', 'max', 'avg', 'p95'), row)) for row in cursor]
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass  # try again next round; the rings still hold the data
+
+    def _start_flusher(self):
+        if self._flusher is not None and self._flusher_pid == os.getpid():
+            return
+        with self._db_lock:
+            if self._flusher is None or self._flusher_pid != os.getpid():
+                self._db = None  # a forked child must not share the parent's connection
+                self._flusher_pid = os.getpid()
+                self._flusher = threading.Thread(target=self._flush_loop, name='timeseries-flush', daemon=True)
+                self._flusher.start()
+
+
+def query_args(store: TimeSeriesStore, args) -> Dict:
+    """Answer a ?series=&start=&end=&resolution= request (start/end epoch seconds, or start=-3600 for relative)"""
+    name = args.get('series')
+    if not name:
+        return {'series': store.series(), 'stats': store.stats()}
+    end = float(args['end']) if args.get('end') else time.time()
+    start = float(args['start']) if args.get('start') else None
+    if start is not None and start <= 0:
+        start = end + start
+    return store.query(name, start, end, args.get('resolution'))
+
+
+timeseries = TimeSeriesStore.from_config()
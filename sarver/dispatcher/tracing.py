@@ -0,0 +1,328 @@
+"""
+Lightweight in-process request tracing.
+
+A span is a named, timed section of work. The current span lives in a context
+variable, so a span opened inside another becomes its child across awaits,
+dispatcher.aio's event loop and worker threads. trace_flask() and
+trace_fastapi() open one root span per HTTP request and add a
+`Server-Timing` header with the time spent per span name, so the browser's
+network panel shows where a slow request went (YAML loading, memory files,
+routing, the provider, TTS).
+
+Finished traces are kept in a ring buffer (`recent()` / `get()`, shown in the
+admin dashboard). They can also be appended to daily OTLP/JSON files, one
+ExportTraceServiceRequest per line, that an OpenTelemetry collector can
+import. Settings are in the `tracing` section of ai/config/metrics.yaml;
+TRACE_EXPORT_DIR overrides the export directory (empty disables export).
+"""
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import yaml
+
+METRICS_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../ai/config/metrics.yaml')
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SERVER_TIMING_ENTRIES = 12
+
+_current: ContextVar[Optional['Span']] = ContextVar('zombiecoder_span', default=None)
+
+
+def _new_id(bits: int) -> str:
+    return format(random.getrandbits(bits), f'0{bits // 4}x')
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent', 'root', 'attributes', 'start', 'start_ns',
+                 'end', 'error', 'children', 'span_count')
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, attributes: Dict = None):
+        self.name = name
+        self.parent = parent
+        self.root = parent.root if parent is not None else self
+        self.trace_id = parent.trace_id if parent is not None else _new_id(128)
+        self.span_id = _new_id(64)
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self.children: List[Span] = []
+        self.span_count = 1
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end if self.end is not None else time.perf_counter()) - self.start) * 1000
+
+    def walk(self) -> Iterator['Span']:
+        yield self
+        for child in list(self.children):
+            yield from child.walk()
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'start': datetime.fromtimestamp(self.start_ns / 1e9).isoformat(),
+            'duration_ms': round(self.duration_ms, 3),
+            'finished': self.end is not None,
+            'attributes': self.attributes,
+            'error': self.error,
+            'children': [child.to_dict() for child in list(self.children)],
+        }
+
+    def summary(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'start': datetime.fromtimestamp(self.start_ns / 1e9).isoformat(),
+            'duration_ms': round(self.duration_ms, 3),
+            'spans': self.span_count,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def server_timing(root: Span, limit: int = SERVER_TIMING_ENTRIES) -> str:
+    """Server-Timing header value: total time, then the slowest span names (repeats summed)"""
+    totals: Dict[str, float] = {}
+    for span in root.walk():
+        if span is not root and span.end is not None:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+    slowest = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+    entries = [f'total;dur={root.duration_ms:.1f}']
+    entries += [f'{name.replace(" ", "_")};dur={ms:.1f}' for name, ms in slowest]
+    return ', '.join(entries)
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_json(root: Span, service: str) -> Dict:
+    """The trace as an OTLP/JSON ExportTraceServiceRequest"""
+    spans = []
+    for span in root.walk():
+        end_ns = span.start_ns + int(span.duration_ms * 1e6)
+        spans.append({
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'parentSpanId': span.parent.span_id if span.parent is not None else '',
+            'name': span.name,
+            'kind': 2 if span is root else 1,  # SERVER for the request, INTERNAL below it
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(end_ns),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in span.attributes.items()],
+            'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+        })
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service}}]},
+        'scopeSpans': [{'scope': {'name': 'zombiecoder.dispatcher.tracing'}, 'spans': spans}],
+    }]}
+
+
+class Tracer:
+    def __init__(self, enabled: bool = True, ring_size: int = 500, max_spans: int = 1000,
+                 export_dir: Optional[str] = None, service: str = 'zombiecoder'):
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self.export_dir = export_dir
+        self.service = service
+        self._traces: deque = deque(maxlen=ring_size)
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self.counts = {'traces': 0, 'spans': 0, 'dropped_spans': 0, 'exported': 0, 'export_errors': 0}
+
+    @classmethod
+    def from_config(cls, path: str = METRICS_CONFIG_PATH) -> 'Tracer':
+        config = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                config = (yaml.safe_load(f) or {}).get('tracing') or {}
+        export_dir = os.getenv('TRACE_EXPORT_DIR', config.get('export_dir') or '')
+        if export_dir and not os.path.isabs(export_dir):
+            export_dir = os.path.join(BASE_DIR, export_dir)
+        return cls(config.get('enabled', True), config.get('ring_size', 500), config.get('max_spans', 1000),
+                   export_dir or None)
+
+    def start(self, name: str, /, **attributes):
+        """Open a span as the current one; returns (span, token) for finish(), or (None, None) when off"""
+        if not self.enabled:
+            return None, None
+        parent = _current.get()
+        if parent is not None:
+            root = parent.root
+            if root.span_count >= self.max_spans:
+                self.counts['dropped_spans'] += 1
+                return None, None
+            root.span_count += 1
+        span = Span(name, parent, attributes)
+        if parent is not None:
+            parent.children.append(span)
+        return span, _current.set(span)
+
+    def finish(self, span: Optional[Span], token, error: BaseException = None):
+        if span is None:
+            return
+        span.end = time.perf_counter()
+        if error is not None:
+            span.error = f'{type(error).__name__}: {error}'
+        try:
+            _current.reset(token)
+        except ValueError:
+            _current.set(span.parent)  # finished in another context, e.g. an async generator resumed by a new task
+        if span.parent is None:
+            with self._lock:
+                self._traces.append(span)
+                self.counts['traces'] += 1
+                self.counts['spans'] += span.span_count
+            if self.export_dir:
+                self._export(span)
+
+    @contextmanager
+    def span(self, name: str, /, **attributes):
+        """Time the enclosed block as a child of the current span (a new trace if there is none)"""
+        span, token = self.start(name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.finish(span, token, e)
+            raise
+        self.finish(span, token)
+
+    def traced(self, name: str = None):
+        """Decorator form of span() for sync and async functions"""
+        def decorate(func):
+            span_name = name or func.__qualname__
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def recent(self, limit: int = 50, min_ms: float = 0, name: str = None) -> List[Dict]:
+        """Summaries of the latest finished traces, newest first"""
+        with self._lock:
+            traces = list(self._traces)
+        result = []
+        for root in reversed(traces):
+            if root.duration_ms < min_ms or (name and name not in root.name):
+                continue
+            result.append(root.summary())
+            if len(result) >= limit:
+                break
+        return result
+
+    def get(self, trace_id: str) -> Optional[Dict]:
+        with self._lock:
+            traces = list(self._traces)
+        for root in traces:
+            if root.trace_id == trace_id:
+                return dict(root.summary(), tree=root.to_dict(), server_timing=server_timing(root))
+        return None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            buffered = len(self._traces)
+        return {'enabled': self.enabled, 'buffered': buffered, 'ring_size': self._traces.maxlen,
+                'export_dir': self.export_dir, **self.counts}
+
+    def _export(self, root: Span):
+        path = os.path.join(self.export_dir, f"traces-{datetime.now():%Y%m%d}.jsonl")
+        line = json.dumps(otlp_json(root, self.service), ensure_ascii=False, default=str)
+        try:
+            with self._export_lock:
+                os.makedirs(self.export_dir, exist_ok=True)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            self.counts['exported'] += 1
+        except OSError:
+            self.counts['export_errors'] += 1
+
+
+tracer = Tracer.from_config()
+span = tracer.span
+traced = tracer.traced
+
+
+def trace_flask(app, server: str):
+    """One root span per request, with Server-Timing and X-Trace-Id response headers"""
+    from flask import g, request
+
+    tracer.service = server
+
+    @app.before_request
+    def _trace_start():
+        g.trace = tracer.start(f'{request.method} {request.endpoint or "unmatched"}',
+                               server=server, path=request.path)
+
+    @app.after_request
+    def _trace_headers(response):
+        root = g.get('trace', (None, None))[0]
+        if root is not None:
+            root.set(status=response.status_code)
+            response.headers['Server-Timing'] = server_timing(root)
+            response.headers['X-Trace-Id'] = root.trace_id
+        return response
+
+    @app.teardown_request
+    def _trace_finish(error=None):
+        root, token = g.pop('trace', (None, None))
+        tracer.finish(root, token, error)
+
+    return app
+
+
+def trace_fastapi(app, server: str):
+    """FastAPI twin of trace_flask()"""
+    tracer.service = server
+
+    @app.middleware('http')
+    async def _trace_middleware(request, call_next):
+        root, token = tracer.start(f'{request.method} {request.url.path}', server=server)
+        try:
+            response = await call_next(request)
+        except BaseException as e:
+            tracer.finish(root, token, e)
+            raise
+        if root is not None:
+            route = request.scope.get('route')
+            if route is not None:
+                root.name = f'{request.method} {route.path}'
+            root.set(status=response.status_code)
+            response.headers['Server-Timing'] = server_timing(root)
+            response.headers['X-Trace-Id'] = root.trace_id
+        tracer.finish(root, token)
+        return response
+
+    return app
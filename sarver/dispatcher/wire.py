@@ -0,0 +1,108 @@
+"""
+Wire formats for the monitoring WebSockets.
+
+Clients pick a format when they connect, by offering a WebSocket subprotocol
+(or with ?format= where subprotocols are awkward):
+
+- `zombiecoder.json.v1`, or nothing: JSON text frames, as before
+- `zombiecoder.msgpack.v1`: binary msgpack frames carrying deltas
+
+A binary frame is a map:
+
+    {"k": "snapshot" | "delta" | "event", "t": topic, "q": seq, "d": {...}, "x": [[path], ...]}
+
+A snapshot's "d" is the full state. A delta's "d" holds only the values that
+changed since the previous frame, nested dicts included (diff()). "x" lists
+the paths of removed keys, and "q" is a sequence number. An event is a
+one-off message with no state to diff against (a notification without an
+id): "t" is null, "d" is the whole message and the state is left as it was.
+A client applies deltas with patch() or its own equivalent, and starts over
+from the next snapshot whenever the server resyncs it. msgpack is optional:
+without it only JSON is offered. The servers also negotiate
+permessage-deflate, which compresses either format on the wire.
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+SUBPROTOCOLS = {'zombiecoder.msgpack.v1': MSGPACK, 'zombiecoder.json.v1': JSON}
+
+
+def offered_subprotocols() -> List[str]:
+    """Subprotocols this process can speak, preferred first"""
+    return [name for name, fmt in SUBPROTOCOLS.items() if fmt != MSGPACK or MSGPACK_AVAILABLE]
+
+
+def negotiate(subprotocols: Iterable[str] = (), path: str = '') -> Tuple[str, Optional[str]]:
+    """(format, subprotocol to accept) from the client's offer, falling back to ?format= and then JSON"""
+    available = offered_subprotocols()
+    for name in subprotocols or ():
+        name = name.strip()
+        if name in available:
+            return SUBPROTOCOLS[name], name
+    requested = parse_qs(urlsplit(path or '').query).get('format', [JSON])[0]
+    if requested == MSGPACK and MSGPACK_AVAILABLE:
+        return MSGPACK, None
+    return JSON, None
+
+
+def encode(message: Any, fmt: str = JSON):
+    """str for JSON (a text frame), bytes for msgpack (a binary frame)"""
+    if fmt == MSGPACK:
+        return msgpack.packb(message, use_bin_type=True, default=str)
+    return json.dumps(message, ensure_ascii=False, default=str, separators=(',', ':'))
+
+
+def decode(data) -> Any:
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+
+def diff(old: Dict, new: Dict, path: Tuple = ()) -> Tuple[Dict, List[List]]:
+    """(changed values, removed key paths) turning `old` into `new`; nested dicts are diffed too"""
+    changes, removed = {}, []
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested, nested_removed = diff(old[key], value, path + (key,))
+            if nested:
+                changes[key] = nested
+            removed += nested_removed
+        elif old[key] != value:
+            changes[key] = value
+    removed += [list(path + (key,)) for key in old if key not in new]
+    return changes, removed
+
+
+def patch(state: Dict, changes: Dict, removed: Iterable[List] = ()) -> Dict:
+    """Apply a diff() to a copy of `state`; what a binary client does with each delta"""
+    result = dict(state)
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = patch(result[key], value)
+        else:
+            result[key] = value
+    for path in removed:
+        target = result
+        for key in path[:-1]:
+            target[key] = dict(target.get(key, {}))
+            target = target[key]
+        target.pop(path[-1], None)
+    return result
+
+
+def frame(kind: str, topic: Optional[str], seq: int, data: Dict, removed: List = None) -> Dict:
+    message = {'k': kind, 't': topic, 'q': seq, 'd': data}
+    if removed:
+        message['x'] = removed
+    return message
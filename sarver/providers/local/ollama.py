@@ -1,6 +1,238 @@
+"""
+Ollama Provider - talks to the Ollama HTTP API instead of forking the CLI
+"""
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+import requests
+import yaml
+
+from dispatcher.aio import get_async_client, run_sync
+from dispatcher.deadline import attempt_timeout
+
+PROVIDERS_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../ai/config/providers.yaml')
+DEFAULT_BASE_URL = 'http://localhost:11434'
+DEFAULT_MODEL = 'llama3'
+DEFAULT_KEEP_ALIVE = '5m'
+MAX_SESSIONS = 256
+
+
+def load_ollama_config() -> Dict:
+    """Load the ollama section of ai/config/providers.yaml, with env overrides"""
+    config = {}
+    if os.path.exists(PROVIDERS_CONFIG_PATH):
+        with open(PROVIDERS_CONFIG_PATH, 'r', encoding='utf-8') as f:
+            config = (yaml.safe_load(f) or {}).get('providers', {}).get('ollama', {}) or {}
+    return {
+        'base_url': os.getenv('OLLAMA_BASE_URL', config.get('base_url', DEFAULT_BASE_URL)),
+        'model': os.getenv('OLLAMA_MODEL', config.get('model', DEFAULT_MODEL)),
+        'keep_alive': os.getenv('OLLAMA_KEEP_ALIVE', config.get('keep_alive', DEFAULT_KEEP_ALIVE)),
+        'temperature': config.get('temperature'),
+        'timeout': config.get('timeout', 120),
+    }
+
+
+class OllamaClient:
+    def __init__(self, base_url: str = None, model: str = None, keep_alive=None,
+                 temperature: float = None, timeout: float = 120):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip('/')
+        self.model = model or DEFAULT_MODEL
+        self.keep_alive = keep_alive if keep_alive is not None else DEFAULT_KEEP_ALIVE
+        self.temperature = temperature
+        self.timeout = timeout
+        self.http = requests.Session()
+        # session_id -> context tokens returned by the last turn
+        self._contexts: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _build_payload(self, prompt: str, model: str = None, options: Dict = None,
+                       keep_alive=None, session_id: str = None, system: str = None,
+                       stream: bool = False) -> Dict:
+        payload = {
+            'model': model or self.model,
+            'prompt': prompt,
+            'stream': stream,
+            'keep_alive': keep_alive if keep_alive is not None else self.keep_alive,
+        }
+        merged_options = {}
+        if self.temperature is not None:
+            merged_options['temperature'] = self.temperature
+        merged_options.update(options or {})
+        if merged_options:
+            payload['options'] = merged_options
+        if system:
+            payload['system'] = system
+        context = self.get_context(session_id)
+        if context:
+            payload['context'] = context
+        return payload
+
+    def get_context(self, session_id: Optional[str]) -> Optional[List[int]]:
+        """Return the stored context for a session, if any"""
+        if not session_id:
+            return None
+        with self._lock:
+            context = self._contexts.get(session_id)
+            if context is not None:
+                self._contexts.move_to_end(session_id)
+            return context
+
+    def _store_context(self, session_id: Optional[str], context: Optional[List[int]]):
+        if not session_id or not context:
+            return
+        with self._lock:
+            self._contexts[session_id] = context
+            self._contexts.move_to_end(session_id)
+            while len(self._contexts) > MAX_SESSIONS:
+                self._contexts.popitem(last=False)
+
+    def reset_session(self, session_id: str):
+        """Forget the context of a multi-turn session"""
+        with self._lock:
+            self._contexts.pop(session_id, None)
+
+    def generate(self, prompt: str, model: str = None, options: Dict = None, keep_alive=None,
+                 session_id: str = None, system: str = None) -> Dict:
+        """Run a single non-streaming completion and return Ollama's JSON reply"""
+        payload = self._build_payload(prompt, model, options, keep_alive, session_id, system, stream=False)
+        response = self.http.post(f'{self.base_url}/api/generate', json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        self._store_context(session_id, data.get('context'))
+        return data
+
+    def stream(self, prompt: str, model: str = None, options: Dict = None, keep_alive=None,
+               session_id: str = None, system: str = None) -> Iterator[str]:
+        """Yield response tokens as Ollama produces them"""
+        payload = self._build_payload(prompt, model, options, keep_alive, session_id, system, stream=True)
+        with self.http.post(f'{self.base_url}/api/generate', json=payload,
+                            timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    raise RuntimeError(chunk['error'])
+                token = chunk.get('response', '')
+                if token:
+                    yield token
+                if chunk.get('done'):
+                    self._store_context(session_id, chunk.get('context'))
+                    break
+
+    async def agenerate(self, prompt: str, model: str = None, options: Dict = None, keep_alive=None,
+                        session_id: str = None, system: str = None) -> Dict:
+        """Async twin of generate() on the shared dispatch loop"""
+        payload = self._build_payload(prompt, model, options, keep_alive, session_id, system, stream=False)
+        response = await get_async_client().post(f'{self.base_url}/api/generate', json=payload,
+                                                 timeout=attempt_timeout(self.timeout))
+        response.raise_for_status()
+        data = response.json()
+        self._store_context(session_id, data.get('context'))
+        return data
+
+    async def astream(self, prompt: str, model: str = None, options: Dict = None, keep_alive=None,
+                      session_id: str = None, system: str = None) -> AsyncIterator[str]:
+        """Async twin of stream()"""
+        payload = self._build_payload(prompt, model, options, keep_alive, session_id, system, stream=True)
+        async with get_async_client().stream('POST', f'{self.base_url}/api/generate', json=payload,
+                                             timeout=attempt_timeout(self.timeout)) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    raise RuntimeError(chunk['error'])
+                token = chunk.get('response', '')
+                if token:
+                    yield token
+                if chunk.get('done'):
+                    self._store_context(session_id, chunk.get('context'))
+                    break
+
+    def load_model(self, model: str = None, keep_alive=None) -> Dict:
+        """Preload a model into memory without generating anything"""
+        payload = {
+            'model': model or self.model,
+            'keep_alive': keep_alive if keep_alive is not None else self.keep_alive,
+        }
+        response = self.http.post(f'{self.base_url}/api/generate', json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def unload_model(self, model: str = None) -> Dict:
+        """Evict a model from memory right away"""
+        return self.load_model(model, keep_alive=0)
+
+    def running_models(self) -> List[Dict]:
+        """List models currently resident in memory"""
+        response = self.http.get(f'{self.base_url}/api/ps', timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get('models', [])
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient(**load_ollama_config())
+        return _client
+
+
+def _request_kwargs(request) -> Dict:
+    options = request.get('options')
+    if request.get('temperature') is not None:
+        options = {'temperature': request['temperature'], **(options or {})}
+    return {
+        'model': request.get('model'),
+        'options': options,
+        'keep_alive': request.get('keep_alive'),
+        # history already rendered into the prompt by dispatcher/context.py; don't add Ollama's own
+        'session_id': None if request.get('messages') else request.get('session_id'),
+        'system': request.get('system'),
+    }
+
+
+def _format_result(data: Dict) -> Dict:
+    return {
+        'provider': 'ollama',
+        'response': data.get('response', ''),
+        'model': data.get('model'),
+        'eval_count': data.get('eval_count'),
+        'prompt_eval_count': data.get('prompt_eval_count'),
+        'total_duration': data.get('total_duration'),
+    }
+
+
+async def astream(request):
+    prompt = request.get('prompt', '')
+    async for token in get_client().astream(prompt, **_request_kwargs(request)):
+        yield token
+
+
+async def arun(request):
+    prompt = request.get('prompt', '')
+    client = get_client()
+    try:
+        if request.get('stream'):
+            return {'provider': 'ollama', 'stream': client.astream(prompt, **_request_kwargs(request))}
+        data = await client.agenerate(prompt, **_request_kwargs(request))
+        return _format_result(data)
+    except Exception as e:
+        return {'error': str(e)}
+
+
 def run(request):
-    import subprocess
-    prompt = request.get("prompt", "")
-    cmd = f"ollama run llama3 \"{prompt}\""
-    result = subprocess.getoutput(cmd)
-    return {"response": result} 
\ No newline at end of file
+    prompt = request.get('prompt', '')
+    if request.get('stream'):
+        return {'provider': 'ollama', 'stream': get_client().stream(prompt, **_request_kwargs(request))}
+    return run_sync(arun(request))
@@ -1,28 +1,51 @@
-import requests
+import os
+from dispatcher.aio import DEFAULT_TIMEOUT, get_async_client, run_sync
+from dispatcher.deadline import attempt_timeout
+from dispatcher.streaming import iter_chat_deltas
 
-def run(request):
+def _build_call(request):
     prompt = request.get('prompt', '')
     api_key = os.getenv('OPENAI_API_KEY')
     model = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
     base_url = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
-    if not api_key:
-        return {'error': 'OPENAI_API_KEY not set'}
     headers = {
         'Authorization': f'Bearer {api_key}',
         'Content-Type': 'application/json'
     }
     data = {
         'model': model,
-        'messages': [
+        # a session's history arrives as messages (dispatcher/context.py)
+        'messages': request.get('messages') or [
             {'role': 'user', 'content': prompt}
         ]
     }
+    if request.get('temperature') is not None:
+        data['temperature'] = request['temperature']
+    return api_key, f'{base_url}/chat/completions', headers, data
+
+async def arun(request):
+    api_key, url, headers, data = _build_call(request)
+    if not api_key:
+        return {'error': 'OPENAI_API_KEY not set'}
     try:
-        response = requests.post(f'{base_url}/chat/completions', headers=headers, json=data, timeout=10)
+        response = await get_async_client().post(url, headers=headers, json=data, timeout=attempt_timeout(DEFAULT_TIMEOUT))
         response.raise_for_status()
         # Decode response safely for Windows
         decoded = response.content.decode('utf-8', errors='replace')
         result = response.json() if decoded else {}
         return {'provider': 'openai', 'response': result}
     except Exception as e:
-        return {'error': str(e)} 
\ No newline at end of file
+        return {'error': str(e)}
+
+async def astream(request):
+    api_key, url, headers, data = _build_call(request)
+    if not api_key:
+        raise RuntimeError('OPENAI_API_KEY not set')
+    data['stream'] = True
+    async with get_async_client().stream('POST', url, headers=headers, json=data, timeout=attempt_timeout(DEFAULT_TIMEOUT)) as response:
+        response.raise_for_status()
+        async for token in iter_chat_deltas(response):
+            yield token
+
+def run(request):
+    return run_sync(arun(request))
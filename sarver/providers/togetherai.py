@@ -1,26 +1,34 @@
 import os
-import requests
+from dispatcher.aio import DEFAULT_TIMEOUT, get_async_client, run_sync
+from dispatcher.deadline import attempt_timeout
+from dispatcher.streaming import iter_chat_deltas
 
-def run(request):
+def _build_call(request):
     prompt = request.get('prompt', '')
     api_key = os.getenv('TOGETHER_API_KEY')
     model = os.getenv('TOGETHER_MODEL', 'mistralai/Mixtral-8x7B-Instruct-v0.1')
     base_url = os.getenv('TOGETHER_BASE_URL', 'https://api.together.xyz/v1')
-    if not api_key:
-        return {'error': 'TOGETHER_API_KEY not set'}
     headers = {
         'Authorization': f'Bearer {api_key}',
         'Content-Type': 'application/json'
     }
     data = {
         'model': model,
-        'messages': [
+        # a session's history arrives as messages (dispatcher/context.py)
+        'messages': request.get('messages') or [
             {'role': 'user', 'content': prompt}
         ]
     }
-    url = f'{base_url}/chat/completions'
+    if request.get('temperature') is not None:
+        data['temperature'] = request['temperature']
+    return api_key, f'{base_url}/chat/completions', headers, data
+
+async def arun(request):
+    api_key, url, headers, data = _build_call(request)
+    if not api_key:
+        return {'error': 'TOGETHER_API_KEY not set'}
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=10)
+        response = await get_async_client().post(url, headers=headers, json=data, timeout=attempt_timeout(DEFAULT_TIMEOUT))
         if response.status_code == 404:
             return {'error': 'HTTP 404: Check TogetherAI endpoint or API key'}
         response.raise_for_status()
@@ -28,4 +36,17 @@ def run(request):
         result = response.json() if decoded else {}
         return {'provider': 'togetherai', 'response': result}
     except Exception as e:
-        return {'error': str(e)} 
\ No newline at end of file
+        return {'error': str(e)}
+
+async def astream(request):
+    api_key, url, headers, data = _build_call(request)
+    if not api_key:
+        raise RuntimeError('TOGETHER_API_KEY not set')
+    data['stream'] = True
+    async with get_async_client().stream('POST', url, headers=headers, json=data, timeout=attempt_timeout(DEFAULT_TIMEOUT)) as response:
+        response.raise_for_status()
+        async for token in iter_chat_deltas(response):
+            yield token
+
+def run(request):
+    return run_sync(arun(request))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Offline accuracy/latency benchmark for the mcp intent classifier.
+
+Trains on part of the labelled examples (and logged traffic), then compares
+the classifier, the keyword router and the two combined (classifier when
+confident, keyword rules otherwise) on the held-out rest.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add parent directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from ai.server.mcp.intent_classifier import (
+    ACTIVITY_LOG, EXAMPLES_PATH, IntentClassifier, evaluate, load_activity_log,
+    load_classifier_config, load_examples, split_examples,
+)
+from ai.server.mcp.intent_router import IntentRouter
+
+
+def main():
+    config = load_classifier_config()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--examples', default=EXAMPLES_PATH)
+    parser.add_argument('--activity-log', default=ACTIVITY_LOG)
+    parser.add_argument('--holdout', type=float, default=0.3)
+    parser.add_argument('--min-confidence', type=float, default=config['min_confidence'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    examples = load_examples(args.examples)
+    examples += load_activity_log(args.activity_log, {agent for _, agent in examples}) if args.activity_log else []
+    train, test = split_examples(examples, args.holdout, args.seed)
+    model = IntentClassifier.train(*zip(*train))
+
+    router = IntentRouter()
+
+    def keyword_agent(prompt):
+        route = router.route(prompt)
+        return route.get('agent', route.get('agent_type'))
+
+    report = evaluate(model, test, args.min_confidence, fallback=keyword_agent)
+    report['train_examples'] = len(train)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
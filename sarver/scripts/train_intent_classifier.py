@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Train the local mcp intent classifier.
+
+Uses the labelled examples in ai/config/intent_examples.jsonl plus prompts
+from logs/agent_activity.log whose agent is one of the labelled agents (a
+random sample of at most --max-logged of them), and writes the model
+configured in ai/config/intent_routes.yaml.
+"""
+
+import argparse
+import os
+import random
+import sys
+
+# Add parent directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from ai.server.mcp.intent_classifier import (
+    ACTIVITY_LOG, EXAMPLES_PATH, IntentClassifier, evaluate, load_activity_log,
+    load_classifier_config, load_examples, split_examples,
+)
+
+
+def main():
+    config = load_classifier_config()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--examples', default=EXAMPLES_PATH, help='labelled JSON Lines file')
+    parser.add_argument('--activity-log', default=ACTIVITY_LOG, help='agent_activity.log to mine ("" to skip)')
+    parser.add_argument('--output', default=config['model'])
+    parser.add_argument('--epochs', type=int, default=100)
+    parser.add_argument('--max-logged', type=int, default=20000,
+                        help='sample at most this many activity-log prompts (0 for no limit)')
+    parser.add_argument('--holdout', type=float, default=0.0,
+                        help='fraction kept back to report accuracy before training on everything')
+    args = parser.parse_args()
+
+    examples = load_examples(args.examples)
+    agents = {agent for _, agent in examples}
+    logged = load_activity_log(args.activity_log, agents) if args.activity_log else []
+    if args.max_logged and len(logged) > args.max_logged:
+        print(f"✂️  sampling {args.max_logged} of {len(logged)} logged prompts")
+        logged = random.Random(0).sample(logged, args.max_logged)
+    examples += logged
+    print(f"📚 {len(examples)} examples ({len(logged)} from the activity log), agents: {', '.join(sorted(agents))}")
+
+    if args.holdout:
+        train, test = split_examples(examples, args.holdout)
+        model = IntentClassifier.train(*zip(*train), epochs=args.epochs)
+        print(f"📊 holdout: {evaluate(model, test, config['min_confidence'])}")
+
+    model = IntentClassifier.train(*zip(*examples), epochs=args.epochs)
+    model.save(args.output)
+    print(f"✅ model saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -31,7 +31,13 @@ import datetime
 #     if monitor:
 #         monitor.stop()
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dispatcher.metrics import instrument_fastapi
+from dispatcher.tracing import trace_fastapi
+
 app = FastAPI()
+instrument_fastapi(app, "admin")  # GET /metrics
+trace_fastapi(app, "admin")  # Server-Timing header
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
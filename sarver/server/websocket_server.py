@@ -1,48 +1,197 @@
 import asyncio
 import json
 import logging
-from typing import Dict, Set
+import os
+import sys
+from collections import OrderedDict
+from typing import Dict
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
+from prometheus_client import Counter, Histogram
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dispatcher.metrics import LATENCY_BUCKETS, collector, gauge_family, instrument_fastapi, registry
+from dispatcher.pubsub import Subscriber, SubscriberClosed, dumps
+from dispatcher.wire import JSON, diff, encode, frame, negotiate
+from dispatcher.tracing import trace_fastapi
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-client send queue; see dispatcher.pubsub for the slow-consumer policies
+QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", 256))
+SLOW_CLIENT_POLICY = os.getenv("NOTIFY_SLOW_CLIENT_POLICY", "coalesce")
+# latest updates kept per channel for msgpack clients' snapshots and deltas
+STATE_KEYS = int(os.getenv("NOTIFY_STATE_KEYS", 1024))
+
+QUEUE_LAG_SECONDS = Histogram(
+    "zombiecoder_websocket_queue_lag_seconds", "Time notifications wait in a client's send queue", ("channel",),
+    buckets=LATENCY_BUCKETS, registry=registry)
+SLOW_CLIENT_EVENTS = Counter(
+    "zombiecoder_websocket_slow_client_events", "Notifications dropped or coalesced, and clients disconnected, for slow clients",
+    ("channel", "action"), registry=registry)
+
 class NotificationManager:
-    def __init__(self):
-        self.active_connections: Dict[str, Set[WebSocket]] = {
-            "agent_status": set(),
-            "provider_status": set(),
-            "system_status": set()
+    """
+    Fans notifications out to WebSocket clients without waiting on any of them.
+
+    broadcast() serializes a message once and queues it for every client on
+    the channel; each client has a bounded Subscriber queue drained by its own
+    sender task, so a slow client only delays itself. Status updates are
+    keyed by (type, id), which lets the coalesce policy replace an update the
+    client hasn't received yet with the newer one.
+
+    Clients that negotiate msgpack (dispatcher.wire) get a snapshot of the
+    channel's latest update per key when they connect, then binary deltas
+    against the previous update for the same key. They are never coalesced or
+    dropped from: an overflowing queue is replaced by a fresh snapshot. That
+    per-key state is only kept while the channel has a msgpack client, and
+    for at most `state_keys` keys (least recently updated go first; an
+    evicted key's next update is sent whole).
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE, policy: str = SLOW_CLIENT_POLICY,
+                 state_keys: int = STATE_KEYS):
+        self.queue_size = queue_size
+        self.policy = policy
+        self.state_keys = state_keys
+        self.active_connections: Dict[str, Dict[WebSocket, Subscriber]] = {
+            "agent_status": {},
+            "provider_status": {},
+            "system_status": {}
         }
+        self._senders: Dict[WebSocket, asyncio.Task] = {}
+        self._state: Dict[str, "OrderedDict[str, dict]"] = {}  # channel -> latest update per key, while it has binary clients
+        self._seq: Dict[str, int] = {}
+        self.counts = {"broadcasts": 0, "queued": 0, "disconnected_slow": 0, "resyncs": 0}
 
     async def connect(self, websocket: WebSocket, channel: str):
-        await websocket.accept()
+        query = websocket.url.query
+        fmt, subprotocol = negotiate(websocket.scope.get("subprotocols", []), f"?{query}" if query else "")
+        await websocket.accept(subprotocol=subprotocol)
         if channel not in self.active_connections:
-            self.active_connections[channel] = set()
-        self.active_connections[channel].add(websocket)
+            self.active_connections[channel] = {}
+        subscriber = Subscriber(self.queue_size, self.policy, fmt)
+        if fmt != JSON:
+            self._state.setdefault(channel, OrderedDict())
+            subscriber.offer(self._snapshot(channel, fmt))
+        self.active_connections[channel][websocket] = subscriber
+        self._senders[websocket] = asyncio.create_task(self._sender(websocket, channel, subscriber))
         logger.info(f"Client connected to channel: {channel}")
 
     def disconnect(self, websocket: WebSocket, channel: str):
-        self.active_connections[channel].remove(websocket)
+        connections = self.active_connections.get(channel, {})
+        subscriber = connections.pop(websocket, None)
+        if subscriber is None:
+            return
+        subscriber.close()
+        if subscriber.format != JSON and all(s.format == JSON for s in connections.values()):
+            self._state.pop(channel, None)  # the last binary client is gone
+            self._seq.pop(channel, None)
+        sender = self._senders.pop(websocket, None)
+        if sender is not None and sender is not asyncio.current_task():
+            sender.cancel()
         logger.info(f"Client disconnected from channel: {channel}")
 
-    async def broadcast(self, message: dict, channel: str):
-        if channel not in self.active_connections:
-            return
-        
-        dead_connections = set()
-        for connection in self.active_connections[channel]:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to client: {e}")
-                dead_connections.add(connection)
-        
-        # Clean up dead connections
-        for dead in dead_connections:
-            self.active_connections[channel].remove(dead)
+    async def _sender(self, websocket: WebSocket, channel: str, subscriber: Subscriber):
+        """Drain one client's queue; the only task that sends on this connection"""
+        lag = QUEUE_LAG_SECONDS.labels(channel)
+        try:
+            while True:
+                message = await subscriber.get()
+                lag.observe(subscriber.last_lag)
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+        except SubscriberClosed:
+            if websocket in self.active_connections.get(channel, {}):  # closed by the policy, not by disconnect()
+                self.counts["disconnected_slow"] += 1
+                SLOW_CLIENT_EVENTS.labels(channel, "disconnect").inc()
+                logger.warning(f"Disconnecting slow client on channel {channel}: send queue full")
+                try:
+                    await websocket.close(code=1013)  # try again later
+                except Exception:
+                    pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending to client: {e}")
+        finally:
+            self.disconnect(websocket, channel)
+
+    def send(self, websocket: WebSocket, channel: str, message: dict):
+        """Queue a message for one client, behind what it's already waiting for"""
+        subscriber = self.active_connections.get(channel, {}).get(websocket)
+        if subscriber is not None:
+            subscriber.offer(encode(message, subscriber.format))
+
+    def _snapshot(self, channel: str, fmt: str):
+        return encode(frame("snapshot", channel, self._seq.get(channel, 0), self._state.get(channel, {})), fmt)
+
+    async def broadcast(self, message: dict, channel: str) -> int:
+        """Queue the message for every client on the channel; returns how many took it"""
+        connections = self.active_connections.get(channel)
+        if not connections:
+            return 0
+        key = (message.get("type"), message.get("id")) if message.get("id") is not None else None
+        state, binary = self._state.get(channel), None
+        if state is not None:
+            seq = self._seq[channel] = self._seq.get(channel, 0) + 1
+            if key is not None:
+                state_key = f"{key[0]}:{key[1]}"
+                previous = state.pop(state_key, {})
+                state[state_key] = message  # most recently updated last
+                while len(state) > self.state_keys:
+                    state.popitem(last=False)
+                binary = frame("delta", state_key, seq, *diff(previous, message))
+            else:
+                binary = frame("event", None, seq, message)
+        encoded = {}
+        queued = dropped = coalesced = 0
+        for subscriber in list(connections.values()):
+            fmt = subscriber.format
+            out = encoded.get(fmt)
+            if out is None:
+                out = encoded[fmt] = dumps(message) if fmt == JSON else encode(binary, fmt)
+            if fmt != JSON:
+                if subscriber.depth >= subscriber.maxsize and subscriber.policy != "disconnect":
+                    subscriber.clear()  # a lost delta would corrupt the client's state: start it over
+                    out = encoded.get(("snapshot", fmt)) or encoded.setdefault(("snapshot", fmt), self._snapshot(channel, fmt))
+                    subscriber.resyncs += 1
+                    self.counts["resyncs"] += 1
+                queued += subscriber.offer(out)
+                continue
+            before = subscriber.dropped, subscriber.coalesced
+            queued += subscriber.offer(out, key)
+            dropped += subscriber.dropped - before[0]
+            coalesced += subscriber.coalesced - before[1]
+        if dropped:
+            SLOW_CLIENT_EVENTS.labels(channel, "drop_oldest").inc(dropped)
+        if coalesced:
+            SLOW_CLIENT_EVENTS.labels(channel, "coalesce").inc(coalesced)
+        self.counts["broadcasts"] += 1
+        self.counts["queued"] += queued
+        return queued
+
+    def stats(self) -> Dict:
+        """Clients, queue depth and lag per channel"""
+        channels = {}
+        for channel, connections in list(self.active_connections.items()):
+            subscribers = list(connections.values())
+            channels[channel] = {
+                "clients": len(subscribers),
+                "binary_clients": sum(s.format != JSON for s in subscribers),
+                "state_keys": len(self._state.get(channel, ())),
+                "queued": sum(s.depth for s in subscribers),
+                "max_depth": max((s.depth for s in subscribers), default=0),
+                "oldest_wait_ms": round(max((s.oldest_wait() for s in subscribers), default=0.0) * 1000, 2),
+                "max_lag_ms": round(max((s.max_lag for s in subscribers), default=0.0) * 1000, 2),
+                "dropped": sum(s.dropped for s in subscribers),
+                "coalesced": sum(s.coalesced for s in subscribers)
+            }
+        return {"policy": self.policy, "queue_size": self.queue_size, "channels": channels, **self.counts}
 
 class StatusUpdate(BaseModel):
     type: str
@@ -52,6 +201,18 @@ class StatusUpdate(BaseModel):
 
 app = FastAPI()
 manager = NotificationManager()
+instrument_fastapi(app, "notifications")  # GET /metrics
+trace_fastapi(app, "notifications")  # Server-Timing header
+
+@collector
+def _connection_metrics():
+    stats = manager.stats()["channels"]
+    yield gauge_family("zombiecoder_websocket_connections", "Open WebSocket connections per channel",
+                       [({"channel": channel}, s["clients"]) for channel, s in stats.items()])
+    yield gauge_family("zombiecoder_websocket_queued_messages", "Notifications waiting in client send queues",
+                       [({"channel": channel}, s["queued"]) for channel, s in stats.items()])
+    yield gauge_family("zombiecoder_websocket_oldest_wait_seconds", "Age of the oldest queued notification per channel",
+                       [({"channel": channel}, s["oldest_wait_ms"] / 1000) for channel, s in stats.items()])
 
 @app.websocket("/ws/{channel}")
 async def websocket_endpoint(websocket: WebSocket, channel: str):
@@ -63,10 +224,12 @@ async def websocket_endpoint(websocket: WebSocket, channel: str):
             try:
                 message = json.loads(data)
                 # Handle client messages if needed
-                await websocket.send_json({"status": "received"})
+                manager.send(websocket, channel, {"status": "received"})
             except json.JSONDecodeError:
-                await websocket.send_json({"error": "Invalid JSON"})
+                manager.send(websocket, channel, {"error": "Invalid JSON"})
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket, channel)
 
 @app.post("/notify/{channel}")
@@ -79,8 +242,13 @@ async def notify(channel: str, update: StatusUpdate):
         "details": update.details,
         "timestamp": str(asyncio.get_event_loop().time())
     }
-    await manager.broadcast(message, channel)
-    return {"status": "notification sent"}
+    queued = await manager.broadcast(message, channel)
+    return {"status": "notification sent", "clients": queued}
+
+@app.get("/stats")
+async def notification_stats():
+    """Client counts, send-queue depth and lag per channel"""
+    return manager.stats()
 
 # Example usage in other parts of the application:
 """
@@ -126,4 +294,4 @@ ws.onmessage = (event) => {
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=True) 
\ No newline at end of file
@@ -1,19 +1,18 @@
 from flask import Flask, jsonify
-import psutil
 import time
 import os
+from dispatcher.system_stats import system_sampler
+from dispatcher.metrics import instrument_flask
+from dispatcher.tracing import trace_flask
 
 app = Flask(__name__)
+instrument_flask(app, 'simple_server')  # GET /metrics
+trace_flask(app, 'simple_server')  # Server-Timing header
 
 @app.route('/api/status')
 def status():
     """Get server status"""
     try:
-        # Get system information
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        
         return jsonify({
             'dispatcher_active': True,
             'latency_log': [
@@ -36,16 +35,7 @@ def status():
                 'last_error': None,
                 'fallback_chain': ['openai', 'anthropic']
             },
-            'system': {
-                'ram_percent': memory.percent,
-                'ram_total_gb': round(memory.total / (1024**3), 2),
-                'ram_available_gb': round(memory.available / (1024**3), 2),
-                'cpu_percent': cpu_percent,
-                'disk_percent': disk.percent,
-                'disk_total_gb': round(disk.total / (1024**3), 2),
-                'disk_free_gb': round(disk.free / (1024**3), 2),
-                'timestamp': time.time()
-            },
+            'system': system_sampler.snapshot(),
             'server_info': {
                 'port': 8000,
                 'uptime': time.time(),
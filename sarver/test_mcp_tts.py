@@ -1,8 +1,8 @@
 import sys
 import os
 import time
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'ai/server/mcp')))
-from dispatcher import run_agent
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from ai.server.mcp.dispatcher import run_agent
 from gtts import gTTS
 
 # প্রশ্নের লিস্ট
@@ -26,4 +26,4 @@ for idx, question in enumerate(questions, 1):
     filepath = os.path.join(output_dir, filename)
     tts = gTTS(text=text, lang='bn')
     tts.save(filepath)
-    print(f"Saved audio: {filepath}\n") 
\ No newline at end of file
+    print(f"Saved audio: {filepath}\n") 
\ No newline at end of file
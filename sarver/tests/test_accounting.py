@@ -0,0 +1,74 @@
+import os
+import tempfile
+import time
+import unittest
+from dispatcher.accounting import AgentAccounting, agent_accounting, approx_size, format_bytes
+from dispatcher.aio import run_sync, to_thread
+from ai.agents.memory_system import MemoryManager
+
+
+def spin(seconds):
+    end = time.thread_time() + seconds
+    while time.thread_time() < end:
+        pass
+
+
+class TestAgentAccounting(unittest.TestCase):
+    def test_measure_counts_wall_and_cpu(self):
+        accounting = AgentAccounting()
+        with accounting.measure('procoder'):
+            spin(0.02)
+        with self.assertRaises(ValueError):
+            with accounting.measure('procoder'):
+                raise ValueError('boom')
+        usage = accounting.snapshot('procoder')
+        self.assertEqual((usage['calls'], usage['errors']), (2, 1))
+        self.assertGreaterEqual(usage['cpu_ms']['total'], 15)
+        self.assertGreaterEqual(usage['wall_ms']['total'], usage['cpu_ms']['total'] * 0.9)
+        self.assertIsNotNone(usage['last_used'])
+        self.assertIsNone(accounting.snapshot('nobody'))
+
+    def test_worker_thread_cpu_goes_to_the_calling_agent(self):
+        async def call():
+            async with agent_accounting.ameasure('test_worker_agent'):
+                await to_thread(spin, 0.02)
+
+        agent_accounting.reset()
+        run_sync(call())
+        usage = agent_accounting.snapshot('test_worker_agent')
+        self.assertGreaterEqual(usage['cpu_ms']['total'], 15)
+        run_sync(to_thread(spin, 0.001))  # outside a call: nothing recorded
+        self.assertEqual(agent_accounting.agents(), ['test_worker_agent'])
+
+    def test_percentiles_over_the_window(self):
+        accounting = AgentAccounting(window=100)
+        for ms in range(1, 201):
+            accounting.record('mcp', ms / 1000)
+        wall = accounting.snapshot('mcp')['wall_ms']
+        self.assertEqual(wall['window'], 100)
+        self.assertAlmostEqual(wall['p50'], 150.5, places=1)
+        self.assertAlmostEqual(wall['p99'], 199.01, places=1)
+        self.assertEqual(accounting.snapshot('mcp')['calls'], 200)
+
+    def test_footprint(self):
+        accounting = AgentAccounting()
+        config = {'model': 'llama', 'tags': ['a', 'b']}
+        accounting.set_footprint('procoder', instance=approx_size(config))
+        self.assertGreater(accounting.snapshot('procoder')['memory_bytes'], 0)
+        self.assertIsNone(accounting.snapshot('procoder')['wall_ms']['p50'])
+        self.assertEqual(format_bytes(2048), '2.0KB')
+        self.assertEqual(format_bytes(None), 'N/A')
+
+    def test_memory_manager_reports_store_size(self):
+        with tempfile.TemporaryDirectory() as directory:
+            memory = MemoryManager(directory)
+            memory.set('test_store_agent', 'hello', 'world', is_agent=True)
+            footprint = agent_accounting.snapshot('test_store_agent')['footprint']
+            path = os.path.join(directory, 'agents_memory', 'test_store_agent_memory.json')
+            self.assertEqual(footprint['memory_store'], os.path.getsize(path))
+            self.assertEqual(footprint['memory_entries'], 1)
+            self.assertEqual(memory.store_size('test_store_agent'), os.path.getsize(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import time
+from unittest import mock
+import dispatcher.core as core
+from dispatcher.aio import run_sync, get_loop
+from dispatcher.cache import ResponseCache
+from dispatcher.metrics import DISPATCH_SECONDS
+from dispatcher.accounting import agent_accounting
+
+
+class SlowProvider:
+    """Async provider that just sleeps, like a slow LLM round-trip"""
+    def __init__(self, delay=0.1):
+        self.delay = delay
+
+    async def arun(self, request):
+        await asyncio.sleep(self.delay)
+        return {'provider': 'slow', 'response': request.get('prompt')}
+
+
+class GeneratorProvider:
+    """Returns a one-shot token generator, as ollama does for stream=True"""
+    async def arun(self, request):
+        await asyncio.sleep(0.05)
+        return {'provider': 'gen', 'stream': (t for t in request['prompt'].split())}
+
+
+class BrokenProvider:
+    def run(self, request):
+        raise RuntimeError('boom')
+
+
+class TestAsyncDispatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(core, 'LOG_ACTIVITY', os.path.join(self.tmp, 'activity.log')),
+            mock.patch.object(core, 'LOG_FALLBACK', os.path.join(self.tmp, 'fallback.log')),
+            mock.patch.object(core, 'USAGE_LOG', os.path.join(self.tmp, 'usage.log')),
+            mock.patch.object(core, 'response_cache', ResponseCache(base_dir=self.tmp)),
+            mock.patch.object(core, 'load_agent_profile', return_value={
+                'name': 'Zombie', 'preferred_provider': 'broken', 'fallback_order': ['slow']
+            }),
+        ]
+        for p in self.patches:
+            p.start()
+        providers = {'broken': BrokenProvider(), 'slow': SlowProvider()}
+        self.loader = mock.patch.object(core, 'load_provider', side_effect=providers.__getitem__)
+        self.loader.start()
+
+    def tearDown(self):
+        self.loader.stop()
+        for p in self.patches:
+            p.stop()
+
+    def test_sync_wrapper_falls_back(self):
+        """Sync dispatch() still walks the fallback chain"""
+        result = core.dispatch({'prompt': 'hello'})
+        self.assertEqual(result, {'provider': 'slow', 'response': 'hello'})
+
+    def test_many_calls_in_flight(self):
+        """Concurrent dispatches overlap instead of queueing on threads"""
+        async def fan_out():
+            return await asyncio.gather(*[core.dispatch_async({'prompt': str(i)}) for i in range(100)])
+
+        start = time.monotonic()
+        results = run_sync(fan_out())
+        elapsed = time.monotonic() - start
+        self.assertEqual([r['response'] for r in results], [str(i) for i in range(100)])
+        self.assertLess(elapsed, 2.0)
+
+    def test_stream_requests_are_not_coalesced(self):
+        """Each concurrent stream=True caller gets its own generator"""
+        async def fan_out():
+            return await asyncio.gather(*[core.dispatch_async({'prompt': 'a b', 'stream': True}) for _ in range(3)])
+
+        with mock.patch.object(core, 'load_agent_profile', return_value={
+            'name': 'Zombie', 'preferred_provider': 'gen', 'fallback_order': []
+        }), mock.patch.object(core, 'load_provider', return_value=GeneratorProvider()):
+            results = run_sync(fan_out())
+        self.assertEqual([list(r['stream']) for r in results], [['a', 'b']] * 3)
+
+    def test_unknown_agents_share_one_label(self):
+        """Arbitrary agent names in requests don't mint new metric label values"""
+        core.dispatch({'prompt': 'label me', 'agent': 'no-such-agent-1234'})
+        core.dispatch({'prompt': 'label me', 'agent': 'procoder'})
+        labels = {sample.labels['agent'] for sample in DISPATCH_SECONDS.collect()[0].samples}
+        self.assertIn('unknown', labels)
+        self.assertIn('procoder', labels)
+        self.assertNotIn('no-such-agent-1234', labels)
+        self.assertNotIn('no-such-agent-1234', agent_accounting.agents())
+        self.assertIn('unknown', agent_accounting.agents())
+
+    def test_run_sync_rejects_loop_thread(self):
+        """Calling the sync wrapper from inside the loop would deadlock"""
+        async def nested():
+            with self.assertRaises(RuntimeError):
+                run_sync(asyncio.sleep(0))
+
+        asyncio.run_coroutine_threadsafe(nested(), get_loop()).result(5)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
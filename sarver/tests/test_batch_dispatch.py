@@ -0,0 +1,100 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import time
+from unittest import mock
+import dispatcher.batch as batch
+import dispatcher.core as core
+from dispatcher.aio import iter_sync
+from dispatcher.cache import ResponseCache
+
+
+class CountingProvider:
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self.requests = []
+
+    async def arun(self, request):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        self.requests.append(request)
+        return {'response': request['prompt']}
+
+
+class TestParseBatch(unittest.TestCase):
+    def test_array_and_jsonl(self):
+        items = [{'agent': 'a', 'text': 'x'}, {'agent': 'b', 'text': 'y'}]
+        self.assertEqual(batch.parse_batch(b'[{"agent": "a", "text": "x"}, {"agent": "b", "text": "y"}]'), items)
+        self.assertEqual(batch.parse_batch('{"agent": "a", "text": "x"}\n\n{"agent": "b", "text": "y"}\n',
+                                           'application/x-ndjson'), items)
+        self.assertEqual(batch.parse_batch('{"items": [{"text": "x"}]}', 'application/json'), [{'text': 'x'}])
+        with self.assertRaises(ValueError):
+            batch.parse_batch('{"text": "x"}\nnot json')
+
+
+class TestDispatchBatch(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.slow = CountingProvider(0.05)
+        self.fast = CountingProvider(0.0)
+        providers = {'slow': self.slow, 'fast': self.fast}
+        self.patches = [
+            mock.patch.object(core, 'LOG_ACTIVITY', os.path.join(tmp, 'activity.log')),
+            mock.patch.object(core, 'USAGE_LOG', os.path.join(tmp, 'usage.log')),
+            mock.patch.object(core, 'response_cache', ResponseCache(base_dir=tmp)),
+            mock.patch.object(core, 'load_provider', side_effect=providers.__getitem__),
+            mock.patch.object(batch, 'load_agent_profile', return_value={
+                'name': 'Zombie', 'preferred_provider': 'slow', 'fallback_order': []
+            }),
+            mock.patch.object(core, 'load_agent_profile', return_value={
+                'name': 'Zombie', 'preferred_provider': 'slow', 'fallback_order': []
+            }),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_dedupe_limits_and_completion_order(self):
+        items = [{'text': f'slow {i % 6}'} for i in range(12)]
+        items += [{'text': 'fast', 'provider': 'fast'}, {'agent': 'x'}]
+        start = time.monotonic()
+        events = list(iter_sync(batch.dispatch_batch_async(items, provider_limits={'slow': 3})))
+        elapsed = time.monotonic() - start
+        done = events.pop()
+
+        self.assertEqual(sorted(e['index'] for e in events), list(range(14)))
+        self.assertEqual(self.slow.calls, 6)
+        self.assertEqual(self.slow.peak, 3)
+        self.assertLess(elapsed, 0.5)
+        # the fast provider isn't stuck behind the slow one's queue
+        order = [e['index'] for e in events]
+        self.assertLess(order.index(12), order.index(0))
+        self.assertFalse(events[0]['ok'])
+        self.assertEqual(done['unique'], 7)
+        self.assertEqual(done['deduplicated'], 6)
+        self.assertEqual(done['errors'], 1)
+        self.assertEqual(done['providers'], {'slow': 6, 'fast': 1})
+        answers = {e['index']: e['result']['response'] for e in events if e['ok']}
+        self.assertEqual(answers[7], 'slow 1')
+
+    def test_stream_flag_is_dropped(self):
+        events = list(iter_sync(batch.dispatch_batch_async(
+            [{'text': 'hi', 'stream': True}, {'text': 'hi'}], provider_limits={})))
+        done = events.pop()
+        self.assertEqual(done['unique'], 1)
+        self.assertTrue(all(e['ok'] and e['result']['response'] == 'hi' for e in events))
+        self.assertNotIn('stream', self.slow.requests[0])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
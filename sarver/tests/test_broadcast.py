@@ -0,0 +1,48 @@
+import threading
+import unittest
+from dispatcher.broadcast import EmitAggregator
+
+
+class TestEmitAggregator(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.aggregator = EmitAggregator(lambda event, payload, to: self.sent.append((event, to, payload)),
+                                         tick=0.25, max_events=3, start_task=lambda fn: None)
+
+    def test_one_batch_per_room_with_counters(self):
+        for latency in (100.0, 300.0, 200.0, 50.0):
+            self.aggregator.add('agent_response', {'agent': 'procoder', 'latency': latency},
+                                rooms=('dispatch', 'agent:procoder'), key='procoder', value=latency)
+        self.aggregator.add('agent_response', {'agent': 'mcp', 'latency': 10.0},
+                            rooms=('dispatch', 'agent:mcp'), key='mcp', value=10.0)
+        self.assertEqual(self.aggregator.flush(), 3)
+        batches = {to: payload for _, to, payload in self.sent}
+        self.assertEqual(batches['dispatch']['count'], 5)
+        self.assertEqual(len(batches['dispatch']['events']), 3)  # latest max_events only
+        procoder = batches['agent:procoder']['collapsed']['procoder']
+        self.assertEqual((procoder['count'], procoder['avg'], procoder['min'], procoder['max']), (4, 162.5, 50.0, 300.0))
+        self.assertEqual(procoder['last']['latency'], 50.0)
+        self.assertNotIn('mcp', batches['agent:procoder']['collapsed'])
+
+    def test_nothing_sent_without_events(self):
+        self.assertEqual(self.aggregator.flush(), 0)
+        self.aggregator.add('tts_complete', {'language': 'bn'}, rooms=('tts',))
+        self.aggregator.flush()
+        self.assertEqual(self.aggregator.flush(), 0)
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0][2]['collapsed'], {})
+
+    def test_flush_loop_starts_once(self):
+        started = []
+        aggregator = EmitAggregator(lambda *a, **k: None, start_task=started.append)
+        threads = [threading.Thread(target=aggregator.add, args=('tts_complete', {}, ('tts',))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(started), 1)
+        self.assertEqual(aggregator.stats()['pending'], 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
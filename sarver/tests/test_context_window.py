@@ -0,0 +1,75 @@
+import unittest
+from dispatcher.context import ContextManager, Conversation, count_tokens
+
+
+class TestTokenCount(unittest.TestCase):
+    def test_script_aware(self):
+        self.assertEqual(count_tokens(''), 0)
+        self.assertEqual(count_tokens('abcdefgh'), 2)
+        # vowel signs count half: কি (2 chars) < কক (2 consonants)
+        self.assertLess(count_tokens('কিকিকিকি'), count_tokens('কককককককক'))
+        self.assertGreater(count_tokens('আমার সোনার বাংলা'), count_tokens('amar sonar bangla'))
+
+
+class TestConversation(unittest.TestCase):
+    def _conversation(self, turns, **kwargs):
+        conversation = Conversation('s1', system='Be brief.', **kwargs)
+        for i in range(turns):
+            conversation.add('user', f'question {i}. ' + 'word ' * 20)
+            conversation.add('assistant', f'answer {i}. ' + 'word ' * 20)
+        return conversation
+
+    def test_fits_whole_history(self):
+        conversation = self._conversation(3)
+        built = conversation.build('next?', 10000)
+        self.assertEqual(built['history_turns'], 6)
+        self.assertEqual(built['messages'][0], {'role': 'system', 'content': 'Be brief.'})
+        self.assertEqual(built['messages'][-1], {'role': 'user', 'content': 'next?'})
+        self.assertTrue(built['prompt'].endswith('User: next?\nAssistant:'))
+        self.assertFalse(built['summarized'])
+
+    def test_trims_and_summarizes_to_budget(self):
+        conversation = self._conversation(40, summary_tokens=64)
+        built = conversation.build('next?', 300)
+        self.assertLessEqual(built['tokens'], 300)
+        self.assertTrue(built['summarized'])
+        self.assertLess(built['history_turns'], 80)
+        self.assertIn('Summary of the earlier conversation', built['prompt'])
+        self.assertIn('answer 39.', built['prompt'])
+        self.assertNotIn('question 0.', built['prompt'])
+
+    def test_prefix_reused_between_trims(self):
+        conversation = self._conversation(1)
+        conversation.build('a', 2000)
+        for i in range(5):
+            conversation.add('user', 'more')
+            conversation.add('assistant', 'ok')
+            conversation.build('b', 2000)
+        self.assertEqual(conversation.stats['trims'], 0)
+        self.assertEqual(conversation.stats['reused'], 5)
+        self.assertEqual(conversation.build('c', 2000)['history_turns'], 12)
+
+    def test_max_turns_compacts(self):
+        conversation = self._conversation(6, max_turns=8)
+        self.assertLessEqual(len(conversation.turns), 8)
+        self.assertTrue(conversation.base_summary)
+        self.assertTrue(conversation.build('x', 10000)['summarized'])
+
+
+class TestContextManager(unittest.TestCase):
+    def test_prepare_and_record(self):
+        manager = ContextManager({'ollama': 1024}, reserve_tokens=256, max_sessions=2)
+        self.assertEqual(manager.budget('ollama'), 768)
+        self.assertEqual(manager.budget('openai', {'max_tokens': 100}), 3996)
+        manager.record('s1', 'hello', 'hi there')
+        request = manager.prepare('s1', 'ollama', {'prompt': 'how are you?', 'session_id': 's1'})
+        self.assertEqual([m['role'] for m in request['messages']], ['user', 'assistant', 'user'])
+        self.assertIn('User: hello\nAssistant: hi there\nUser: how are you?', request['prompt'])
+        manager.get('s2')
+        manager.get('s3')
+        self.assertEqual(manager.stats()['sessions'], 2)
+        self.assertEqual(manager.stats()['evicted'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
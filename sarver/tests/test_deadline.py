@@ -0,0 +1,117 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import time
+from unittest import mock
+import dispatcher.core as core
+from dispatcher.cache import ResponseCache
+from dispatcher.deadline import (
+    Deadline, DeadlineExceeded, RetryPolicy, attempt_timeout, deadline_scope, is_retryable, retry_call
+)
+from dispatcher.ratelimit import RateLimited
+
+
+class FlakyProvider:
+    def __init__(self, failures, error='HTTP 503 Service Unavailable', delay=0.0):
+        self.failures = failures
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+        self.timeouts = []
+
+    async def arun(self, request):
+        self.calls += 1
+        self.timeouts.append(attempt_timeout(10))
+        await asyncio.sleep(self.delay)
+        if self.calls <= self.failures:
+            return {'error': self.error}
+        return {'provider': 'flaky', 'response': 'ok'}
+
+
+class TestRetryCall(unittest.TestCase):
+    policy = RetryPolicy(max_retries=3, timeout_seconds=2, retry_delay=0.01)
+
+    def test_config_and_jitter(self):
+        policy = RetryPolicy.from_config()
+        self.assertEqual((policy.max_retries, policy.timeout_seconds, policy.retry_delay), (3, 30, 5))
+        delays = [policy.backoff(2) for _ in range(200)]
+        self.assertTrue(all(0 <= d <= 20 for d in delays))
+        self.assertGreater(max(delays) - min(delays), 5)
+
+    def test_classification(self):
+        self.assertTrue(is_retryable(asyncio.TimeoutError()))
+        self.assertTrue(is_retryable(RuntimeError('Client error 429 Too Many Requests')))
+        self.assertFalse(is_retryable(RuntimeError('OPENAI_API_KEY not set')))
+        self.assertFalse(is_retryable(RateLimited('openai rate limit')))
+
+    def test_retries_retryable_errors(self):
+        provider = FlakyProvider(failures=2)
+        result = asyncio.run(retry_call(lambda: provider.arun({}), self.policy, Deadline(2)))
+        self.assertEqual(result['response'], 'ok')
+        self.assertEqual(provider.calls, 3)
+
+    def test_non_retryable_fails_fast(self):
+        provider = FlakyProvider(failures=5, error='OPENAI_API_KEY not set')
+        with self.assertRaises(Exception):
+            asyncio.run(retry_call(lambda: provider.arun({}), self.policy, Deadline(2)))
+        self.assertEqual(provider.calls, 1)
+
+    def test_attempt_is_cut_at_the_deadline(self):
+        provider = FlakyProvider(failures=0, delay=1)
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(retry_call(lambda: provider.arun({}), self.policy, Deadline(0.6)))
+        self.assertLess(time.monotonic() - start, 0.9)
+
+    def test_nested_scope_keeps_earlier_deadline(self):
+        with deadline_scope(1) as outer:
+            with deadline_scope(60) as inner:
+                self.assertIs(inner, outer)
+                self.assertLessEqual(attempt_timeout(10), 1)
+        self.assertEqual(attempt_timeout(10), 10)
+
+
+class TestDispatchDeadline(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(core, 'LOG_ACTIVITY', os.path.join(tmp, 'activity.log')),
+            mock.patch.object(core, 'LOG_FALLBACK', os.path.join(tmp, 'fallback.log')),
+            mock.patch.object(core, 'USAGE_LOG', os.path.join(tmp, 'usage.log')),
+            mock.patch.object(core, 'response_cache', ResponseCache(base_dir=tmp)),
+            mock.patch.object(core, 'retry_policy', RetryPolicy(max_retries=2, timeout_seconds=1, retry_delay=0.01)),
+            mock.patch.object(core, 'load_agent_profile', return_value={
+                'name': 'Zombie', 'preferred_provider': 'first', 'fallback_order': ['second']
+            }),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def _dispatch(self, providers, **request):
+        with mock.patch.object(core, 'load_provider', side_effect=providers.__getitem__):
+            return core.dispatch({'prompt': 'hi', **request})
+
+    def test_retry_then_fallback_within_budget(self):
+        first, second = FlakyProvider(failures=9), FlakyProvider(failures=0)
+        result = self._dispatch({'first': first, 'second': second})
+        self.assertEqual(result['response'], 'ok')
+        self.assertEqual(first.calls, 3)
+        # per-attempt timeouts come from the shrinking budget, not a fixed 10 s
+        self.assertTrue(all(t <= 1 for t in first.timeouts + second.timeouts))
+
+    def test_no_attempt_after_deadline(self):
+        first, second = FlakyProvider(failures=0, delay=5), FlakyProvider(failures=0)
+        start = time.monotonic()
+        result = self._dispatch({'first': first, 'second': second}, timeout_seconds=0.7)
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(second.calls, 0)
+        self.assertIn('deadline', str(result))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
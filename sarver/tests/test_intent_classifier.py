@@ -0,0 +1,74 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from ai.server.mcp.intent_classifier import (
+    ClassifierRouter, IntentClassifier, evaluate, featurize, load_activity_log, load_examples, ngram_indices,
+)
+
+
+class TestIntentClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.examples = load_examples()
+        cls.model = IntentClassifier.train(*zip(*cls.examples))
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_hashing_is_stable_and_normalised(self):
+        self.assertEqual(list(ngram_indices('Write  CODE')), list(ngram_indices('write code')))
+        self.assertTrue((ngram_indices('গল্প বলো') < 2 ** 14).all())
+
+    def test_features_are_sparse(self):
+        (ids, values), = featurize(['write code'])
+        self.assertLess(len(ids), 60)
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertAlmostEqual(float(np.linalg.norm(values)), 1.0, places=5)
+
+    def test_fits_training_examples(self):
+        report = evaluate(self.model, self.examples)
+        self.assertGreaterEqual(report['accuracy'], 0.9)
+        self.assertEqual(self.model.predict('debug this python code')[0], 'procoder')
+        self.assertEqual(self.model.predict('একটি ব্লগ লিখুন')[0], 'blog_writer_bn')
+
+    def test_save_load_roundtrip(self):
+        path = os.path.join(self.tmp, 'model.npz')
+        self.model.save(path)
+        loaded = IntentClassifier.load(path)
+        self.assertEqual(loaded.labels, self.model.labels)
+        self.assertEqual(loaded.predict('a poem about rain'), self.model.predict('a poem about rain'))
+
+    def test_router_falls_back_below_threshold(self):
+        path = os.path.join(self.tmp, 'model.npz')
+        router = ClassifierRouter({'enabled': True, 'model': path, 'min_confidence': 0.6})
+        self.assertIsNone(router.predict('anything'))  # no model yet
+        self.model.save(path)
+        router.config['min_confidence'] = 1.01
+        self.assertIsNone(router.predict('debug this python code'))
+        router.config['min_confidence'] = 0.0
+        self.assertEqual(router.predict('debug this python code')['agent'], 'procoder')
+        stats = router.stats()
+        self.assertEqual((stats['predictions'], stats['confident'], stats['fallbacks']), (2, 1, 1))
+
+    def test_activity_log_skips_failures(self):
+        path = os.path.join(self.tmp, 'agent_activity.log')
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in (
+                {'request': {'agent': 'procoder', 'prompt': 'fix my bug'}, 'result': {'response': 'ok'}},
+                {'request': {'agent': 'procoder', 'prompt': 'broken'}, 'result': {'error': 'timeout'}},
+                {'request': {'agent': 'other', 'prompt': 'hello'}, 'result': {}},
+                {'request': {'prompt': 'no agent'}, 'result': {}},
+            ):
+                f.write(json.dumps(record) + '\n')
+            f.write('not json\n')
+        self.assertEqual(load_activity_log(path, {'procoder'}), [('fix my bug', 'procoder')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from ai.server.mcp.intent_router import AhoCorasick, CompiledRules, IntentRouter, INTENT_ROUTES_PATH
+
+
+class TestAhoCorasick(unittest.TestCase):
+    def test_overlapping_patterns(self):
+        automaton = AhoCorasick([('he', 0), ('she', 1), ('hers', 2), ('লিখ', 3)])
+        self.assertEqual(set(automaton.search('ushers')), {0, 1, 2})
+        self.assertEqual(set(automaton.search('আমাকে একটা গল্প লিখে দাও')), {3})
+        self.assertEqual(list(automaton.search('nothing')), [])
+
+
+class TestCompiledRules(unittest.TestCase):
+    def test_overlapping_regexes_all_match(self):
+        """A low-priority regex consuming the text doesn't hide a higher-priority one inside it"""
+        rules = CompiledRules({'rules': [
+            {'name': 'a', 'agent': 'creative_writer', 'priority': 1, 'regexes': [r'write \w+ code']},
+            {'name': 'b', 'agent': 'procoder', 'priority': 9, 'regexes': ['python']},
+        ]})
+        self.assertEqual(rules.matches('write python code'), {0, 1})
+        self.assertEqual(rules.best('write python code'), 1)
+        self.assertEqual(rules.matches('write rust code'), {0})
+
+
+class TestIntentRouter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'intent_routes.yaml')
+        shutil.copy(INTENT_ROUTES_PATH, self.path)
+        self.router = IntentRouter(self.path, reload_interval=0)
+
+    def test_shipped_rules_match_old_routing(self):
+        route = self.router.route('Spatie UnauthorizedException on my route')
+        self.assertEqual(route['agent_type'], 'mcp-contextual')
+        self.assertIn('assignRole', route['response'])
+        self.assertEqual(self.router.route('Fix this Python BUG please')['agent'], 'procoder')
+        self.assertEqual(self.router.route('একটা ব্লগ লিখে দাও')['agent'], 'blog_writer_bn')
+        self.assertEqual(self.router.route('কেমন আছো?')['agent'], 'creative_writer')
+        # a code keyword outranks a blog keyword, as the old if/elif chain did
+        self.assertEqual(self.router.route('write some code')['agent'], 'procoder')
+
+    def test_regex_rules_and_hit_counters(self):
+        self.assertEqual(self.router.route('KeyError: name')['rule'], 'code')
+        self.router.route('hello')
+        self.assertEqual(self.router.stats()['hits'], {'code': 1, 'default': 1})
+
+    def test_hot_reload_and_bad_edit(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write("rules:\n  - name: voice\n    agent: voice_agent\n    keywords: [ভয়েস]\n")
+        os.utime(self.path, (time.time() + 5, time.time() + 5))
+        self.assertEqual(self.router.route('ভয়েস চালু করো')['agent'], 'voice_agent')
+
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write("rules:\n  - name: broken\n    agent: x\n    regexes: ['(']\n")
+        os.utime(self.path, (time.time() + 10, time.time() + 10))
+        self.assertEqual(self.router.route('ভয়েস')['agent'], 'voice_agent')
+        self.assertIsNotNone(self.router.stats()['last_error'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
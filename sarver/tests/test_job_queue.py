@@ -0,0 +1,166 @@
+import unittest
+import threading
+import time
+from unittest import mock
+from ai.agents.jobs import (
+    BATCH, CANCELLED, DONE, ERROR, INTERACTIVE, SHED, TIMEOUT, JobQueue, QueueFullError, check_cancelled, gather,
+    gather_quota
+)
+from ai.agents.executor import AgentExecutor
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.gate = threading.Event()
+
+    def tearDown(self):
+        self.gate.set()
+
+    def _blocked(self, queue):
+        """Occupy the single worker until the gate opens"""
+        job = queue.submit(self.gate.wait, (5,))
+        while job.status != 'running':
+            time.sleep(0.005)
+        return job
+
+    def test_unique_ids_and_results(self):
+        queue = JobQueue(workers=2)
+        jobs = [queue.submit(lambda i=i: i * 2) for i in range(10)]
+        self.assertEqual(len({job.id for job in jobs}), 10)
+        for i, job in enumerate(jobs):
+            self.assertTrue(job.wait(2))
+            self.assertEqual((job.status, job.result), (DONE, i * 2))
+
+    def test_interactive_runs_before_batch(self):
+        queue = JobQueue(workers=1)
+        order = []
+        self._blocked(queue)
+        batch = queue.submit(order.append, ('batch',), priority=BATCH)
+        interactive = queue.submit(order.append, ('interactive',), priority=INTERACTIVE)
+        self.gate.set()
+        batch.wait(2)
+        interactive.wait(2)
+        self.assertEqual(order, ['interactive', 'batch'])
+
+    def test_full_queue_sheds_batch_then_rejects(self):
+        queue = JobQueue(workers=1, max_queue=2)
+        self._blocked(queue)
+        batch = queue.submit(time.sleep, (0,), priority=BATCH)
+        queue.submit(time.sleep, (0,))
+        queue.submit(time.sleep, (0,))
+        self.assertEqual(batch.status, SHED)
+        with self.assertRaises(QueueFullError):
+            queue.submit(time.sleep, (0,))
+        with self.assertRaises(QueueFullError):
+            queue.submit(time.sleep, (0,), priority=BATCH)
+        self.assertEqual(queue.stats()['counters']['rejected'], 2)
+
+    def test_cooperative_cancel(self):
+        queue = JobQueue(workers=1)
+        stopped = threading.Event()
+
+        def long_task():
+            while True:
+                time.sleep(0.01)
+                try:
+                    check_cancelled()
+                except Exception:
+                    stopped.set()
+                    raise
+
+        job = queue.submit(long_task)
+        while job.status != 'running':
+            time.sleep(0.005)
+        self.assertTrue(job.cancel())
+        self.assertTrue(stopped.wait(2))
+        self.assertEqual(job.status, CANCELLED)
+        self.assertFalse(job.cancel())
+
+    def test_deadline_times_out_and_drops_late_result(self):
+        queue = JobQueue(workers=1)
+        job = queue.submit(time.sleep, (0.3,), deadline=0.05)
+        self.assertTrue(job.wait())
+        self.assertEqual(job.status, TIMEOUT)
+        time.sleep(0.35)
+        self.assertEqual(job.status, TIMEOUT)
+
+    def test_events_stream_until_result(self):
+        queue = JobQueue(workers=1)
+        job = queue.submit(lambda: 'ok')
+        events = list(job.events())
+        self.assertEqual([e['type'] for e in events], ['status', 'status', 'done'])
+        self.assertEqual(events[-1]['result'], 'ok')
+
+        failed = queue.submit(lambda: 1 / 0)
+        self.assertEqual(list(failed.events())[-1]['type'], 'error')
+        self.assertEqual(failed.status, ERROR)
+
+
+class TestGather(unittest.TestCase):
+    def setUp(self):
+        self.queue = JobQueue(workers=8)
+
+    def _submit(self, *delays_and_results):
+        return [self.queue.submit(self._answer, (delay, result)) for delay, result in delays_and_results]
+
+    @staticmethod
+    def _answer(delay, result):
+        end = time.monotonic() + delay
+        while time.monotonic() < end:
+            time.sleep(0.005)
+            check_cancelled()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def test_all_streams_in_completion_order(self):
+        jobs = self._submit((0.1, 'slow'), (0.0, 'fast'), (0.0, 'fast'))
+        events = list(gather(jobs, 'all', timeout=2))
+        done = events.pop()
+        self.assertEqual(events[-1]['index'], 0)
+        self.assertEqual(sorted(e['index'] for e in events), [0, 1, 2])
+        self.assertTrue(done['satisfied'])
+
+    def test_first_cancels_stragglers(self):
+        jobs = self._submit((1, 'slow'), (0.0, 'fast'))
+        done = list(gather(jobs, 'first', timeout=2))[-1]
+        self.assertEqual((done['winner'], done['result']), (1, 'fast'))
+        self.assertEqual(done['cancelled'], [0])
+        self.assertEqual(jobs[0].status, CANCELLED)
+
+    def test_quorum_needs_agreement(self):
+        jobs = self._submit((0.0, 'yes'), (0.02, 'no'), (0.04, ' yes'), (1, 'yes'))
+        done = list(gather(jobs, 'quorum', n=2, timeout=2))[-1]
+        self.assertTrue(done['satisfied'])
+        self.assertEqual(done['result'], 'yes')
+        self.assertEqual(done['cancelled'], [3])
+
+    def test_first_n_gives_up_when_unsatisfiable(self):
+        jobs = self._submit((0.0, ValueError('x')), (0.0, ValueError('y')), (1, 'ok'))
+        done = list(gather(jobs, 'first_n', n=2, timeout=2))[-1]
+        self.assertEqual(done['reason'], 'unsatisfiable')
+        self.assertLess(done['elapsed_ms'], 900)
+
+    def test_single_deadline(self):
+        jobs = self._submit((1, 'a'), (1, 'b'))
+        done = list(gather(jobs, 'all', timeout=0.1))[-1]
+        self.assertEqual(done['reason'], 'deadline')
+        self.assertEqual(done['cancelled'], [0, 1])
+
+    def test_quota_validates_n(self):
+        self.assertEqual(gather_quota('quorum', None, 5), 3)
+        self.assertEqual(gather_quota('first_n', '2', 3), 2)
+        for n in ('two', 0, 4, [1]):
+            with self.assertRaises(ValueError):
+                gather_quota('first_n', n, 3)
+
+    def test_bad_n_rejected_before_scatter(self):
+        executor = AgentExecutor()
+        with mock.patch.object(executor, 'scatter') as scatter:
+            with self.assertRaises(ValueError):
+                executor.scatter_gather([{'agent': 'a', 'message': 'x'}], 'quorum', n='2x')
+        scatter.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
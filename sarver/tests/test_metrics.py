@@ -0,0 +1,79 @@
+import unittest
+import time
+from flask import Flask
+from prometheus_client import CollectorRegistry, Histogram, generate_latest
+from dispatcher.metrics import (
+    LATENCY_BUCKETS, collector, counter_family, gauge_family, instrument_flask, agent_label, language_label
+)
+
+
+class TestCollectors(unittest.TestCase):
+    def setUp(self):
+        self.registry = CollectorRegistry()
+
+    def render(self):
+        return generate_latest(self.registry).decode('utf-8')
+
+    def test_families_from_label_dicts(self):
+        collector(lambda: [
+            gauge_family('test_pulled', 'Pulled', [({'kind': 'a"b', 'shard': 1}, 0.25)]),
+            counter_family('test_lookups', 'Lookups', [({'result': 'hit'}, 3)]),
+            gauge_family('test_empty', 'Nothing yet', []),
+        ], self.registry)
+        text = self.render()
+        self.assertIn('# TYPE test_pulled gauge', text)
+        self.assertIn('test_pulled{kind="a\\"b",shard="1"} 0.25', text)
+        self.assertIn('test_lookups_total{result="hit"} 3.0', text)
+        self.assertIn('# TYPE test_empty gauge', text)
+
+    def test_broken_collector_does_not_break_the_scrape(self):
+        def broken():
+            raise RuntimeError('boom')
+            yield
+
+        collector(broken, self.registry)
+        collector(lambda: [gauge_family('test_ok', 'Still here', [({}, 1)])], self.registry)
+        self.assertIn('test_ok 1.0', self.render())
+
+    def test_registering_does_not_run_the_collector(self):
+        calls = []
+        collector(lambda: calls.append(1) or [], self.registry)
+        self.assertEqual(calls, [])
+        self.render()
+        self.assertEqual(calls, [1])
+
+    def test_observe_is_cheap(self):
+        child = Histogram('test_seconds', 'x', ('agent',), buckets=LATENCY_BUCKETS,
+                          registry=self.registry).labels('a')
+        start = time.perf_counter()
+        for _ in range(10000):
+            child.observe(0.02)
+        self.assertLess((time.perf_counter() - start) / 10000, 20e-6)
+
+
+class TestFlaskEndpoint(unittest.TestCase):
+    def test_metrics_route_and_request_tracking(self):
+        app = Flask(__name__)
+        instrument_flask(app, 'test_server')
+        app.add_url_rule('/ping', 'ping', lambda: 'pong')
+        client = app.test_client()
+        client.get('/ping')
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertIn('zombiecoder_http_request_seconds_count{endpoint="ping",method="GET",server="test_server",'
+                      'status="200"} 1.0', text)
+        self.assertNotIn('_created', text)
+        self.assertIn('zombiecoder_http_requests_in_flight{server="test_server"} 1.0', text)  # the scrape itself
+
+    def test_agent_label_folds_unknown_names(self):
+        self.assertEqual(agent_label('procoder'), 'procoder')
+        self.assertEqual(agent_label('Zombie'), 'Zombie')
+        self.assertEqual(agent_label('x' * 200), 'unknown')
+        self.assertEqual(agent_label(None), 'unknown')
+        self.assertEqual([language_label(l) for l in ('bn', 'en', 'xx-evil', None)], ['bn', 'en', 'other', 'other'])
+
+
+if __name__ == '__main__':
+    unittest.main()
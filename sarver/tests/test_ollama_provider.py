@@ -0,0 +1,100 @@
+import unittest
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from providers.local.ollama import OllamaClient
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the Ollama /api/generate endpoint"""
+    payloads = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length))
+        self.payloads.append(payload)
+        turn = len(self.payloads)
+        tokens = ['echo', ': ', payload.get('prompt', '')]
+        context = (payload.get('context') or []) + [turn]
+
+        if payload.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            for token in tokens:
+                self.wfile.write((json.dumps({'response': token, 'done': False}) + '\n').encode())
+            self.wfile.write((json.dumps({'response': '', 'done': True, 'context': context}) + '\n').encode())
+            return
+
+        body = json.dumps({
+            'model': payload['model'],
+            'response': ''.join(tokens),
+            'done': True,
+            'context': context,
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestOllamaProvider(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubOllamaHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubOllamaHandler.payloads = []
+        self.client = OllamaClient(base_url=self.base_url, model='llama3', keep_alive='10m')
+
+    def test_generate_sends_prompt_verbatim(self):
+        """Prompts with quotes must reach the server untouched"""
+        prompt = 'say "hello" and \'bye\''
+        data = self.client.generate(prompt, options={'num_predict': 32})
+        self.assertEqual(data['response'], f'echo: {prompt}')
+        sent = StubOllamaHandler.payloads[-1]
+        self.assertEqual(sent['prompt'], prompt)
+        self.assertEqual(sent['keep_alive'], '10m')
+        self.assertEqual(sent['options'], {'num_predict': 32})
+        self.assertFalse(sent['stream'])
+
+    def test_stream_yields_tokens(self):
+        """Streaming mode relays tokens one by one"""
+        tokens = list(self.client.stream('hi'))
+        self.assertEqual(tokens, ['echo', ': ', 'hi'])
+        self.assertTrue(StubOllamaHandler.payloads[-1]['stream'])
+
+    def test_session_context_reused(self):
+        """Follow-up turns send back the context from the previous turn"""
+        self.client.generate('first', session_id='s1')
+        self.assertNotIn('context', StubOllamaHandler.payloads[-1])
+        list(self.client.stream('second', session_id='s1'))
+        self.assertEqual(StubOllamaHandler.payloads[-1]['context'], [1])
+        self.client.generate('third', session_id='s1')
+        self.assertEqual(StubOllamaHandler.payloads[-1]['context'], [1, 2])
+
+        self.client.generate('other', session_id='s2')
+        self.assertNotIn('context', StubOllamaHandler.payloads[-1])
+
+        self.client.reset_session('s1')
+        self.assertIsNone(self.client.get_context('s1'))
+
+    def test_unload_model(self):
+        """Unloading sets keep_alive to zero"""
+        self.client.unload_model()
+        self.assertEqual(StubOllamaHandler.payloads[-1]['keep_alive'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,124 @@
+import unittest
+import asyncio
+import tempfile
+from unittest import mock
+import ai.agents.pipeline as pipeline_module
+from ai.agents.pipeline import Pipeline, StageTimings, load_pipelines, render
+from dispatcher.cache import ResponseCache
+
+
+async def fake_agent(stage, prompt, emit):
+    await asyncio.sleep(stage.get('params', {}).get('delay', 0.05))
+    for word in prompt.split()[:2]:
+        await emit({'type': 'token', 'stage': stage['id'], 'token': word})
+    return f"{stage['id']}({prompt})"
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.patches = [
+            mock.patch.dict(pipeline_module.STAGE_RUNNERS, {'agent': fake_agent}),
+            mock.patch.object(pipeline_module, 'response_cache', ResponseCache(base_dir=tempfile.mkdtemp())),
+            mock.patch.object(pipeline_module, 'stage_timings', StageTimings()),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def _diamond(self, **extra):
+        return Pipeline('diamond', [
+            {'id': 'a', 'agent': 'x'},
+            {'id': 'b', 'agent': 'y', 'needs': ['a'], 'input': '{a} then b'},
+            {'id': 'c', 'agent': 'z', 'needs': ['a'], 'estimate_ms': 5000},
+            {'id': 'd', 'agent': 'w', 'needs': ['b', 'c'], 'input': '{b} + {c} {keep}'},
+        ], **extra)
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            Pipeline('cycle', [{'id': 'a', 'needs': ['b']}, {'id': 'b', 'needs': ['a']}])
+        with self.assertRaises(ValueError):
+            Pipeline('missing', [{'id': 'a', 'needs': ['nope']}])
+        with self.assertRaises(ValueError):
+            Pipeline('kind', [{'id': 'a', 'kind': 'fax'}])
+
+    def test_plan_follows_longest_branch(self):
+        plan = self._diamond().plan(StageTimings())
+        self.assertEqual(plan['critical_path'], ['a', 'c', 'd'])
+        self.assertEqual(plan['estimated_ms'], 7000)
+
+    def test_branches_run_in_parallel(self):
+        pipeline = self._diamond()
+        events = asyncio.run(self._collect(pipeline.events('hello world')))
+        done = events[-1]
+        self.assertEqual(done['type'], 'done')
+        self.assertEqual(done['output'], 'd(b(a(hello world) then b) + c(a(hello world)) {keep})')
+        starts = [e['stage'] for e in events if e['type'] == 'stage_start']
+        # the longer branch c is started ahead of b
+        self.assertEqual(starts, ['a', 'c', 'b', 'd'])
+        self.assertLess(done['elapsed_ms'], 300)
+        self.assertTrue(any(e['type'] == 'token' and e['stage'] == 'a' for e in events))
+        self.assertEqual(set(done['timings']), {'a', 'b', 'c', 'd'})
+
+    def test_stage_results_are_cached(self):
+        pipeline = self._diamond()
+        for stage in pipeline.stages.values():
+            stage['cache'] = True
+        asyncio.run(pipeline.run('hi'))
+        second = asyncio.run(pipeline.run('hi'))
+        self.assertTrue(all(t['cached'] for t in second['timings'].values()))
+
+    def test_stages_cache_only_when_opted_in(self):
+        pipeline = self._diamond()
+        asyncio.run(pipeline.run('hi'))
+        second = asyncio.run(pipeline.run('hi'))
+        self.assertFalse(any(t['cached'] for t in second['timings'].values()))
+
+    def test_cache_key_per_stage_and_agent(self):
+        """Stages with the same prompt but a different id or agent don't share an entry"""
+        pipeline = Pipeline('p', [
+            {'id': 'a', 'agent': 'x', 'input': '{input}', 'cache': True},
+            {'id': 'b', 'agent': 'x', 'input': '{input}', 'needs': ['a'], 'cache': True},
+            {'id': 'c', 'agent': 'y', 'input': '{input}', 'needs': ['b'], 'cache': True},
+        ])
+        result = asyncio.run(pipeline.run('hi'))
+        self.assertEqual(result['outputs'], {'a': 'a(hi)', 'b': 'b(hi)', 'c': 'c(hi)'})
+        self.assertFalse(any(t['cached'] for t in result['timings'].values()))
+
+    def test_error_text_is_not_cached(self):
+        calls = []
+
+        async def failing(stage, prompt, emit):
+            calls.append(prompt)
+            return '[ERROR] model not loaded'
+
+        with mock.patch.dict(pipeline_module.STAGE_RUNNERS, {'agent': failing}):
+            pipeline = Pipeline('p', [{'id': 'a', 'cache': True}])
+            asyncio.run(pipeline.run('hi'))
+            asyncio.run(pipeline.run('hi'))
+        self.assertEqual(len(calls), 2)
+
+    def test_failed_stage_stops_the_run(self):
+        async def broken(stage, prompt, emit):
+            raise RuntimeError('agent down')
+
+        with mock.patch.dict(pipeline_module.STAGE_RUNNERS, {'dispatch': broken}):
+            pipeline = Pipeline('p', [{'id': 'a'}, {'id': 'b', 'kind': 'dispatch', 'needs': ['a']}])
+            result = asyncio.run(pipeline.run('hi'))
+        self.assertEqual((result['type'], result['stage'], result['error']), ('error', 'b', 'agent down'))
+
+    def test_shipped_pipelines_parse(self):
+        pipelines = load_pipelines()
+        self.assertIn('code_review', pipelines)
+        self.assertEqual(pipelines['code_review'].order, ['code', 'review'])
+        self.assertEqual(render('{input} {x}', {'input': 'i'}), 'i {x}')
+
+    @staticmethod
+    async def _collect(events):
+        return [e async for e in events]
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
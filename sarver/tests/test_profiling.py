@@ -0,0 +1,70 @@
+import threading
+import unittest
+from dispatcher.profiling import MemoryTracker, collapsed, module_name, profile_report, sample_stacks
+
+
+def busy_loop(stop):
+    total = 0
+    while not stop.is_set():
+        total += sum(range(200))
+    return total
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_busy_thread_shows_up_in_collapsed_stacks(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name='busy-worker')
+        worker.start()
+        try:
+            result = sample_stacks(0.3, interval=0.002)
+        finally:
+            stop.set()
+            worker.join()
+        self.assertGreater(result['ticks'], 10)
+        text = collapsed(result['stacks'])
+        busy = [line for line in text.splitlines() if line.startswith('busy-worker;')]
+        self.assertTrue(busy)
+        self.assertIn('test_profiling:busy_loop', busy[0])
+        self.assertTrue(busy[0].rsplit(' ', 1)[1].isdigit())
+
+    def test_report_and_single_run(self):
+        report = profile_report(0.05, include_idle=True)
+        self.assertIn('top', report)
+        self.assertGreater(report['ticks'], 0)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in report['collapsed'].splitlines()))
+
+        errors = []
+        runner = threading.Thread(target=sample_stacks, args=(0.3,))
+        runner.start()
+        try:
+            threading.Event().wait(0.05)
+            try:
+                sample_stacks(0.05)
+            except RuntimeError as e:
+                errors.append(e)
+        finally:
+            runner.join()
+        self.assertEqual(len(errors), 1)
+
+    def test_module_name(self):
+        self.assertTrue(module_name(__file__).endswith('test_profiling'))  # 'tests.' unless tests/ is on sys.path
+
+
+class TestMemoryTracker(unittest.TestCase):
+    def test_diff_reports_growth_per_module(self):
+        tracker = MemoryTracker()
+        try:
+            tracker.snapshot()
+            hoard = [bytes(1024) for _ in range(2000)]
+            diff = tracker.diff()
+            growth = {m['module']: m['growth_kb'] for m in diff['modules']}
+            self.assertGreater(growth.get(module_name(__file__), 0), 1500)
+            self.assertGreater(tracker.snapshot()['traced_kb'], 1500)
+            del hoard
+        finally:
+            tracker.stop()
+        self.assertFalse(tracker.tracing)
+
+
+if __name__ == '__main__':
+    unittest.main()
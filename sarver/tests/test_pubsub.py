@@ -0,0 +1,105 @@
+import asyncio
+import json
+import unittest
+from dispatcher.pubsub import Hub, Subscriber, SubscriberClosed
+
+
+def drain(subscriber):
+    messages = []
+    while subscriber.depth:
+        messages.append(json.loads(subscriber.get_nowait()))
+    return messages
+
+
+class TestHub(unittest.TestCase):
+    def test_publishes_only_changed_fields(self):
+        hub = Hub()
+        subscriber = hub.subscribe()
+        hub.publish('system_metrics', {'cpu_percent': 10.0, 'memory_percent': 50.0})
+        hub.publish('system_metrics', {'cpu_percent': 12.5, 'memory_percent': 50.0})
+        self.assertIsNone(hub.publish('system_metrics', {'cpu_percent': 12.5}))
+        snapshot, first, second = drain(subscriber)
+        self.assertEqual(snapshot['type'], 'snapshot')
+        self.assertEqual(first['data'], {'cpu_percent': 10.0, 'memory_percent': 50.0})
+        self.assertEqual(second['data'], {'cpu_percent': 12.5})
+        self.assertEqual(second['seq'], first['seq'] + 1)
+        self.assertEqual(hub.state('system_metrics'), {'cpu_percent': 12.5, 'memory_percent': 50.0})
+        self.assertEqual(hub.stats()['unchanged'], 1)
+
+    def test_serialized_once_for_all_subscribers(self):
+        hub = Hub()
+        subscribers = [hub.subscribe() for _ in range(3)]
+        for s in subscribers:
+            s.get_nowait()
+        hub.publish('api_metrics', {'total_requests': 1})
+        received = [s.get_nowait() for s in subscribers]
+        self.assertTrue(all(message is received[0] for message in received))
+
+    def test_late_subscriber_gets_full_state(self):
+        hub = Hub()
+        hub.publish('system_metrics', {'cpu_percent': 1.0, 'memory_percent': 2.0})
+        hub.publish('system_metrics', {'cpu_percent': 3.0})
+        hub.publish('editor_events', {'event_count': 4})
+        (snapshot,) = drain(hub.subscribe())
+        self.assertEqual(snapshot['data'], {'system_metrics': {'cpu_percent': 3.0, 'memory_percent': 2.0},
+                                            'editor_events': {'event_count': 4}})
+        self.assertEqual(snapshot['seq'], 3)
+
+    def test_overflowing_subscriber_is_resynced_with_a_snapshot(self):
+        hub = Hub(queue_size=2)
+        subscriber = hub.subscribe()
+        for n in range(5):
+            hub.publish('api_metrics', {'total_requests': n})
+        snapshot, delta = drain(subscriber)
+        self.assertEqual(snapshot['type'], 'snapshot')
+        self.assertEqual(snapshot['data'], {'api_metrics': {'total_requests': 3}})
+        self.assertEqual((delta['seq'], delta['data']), (5, {'total_requests': 4}))
+        self.assertEqual(subscriber.resyncs, 2)
+        self.assertEqual(hub.stats()['resyncs'], 2)
+
+    def test_subscriber_get_waits_for_publish(self):
+        async def scenario():
+            hub = Hub()
+            subscriber = hub.subscribe()
+            await subscriber.get()
+            waiter = asyncio.ensure_future(subscriber.get())
+            await asyncio.sleep(0)
+            hub.publish('system_metrics', {'cpu_percent': 5.0})
+            return json.loads(await waiter)
+
+        self.assertEqual(asyncio.run(scenario())['data'], {'cpu_percent': 5.0})
+
+
+class TestSlowConsumerPolicies(unittest.TestCase):
+    def test_coalesce_replaces_queued_message_with_same_key(self):
+        subscriber = Subscriber(maxsize=3, policy='coalesce')
+        subscriber.offer('openai:online', key='openai')
+        subscriber.offer('procoder:active', key='procoder')
+        subscriber.offer('openai:error', key='openai')
+        self.assertEqual([subscriber.get_nowait(), subscriber.get_nowait()], ['openai:error', 'procoder:active'])
+        self.assertEqual(subscriber.coalesced, 1)
+
+    def test_disconnect_closes_a_full_subscriber(self):
+        async def scenario():
+            subscriber = Subscriber(maxsize=2, policy='disconnect')
+            self.assertTrue(subscriber.offer('a'))
+            self.assertTrue(subscriber.offer('b'))
+            self.assertFalse(subscriber.offer('c'))
+            with self.assertRaises(SubscriberClosed):
+                await subscriber.get()
+
+        asyncio.run(scenario())
+
+    def test_lag_is_measured_per_message(self):
+        subscriber = Subscriber()
+        subscriber.offer('a')
+        self.assertGreaterEqual(subscriber.oldest_wait(), 0)
+        subscriber.get_nowait()
+        self.assertEqual(subscriber.sent, 1)
+        self.assertGreaterEqual(subscriber.max_lag, subscriber.last_lag)
+        with self.assertRaises(ValueError):
+            Subscriber(policy='block')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import asyncio
+import time
+from dispatcher.ratelimit import RateLimited, RateLimiter, estimate_tokens, is_rate_limit_error, usage_tokens
+
+
+class TestRateLimiter(unittest.TestCase):
+    def _limiter(self, **limits):
+        limits.setdefault('max_wait_seconds', 0.5)
+        return RateLimiter({'openai': limits}, {'openai': 'sk-test'})
+
+    def test_estimates(self):
+        self.assertEqual(estimate_tokens('abcdefgh'), 2)
+        self.assertGreater(estimate_tokens('আমার সোনার বাংলা'), estimate_tokens('amar sonar bangla'))
+        self.assertEqual(usage_tokens({'response': {'usage': {'total_tokens': 42}}}), 42)
+        self.assertEqual(usage_tokens({'eval_count': 10, 'prompt_eval_count': 5}), 15)
+        self.assertIsNone(usage_tokens({'error': 'x'}))
+
+    def test_requests_queue_then_divert(self):
+        limiter = self._limiter(requests_per_minute=600)  # 10 per second
+        provider = limiter.get('openai')
+        provider.requests.tokens = 1
+
+        async def burst():
+            await limiter.acquire('openai', {'prompt': 'a'})
+            start = time.monotonic()
+            await limiter.acquire('openai', {'prompt': 'b'})
+            return time.monotonic() - start
+
+        waited = asyncio.run(burst())
+        self.assertGreater(waited, 0.05)
+        provider.requests.tokens = -100
+        with self.assertRaises(RateLimited):
+            asyncio.run(limiter.acquire('openai', {'prompt': 'c'}))
+        stats = limiter.snapshot()['openai'][provider.key_id]
+        self.assertEqual((stats['admitted'], stats['queued'], stats['diverted']), (2, 1, 1))
+
+    def test_usage_refunds_estimate(self):
+        limiter = self._limiter(tokens_per_minute=1000, completion_tokens=300)
+
+        async def call():
+            return {'response': {'usage': {'total_tokens': 50}}}
+
+        result = asyncio.run(limiter.call('openai', {'prompt': 'hello'}, call))
+        self.assertEqual(result['response']['usage']['total_tokens'], 50)
+        budget = limiter.snapshot()['openai'][limiter.get('openai').key_id]['budget']['tokens']
+        self.assertGreaterEqual(budget['available'], 950)
+
+    def test_provider_429_pauses_provider(self):
+        limiter = self._limiter(requests_per_minute=600, cooldown_seconds=5)
+
+        async def throttled():
+            return {'error': 'Client error 429 Too Many Requests'}
+
+        asyncio.run(limiter.call('openai', {'prompt': 'x'}, throttled))
+        with self.assertRaises(RateLimited):
+            asyncio.run(limiter.acquire('openai', {'prompt': 'y'}))
+
+    def test_rate_limit_errors(self):
+        self.assertTrue(is_rate_limit_error({'error': 'HTTP 429'}))
+        self.assertTrue(is_rate_limit_error(RuntimeError('Too Many Requests')))
+        self.assertFalse(is_rate_limit_error(RuntimeError('connection reset')))
+        self.assertFalse(is_rate_limit_error(RateLimited('openai rate limit: budget frees up in 2.0s')))
+
+    def test_unlimited_providers_and_aliases(self):
+        limiter = RateLimiter({'together': {'requests_per_minute': 60}})
+        self.assertIsNone(limiter.get('ollama'))
+        self.assertIs(limiter.get('togetherai'), limiter.get('together'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
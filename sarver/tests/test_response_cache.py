@@ -0,0 +1,133 @@
+import unittest
+import asyncio
+import os
+import tempfile
+from unittest import mock
+import dispatcher.core as core
+from dispatcher.cache import ResponseCache, load_cache_config
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = ResponseCache(base_dir=self.tmp, memory_entries=2, max_temperature=0.2,
+                                   provider_ttls={'ollama': 60}, provider_temperatures={'ollama': 0.7})
+        self.calls = 0
+
+    async def _provider(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {'provider': 'ollama', 'response': f'answer {self.calls}'}
+
+    def _fetch(self, provider, request):
+        return asyncio.run(self.cache.fetch(provider, request, self._provider))
+
+    def test_memory_then_disk_hit(self):
+        """Second call is served from memory, and from disk after memory is cleared"""
+        request = {'prompt': 'বাংলাদেশের রাজধানী?', 'temperature': 0}
+        first = self._fetch('ollama', request)
+        self.assertEqual(self._fetch('ollama', request), first)
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp, 'ollama', 'cache')))
+
+        self.cache._memory.clear()
+        self.assertEqual(self._fetch('ollama', request), first)
+        self.assertEqual(self.calls, 1)
+        stats = self.cache.stats()
+        self.assertEqual(stats['totals']['hits_memory'], 1)
+        self.assertEqual(stats['totals']['hits_disk'], 1)
+        self.assertGreater(stats['saved_latency_ms'], 0)
+
+    def test_key_includes_model_and_params(self):
+        self._fetch('ollama', {'prompt': 'hi', 'temperature': 0, 'model': 'llama3'})
+        self._fetch('ollama', {'prompt': 'hi', 'temperature': 0, 'model': 'phi3'})
+        self._fetch('ollama', {'prompt': 'hi', 'temperature': 0, 'model': 'phi3', 'max_tokens': 5})
+        self.assertEqual(self.calls, 3)
+
+    def test_hot_temperature_bypasses(self):
+        """Provider default temperature above the limit skips the cache"""
+        self._fetch('ollama', {'prompt': 'hi'})
+        self._fetch('ollama', {'prompt': 'hi'})
+        self.assertEqual(self.calls, 2)
+        self._fetch('ollama', {'prompt': 'hi', 'temperature': 0})
+        self._fetch('ollama', {'prompt': 'hi', 'temperature': 0})
+        self.assertEqual(self.calls, 3)
+        self._fetch('ollama', {'prompt': 'hi', 'options': {'temperature': 0.9}})
+        self.assertEqual(self.calls, 4)
+        self.assertEqual(self.cache.stats()['providers']['ollama']['bypassed'], 3)
+
+    def test_config_temperature_only_where_sent(self):
+        """openai/together send no temperature by default; ollama sends its configured one"""
+        cache = ResponseCache(provider_temperatures=load_cache_config()['provider_temperatures'])
+        self.assertIsNone(cache.temperature_for('openai', {'prompt': 'hi'}))
+        self.assertIsNone(cache.temperature_for('together', {'prompt': 'hi'}))
+        self.assertIsNone(cache.temperature_for('togetherai', {'prompt': 'hi'}))
+        self.assertFalse(cache.should_bypass('openai', {'prompt': 'hi'}))
+        self.assertTrue(cache.should_bypass('together', {'prompt': 'hi', 'temperature': 0.7}))
+        self.assertTrue(cache.should_bypass('ollama', {'prompt': 'hi'}))
+
+    def test_default_dispatch_hits_cache(self):
+        """A plain dispatch() is served from the cache the second time"""
+        config = load_cache_config()
+        cache = ResponseCache(base_dir=self.tmp, max_temperature=config['max_temperature'],
+                              provider_temperatures=config['provider_temperatures'])
+
+        class Provider:
+            calls = 0
+
+            async def arun(self, request):
+                Provider.calls += 1
+                return {'provider': 'openai', 'response': {'choices': [{'message': {'content': 'ok'}}]}}
+
+        with mock.patch.object(core, 'response_cache', cache), \
+                mock.patch.object(core, 'load_provider', return_value=Provider()), \
+                mock.patch.object(core, 'LOG_ACTIVITY', os.path.join(self.tmp, 'activity.log')), \
+                mock.patch.object(core, 'USAGE_LOG', os.path.join(self.tmp, 'usage.log')):
+            first = core.dispatch({'prompt': 'cache me'})
+            second = core.dispatch({'prompt': 'cache me'})
+        self.assertEqual(first, second)
+        self.assertEqual(Provider.calls, 1)
+        self.assertEqual(cache.stats()['providers']['openai']['hits_memory'], 1)
+
+    def test_errors_are_not_cached(self):
+        async def failing():
+            self.calls += 1
+            return {'error': 'HTTP 429'}
+
+        for _ in range(2):
+            asyncio.run(self.cache.fetch('ollama', {'prompt': 'x', 'temperature': 0}, failing))
+        self.assertEqual(self.calls, 2)
+
+    def test_agent_failures_are_not_cacheable(self):
+        self.assertFalse(ResponseCache.is_cacheable('[ERROR] model not loaded'))
+        self.assertFalse(ResponseCache.is_cacheable({'result': '[ERROR] boom', 'agent_type': 'mcp'}))
+        self.assertFalse(ResponseCache.is_cacheable({'result': 'ok', 'agent_type': 'error'}))
+        self.assertFalse(ResponseCache.is_cacheable({'result': 'Sorry', 'agent_type': 'unknown'}))
+        self.assertTrue(ResponseCache.is_cacheable({'result': 'ok', 'agent_type': 'instruct'}))
+        self.assertTrue(ResponseCache.is_cacheable('ok'))
+
+    def test_key_includes_agent(self):
+        self._fetch('ollama', {'prompt': 'hi', 'temperature': 0, 'agent': 'procoder'})
+        self._fetch('ollama', {'prompt': 'hi', 'temperature': 0, 'agent': 'girlfriend-gpt'})
+        self._fetch('ollama', {'prompt': 'hi', 'temperature': 0, 'agent': 'procoder'})
+        self.assertEqual(self.calls, 2)
+
+    def test_expired_entries_are_dropped(self):
+        self.cache.provider_ttls['ollama'] = -1
+        request = {'prompt': 'hi', 'temperature': 0}
+        self._fetch('ollama', request)
+        self._fetch('ollama', request)
+        self.assertEqual(self.calls, 2)
+
+    def test_lru_bound_and_clear(self):
+        for i in range(5):
+            self._fetch('ollama', {'prompt': str(i), 'temperature': 0})
+        self.assertEqual(self.cache.size(), 2)
+        self.cache.clear('ollama')
+        self.assertEqual(self.cache.size(), 0)
+        self._fetch('ollama', {'prompt': '0', 'temperature': 0})
+        self.assertEqual(self.calls, 6)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
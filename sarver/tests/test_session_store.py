@@ -0,0 +1,60 @@
+import unittest
+import time
+from unittest import mock
+from dispatcher.sessions import MemorySessionBackend, SessionStore
+
+
+class TestSessionStore(unittest.TestCase):
+    def _store(self, **backend):
+        return SessionStore(MemorySessionBackend(**backend), max_turns=3, provider_stickiness_seconds=60)
+
+    def test_sessions_are_independent(self):
+        store = self._store()
+        store.set('a', agent_id='procoder', language='en')
+        store.set('b', agent_id='storyteller')
+        self.assertEqual(store.get('a')['agent_id'], 'procoder')
+        self.assertEqual(store.get('b')['agent_id'], 'storyteller')
+        self.assertIsNone(store.get('b')['language'])
+        self.assertEqual(store.active_count(), 2)
+
+    def test_recent_turns_are_capped(self):
+        store = self._store()
+        for i in range(5):
+            store.add_turn('a', 'user', f'message {i}')
+        self.assertEqual([t['content'] for t in store.get('a')['turns']], ['message 2', 'message 3', 'message 4'])
+
+    def test_lru_eviction_and_ttl(self):
+        store = self._store(max_sessions=2, ttl_seconds=100)
+        store.get('a')
+        store.get('b')
+        store.get('a')  # b is now least recently used
+        store.get('c')
+        self.assertIsNone(store.get('b', create=False))
+        self.assertIsNotNone(store.get('a', create=False))
+        with mock.patch('dispatcher.sessions.time.time', return_value=time.time() + 101):
+            self.assertEqual(store.active_count(), 0)
+        stats = store.stats()
+        self.assertEqual((stats['evicted'], stats['expired']), (1, 2))
+        self.assertEqual(stats['created'], 3)
+
+    def test_provider_stickiness_expires(self):
+        store = self._store()
+        self.assertIsNone(store.sticky_provider('a'))
+        store.stick_provider('a', 'ollama')
+        self.assertEqual(store.sticky_provider('a'), 'ollama')
+        with mock.patch('dispatcher.sessions.time.time', return_value=time.time() + 61):
+            self.assertIsNone(store.sticky_provider('a'))
+
+    def test_provider_chain_prefers_sticky_provider(self):
+        from dispatcher import core
+        agent = {'preferred_provider': 'openai', 'fallback_order': ['together', 'ollama']}
+        store = self._store()
+        store.stick_provider('s1', 'ollama')
+        with mock.patch.object(core, 'session_store', store):
+            self.assertEqual(core.provider_chain(agent, {'session_id': 's1'}), ['ollama', 'openai', 'together'])
+            self.assertEqual(core.provider_chain(agent, {'session_id': 's1', 'provider': 'together'})[0], 'together')
+            self.assertEqual(core.provider_chain(agent, {})[0], 'openai')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import asyncio
+from dispatcher.singleflight import SingleFlight, request_key
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_key_normalizes_prompt(self):
+        """Whitespace differences don't split identical prompts"""
+        a = request_key('procoder', None, '  fix   this\nbug ', {'lang': 'bn'})
+        b = request_key('procoder', None, 'fix this bug', {'lang': 'bn'})
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, request_key('procoder', None, 'fix this bug', {'lang': 'en'}))
+        self.assertNotEqual(a, request_key('blog_writer_bn', None, 'fix this bug', {'lang': 'bn'}))
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight('test')
+        calls = []
+
+        async def slow_call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {'result': 'ok'}
+
+        async def main():
+            results = await asyncio.gather(*[flight.do('k', slow_call) for _ in range(20)])
+            # a later call starts a fresh execution
+            await flight.do('k', slow_call)
+            return results
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(all(r == {'result': 'ok'} for r in results))
+        results[1]['result'] = 'changed'
+        self.assertEqual(results[2]['result'], 'ok')
+        stats = flight.stats()
+        self.assertEqual(stats['calls'], 21)
+        self.assertEqual(stats['coalesced'], 19)
+        self.assertEqual(stats['inflight'], 0)
+
+    def test_errors_propagate_to_all_waiters(self):
+        flight = SingleFlight('test')
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError('provider down')
+
+        async def main():
+            return await asyncio.gather(*[flight.do('k', failing) for _ in range(3)],
+                                        return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(flight.stats()['errors'], 1)
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        flight = SingleFlight('test')
+
+        async def slow_call():
+            await asyncio.sleep(0.05)
+            return 'done'
+
+        async def main():
+            leader = asyncio.ensure_future(flight.do('k', slow_call))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do('k', slow_call))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(main()), 'done')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,157 @@
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+from unittest import mock
+import dispatcher.core as core
+from dispatcher.aio import iter_sync
+from dispatcher.deadline import attempt_timeout
+from dispatcher.ratelimit import RateLimiter
+from dispatcher.streaming import (
+    NDJSON, SSE, StreamMetrics, encode_events, get_stream_mode, measure_stream, single_chunk, stream_metrics
+)
+
+
+class StreamingProvider:
+    def __init__(self, tokens, fail_after=None):
+        self.tokens = tokens
+        self.fail_after = fail_after
+
+    async def astream(self, request):
+        for i, token in enumerate(self.tokens):
+            if self.fail_after is not None and i == self.fail_after:
+                raise RuntimeError('connection reset')
+            await asyncio.sleep(0)
+            yield token
+
+
+class DeadlineProvider:
+    """Streams the per-attempt timeout it would give its HTTP call"""
+    async def astream(self, request):
+        yield f"{attempt_timeout(600):.0f}"
+        await asyncio.sleep(0)
+        yield 'done'
+
+
+class ThrottledProvider:
+    async def astream(self, request):
+        raise RuntimeError("Client error '429 Too Many Requests'")
+        yield  # pragma: no cover
+
+
+class DownProvider:
+    async def astream(self, request):
+        raise RuntimeError('provider down')
+        yield  # pragma: no cover
+
+
+class TestStreamHelpers(unittest.TestCase):
+    def test_measure_stream_records_metrics(self):
+        """Token events are followed by a done event with timings"""
+        metrics = StreamMetrics()
+
+        async def tokens():
+            for t in ['a', 'b', 'c']:
+                yield t
+
+        async def collect():
+            return [e async for e in measure_stream(tokens(), 'ollama', 'procoder', metrics)]
+
+        events = asyncio.run(collect())
+        self.assertEqual([e['token'] for e in events[:-1]], ['a', 'b', 'c'])
+        done = events[-1]
+        self.assertEqual(done['type'], 'done')
+        self.assertEqual(done['tokens'], 3)
+        self.assertIsNotNone(done['ttft_ms'])
+        stats = metrics.snapshot()['ollama']['procoder']
+        self.assertEqual(stats['streams'], 1)
+        self.assertEqual(stats['tokens'], 3)
+
+    def test_single_chunk_streams_report_no_ttft(self):
+        metrics = StreamMetrics()
+
+        async def collect():
+            return [e async for e in measure_stream(single_chunk('whole answer'), 'local', 'mcp', metrics,
+                                                    chunked=False)]
+
+        done = asyncio.run(collect())[-1]
+        self.assertEqual(done['tokens'], 1)
+        self.assertIsNone(done['ttft_ms'])
+        self.assertIsNone(metrics.snapshot()['local']['mcp']['avg_ttft_ms'])
+
+    def test_stream_mode_negotiation(self):
+        """Plain JSON stays the default"""
+        self.assertIsNone(get_stream_mode({}, 'application/json'))
+        self.assertEqual(get_stream_mode({'stream': True}), SSE)
+        self.assertEqual(get_stream_mode({'stream': True}, 'application/x-ndjson'), NDJSON)
+        self.assertEqual(get_stream_mode({'stream': 'ndjson'}), NDJSON)
+        self.assertEqual(get_stream_mode({}, 'text/event-stream'), SSE)
+
+    def test_encode_events(self):
+        """SSE frames carry the event type, NDJSON is one object per line"""
+        events = [{'type': 'token', 'token': 'হ্যালো'}, {'type': 'done', 'tokens': 1}]
+        sse = list(encode_events(events, SSE))
+        self.assertTrue(sse[0].startswith('event: token\ndata: '))
+        self.assertTrue(sse[0].endswith('\n\n'))
+        self.assertIn('হ্যালো', sse[0])
+        lines = ''.join(encode_events(events, NDJSON)).splitlines()
+        self.assertEqual([json.loads(line)['type'] for line in lines], ['token', 'done'])
+
+
+class TestStreamDispatch(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(core, 'LOG_FALLBACK', os.path.join(tmp, 'fallback.log')),
+            mock.patch.object(core, 'USAGE_LOG', os.path.join(tmp, 'usage.log')),
+            mock.patch.object(core, 'load_agent_profile', return_value={
+                'name': 'Zombie', 'preferred_provider': 'first', 'fallback_order': ['second']
+            }),
+        ]
+        for p in self.patches:
+            p.start()
+        stream_metrics.reset()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def _run(self, providers, **request):
+        with mock.patch.object(core, 'load_provider', side_effect=providers.__getitem__):
+            return list(iter_sync(core.stream_dispatch_async({'prompt': 'hi', 'agent': 'procoder', **request})))
+
+    def test_streams_settle_and_honour_429(self):
+        """A streamed reply settles its token count; a 429 pauses the provider and falls back"""
+        limiter = RateLimiter({'first': {'tokens_per_minute': 10000, 'cooldown_seconds': 5},
+                               'second': {'tokens_per_minute': 10000}})
+        with mock.patch.object(core, 'rate_limiter', limiter):
+            events = self._run({'first': ThrottledProvider(), 'second': StreamingProvider(['x', 'y'])})
+        self.assertEqual(events[-1]['provider'], 'second')
+        first = limiter.get('first').snapshot()
+        self.assertEqual(first['throttled_by_provider'], 1)
+        self.assertGreater(first['budget']['tokens']['ready_in_s'], 0)
+        second = limiter.get('second').snapshot()
+        self.assertGreater(second['tokens_used'], 0)
+        self.assertLess(second['tokens_used'], second['tokens_estimated'])
+
+    def test_provider_calls_see_the_deadline(self):
+        events = self._run({'first': DeadlineProvider()}, timeout_seconds=5)
+        self.assertEqual([e['token'] for e in events if e['type'] == 'token'], ['5', 'done'])
+        self.assertIsNone(attempt_timeout(None))  # the scope doesn't leak into the caller
+
+    def test_falls_back_before_first_token(self):
+        events = self._run({'first': DownProvider(), 'second': StreamingProvider(['x', 'y'])})
+        self.assertEqual([e['token'] for e in events if e['type'] == 'token'], ['x', 'y'])
+        self.assertEqual(events[-1]['provider'], 'second')
+        self.assertIn('procoder', stream_metrics.snapshot()['second'])
+
+    def test_error_after_tokens_is_not_retried(self):
+        events = self._run({'first': StreamingProvider(['x', 'y'], fail_after=1),
+                            'second': StreamingProvider(['z'])})
+        self.assertEqual([e['type'] for e in events], ['token', 'error'])
+        self.assertEqual(events[-1]['provider'], 'first')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,34 @@
+import unittest
+import time
+from dispatcher.system_stats import SystemSampler
+
+
+class TestSystemSampler(unittest.TestCase):
+    def test_snapshot_is_instant_and_refreshed_in_background(self):
+        sampler = SystemSampler(interval=0.05)
+        try:
+            start = time.perf_counter()
+            snapshot = sampler.snapshot()
+            self.assertLess(time.perf_counter() - start, 0.2)
+            for key in ('cpu_percent', 'ram_percent', 'disk_percent', 'net_recv_per_sec', 'age_seconds'):
+                self.assertIn(key, snapshot)
+            time.sleep(0.3)
+            self.assertGreater(sampler.samples, 2)
+            self.assertLess(sampler.snapshot()['age_seconds'], 0.2)
+        finally:
+            sampler.stop()
+
+    def test_start_is_idempotent(self):
+        sampler = SystemSampler(interval=10)
+        try:
+            sampler.start()
+            thread = sampler._thread
+            sampler.snapshot()
+            self.assertIs(sampler._thread, thread)
+            self.assertEqual(sampler.samples, 1)
+        finally:
+            sampler.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
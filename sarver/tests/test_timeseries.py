@@ -0,0 +1,72 @@
+import unittest
+import os
+import shutil
+import tempfile
+from dispatcher.timeseries import TimeSeriesStore, query_args
+
+
+class TestTimeSeriesStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_rollups(self):
+        store = TimeSeriesStore()
+        base = 1_699_999_200  # on an hour boundary
+        for i in range(120):
+            store.record('latency_ms', i + 1, ts=base + i)
+        seconds = store.query('latency_ms', base, base + 119, '1s')['points']
+        self.assertEqual(len(seconds), 120)
+        self.assertEqual(seconds[0]['avg'], 1)
+        minutes = store.query('latency_ms', base, base + 119, '1m')['points']
+        self.assertEqual([p['count'] for p in minutes], [60, 60])
+        self.assertEqual((minutes[0]['min'], minutes[0]['max'], minutes[0]['avg']), (1, 60, 30.5))
+        hour = store.query('latency_ms', base, base + 119, '1h')['points'][0]
+        self.assertEqual(hour['count'], 120)
+        self.assertAlmostEqual(hour['p95'], 114, delta=114 * 0.25)
+
+    def test_ring_is_fixed_size(self):
+        store = TimeSeriesStore(slots={'1s': 10})
+        for i in range(100):
+            store.record('x', 1, ts=1000 + i)
+        points = store.query('x', 0, 2000, '1s')['points']
+        self.assertEqual([p['t'] for p in points], list(range(1090, 1100)))
+
+    def test_sqlite_tier_and_retention(self):
+        path = os.path.join(self.tmp, 'ts.db')
+        store = TimeSeriesStore(path, slots={'1m': 5}, retention_days={'1m': 1})
+        base = 1_699_999_200
+        for minute in range(10):
+            store.record('latency_ms', minute, ts=base + minute * 60)
+            store.flush(now=base + minute * 60 + 1)  # before the 5-slot ring wraps
+        self.assertEqual(store.flush(now=base + 3600), 2)  # the last minute and the hour
+        reopened = TimeSeriesStore(path)
+        points = reopened.query('latency_ms', base, base + 600, '1m')['points']
+        self.assertEqual([p['avg'] for p in points], list(range(10)))
+        store.flush(now=base + 3 * 86400)
+        self.assertEqual(TimeSeriesStore(path).query('latency_ms', base, base + 600, '1m')['points'], [])
+
+    def test_series_cap(self):
+        store = TimeSeriesStore(max_series=2)
+        self.assertTrue(store.record('a', 1))
+        self.assertTrue(store.record('b', 1))
+        self.assertFalse(store.record('c', 1))
+        self.assertTrue(store.record('a', 2))  # existing series keep recording
+        self.assertEqual(store.series(), ['a', 'b'])
+        self.assertEqual((store.stats()['series'], store.stats()['dropped']), (2, 1))
+
+    def test_query_args(self):
+        store = TimeSeriesStore()
+        store.record('a', 5)
+        self.assertEqual(query_args(store, {})['series'], ['a'])
+        result = query_args(store, {'series': 'a', 'start': '-60'})
+        self.assertEqual(result['resolution'], '1s')
+        self.assertEqual(result['points'][0]['max'], 5)
+        with self.assertRaises(ValueError):
+            query_args(store, {'series': 'a', 'resolution': '5m'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import unittest
+from flask import Flask
+from dispatcher.aio import run_sync, to_thread
+from dispatcher.tracing import Tracer, server_timing, trace_flask, tracer
+
+
+class TestTracer(unittest.TestCase):
+    def test_spans_nest_across_the_loop_and_threads(self):
+        t = Tracer()
+
+        def blocking():
+            with t.span('memory.get'):
+                pass
+
+        async def work():
+            with t.span('provider.openai'):
+                await to_thread(blocking)
+
+        with t.span('dispatch', agent='mcp') as root:
+            run_sync(work())
+        self.assertEqual([c.name for c in root.children], ['provider.openai'])
+        self.assertEqual([c.name for c in root.children[0].children], ['memory.get'])
+        trace = t.get(root.trace_id)
+        self.assertEqual(trace['spans'], 3)
+        self.assertEqual(trace['tree']['children'][0]['children'][0]['name'], 'memory.get')
+        self.assertEqual(t.recent()[0]['trace_id'], root.trace_id)
+
+    def test_errors_ring_buffer_and_span_limit(self):
+        t = Tracer(ring_size=2, max_spans=3)
+        with self.assertRaises(KeyError):
+            with t.span('failing'):
+                raise KeyError('x')
+        self.assertIn('KeyError', t.recent()[0]['error'])
+        with t.span('root') as root:
+            for _ in range(5):
+                with t.span('child'):
+                    pass
+        self.assertEqual(root.span_count, 3)
+        self.assertEqual(t.stats()['dropped_spans'], 3)
+        with t.span('third'):
+            pass
+        self.assertEqual([s['name'] for s in t.recent()], ['third', 'root'])
+
+    def test_server_timing_sums_repeated_names(self):
+        t = Tracer()
+        with t.span('request') as root:
+            for _ in range(2):
+                with t.span('memory.get'):
+                    pass
+            with t.span('tts synthesize'):
+                pass
+        header = server_timing(root)
+        self.assertTrue(header.startswith('total;dur='))
+        self.assertEqual(header.count('memory.get;dur='), 1)
+        self.assertIn('tts_synthesize;dur=', header)
+
+    def test_otlp_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            t = Tracer(export_dir=directory, service='test')
+            with t.span('dispatch', agent='mcp', attempt=2):
+                with t.span('provider.ollama'):
+                    pass
+            files = os.listdir(directory)
+            self.assertEqual(len(files), 1)
+            with open(os.path.join(directory, files[0]), encoding='utf-8') as f:
+                exported = json.loads(f.readline())
+        spans = exported['resourceSpans'][0]['scopeSpans'][0]['spans']
+        self.assertEqual([s['name'] for s in spans], ['dispatch', 'provider.ollama'])
+        self.assertEqual(spans[1]['parentSpanId'], spans[0]['spanId'])
+        self.assertEqual(len(spans[0]['traceId']), 32)
+        self.assertIn({'key': 'attempt', 'value': {'intValue': '2'}}, spans[0]['attributes'])
+
+
+class TestFlaskMiddleware(unittest.TestCase):
+    def test_request_gets_a_root_span_and_headers(self):
+        app = Flask(__name__)
+        trace_flask(app, 'test_server')
+
+        @app.route('/work')
+        def work():
+            with tracer.span('route.intent'):
+                pass
+            return 'ok'
+
+        response = app.test_client().get('/work')
+        self.assertIn('route.intent;dur=', response.headers['Server-Timing'])
+        trace = tracer.get(response.headers['X-Trace-Id'])
+        self.assertEqual(trace['name'], 'GET work')
+        self.assertEqual(trace['attributes']['status'], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
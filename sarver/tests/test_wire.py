@@ -0,0 +1,48 @@
+import unittest
+from dispatcher.pubsub import Hub
+from dispatcher.wire import JSON, MSGPACK, MSGPACK_AVAILABLE, decode, diff, negotiate, patch
+
+
+class TestDelta(unittest.TestCase):
+    def test_diff_and_patch_round_trip(self):
+        old = {'cpu_percent': 10.0, 'network_io': {'bytes_sent': 100, 'bytes_recv': 200}, 'gone': 1}
+        new = {'cpu_percent': 10.0, 'network_io': {'bytes_sent': 150, 'bytes_recv': 200}, 'memory_percent': 40.0}
+        changes, removed = diff(old, new)
+        self.assertEqual(changes, {'network_io': {'bytes_sent': 150}, 'memory_percent': 40.0})
+        self.assertEqual(removed, [['gone']])
+        self.assertEqual(patch(old, changes, removed), new)
+        self.assertEqual(old['network_io']['bytes_sent'], 100)  # patch() doesn't touch its input
+
+    def test_nested_removal(self):
+        old = {'editor': {'active': ['vscode'], 'errors': 2}}
+        new = {'editor': {'active': ['vscode']}}
+        self.assertEqual(patch(old, *diff(old, new)), new)
+
+
+class TestNegotiation(unittest.TestCase):
+    def test_json_unless_msgpack_is_offered_and_installed(self):
+        self.assertEqual(negotiate([]), (JSON, None))
+        self.assertEqual(negotiate(['zombiecoder.json.v1']), (JSON, 'zombiecoder.json.v1'))
+        self.assertEqual(negotiate(['chat']), (JSON, None))
+        expected = (MSGPACK, 'zombiecoder.msgpack.v1') if MSGPACK_AVAILABLE else (JSON, None)
+        self.assertEqual(negotiate(['zombiecoder.msgpack.v1', 'zombiecoder.json.v1'])[0], expected[0])
+        self.assertEqual(negotiate([], '/?format=msgpack')[0], MSGPACK if MSGPACK_AVAILABLE else JSON)
+
+
+@unittest.skipUnless(MSGPACK_AVAILABLE, 'msgpack is not installed')
+class TestBinaryHub(unittest.TestCase):
+    def test_binary_subscriber_rebuilds_state_from_deltas(self):
+        hub = Hub()
+        hub.publish('system_metrics', {'cpu_percent': 5.0, 'network_io': {'bytes_sent': 1, 'bytes_recv': 1}})
+        subscriber = hub.subscribe(MSGPACK)
+        hub.publish('system_metrics', {'cpu_percent': 5.0, 'network_io': {'bytes_sent': 9, 'bytes_recv': 1}})
+        snapshot = decode(subscriber.get_nowait())
+        delta = decode(subscriber.get_nowait())
+        self.assertEqual(snapshot['k'], 'snapshot')
+        self.assertEqual(delta['d'], {'network_io': {'bytes_sent': 9}})
+        state = patch(snapshot['d']['system_metrics'], delta['d'], delta.get('x', ()))
+        self.assertEqual(state, hub.state('system_metrics'))
+
+
+if __name__ == '__main__':
+    unittest.main()
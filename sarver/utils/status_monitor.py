@@ -1,10 +1,15 @@
 import asyncio
 import logging
+import os
+import sys
 import aiohttp
 import socket
 from typing import Dict, Optional
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from dispatcher.accounting import agent_accounting
+
 logger = logging.getLogger(__name__)
 
 class StatusMonitor:
@@ -38,9 +43,8 @@ class StatusMonitor:
             await self.check_provider_status(provider)
 
     def get_active_agents(self) -> list:
-        """Get list of active agents from registry"""
-        # TODO: Implement actual agent discovery
-        return [
+        """Default agents plus every agent that has been used or loaded in this process"""
+        agents = [
             {
                 'id': 'procoder',
                 'type': 'development',
@@ -52,6 +56,10 @@ class StatusMonitor:
                 'config': {'memory_limit': '80MB'}
             }
         ]
+        known = {agent['id'] for agent in agents}
+        agents += [{'id': name, 'type': 'accounted', 'config': {}}
+                   for name in agent_accounting.agents() if name not in known]
+        return agents
 
     def get_configured_providers(self) -> list:
         """Get list of configured providers"""
@@ -82,11 +90,15 @@ class StatusMonitor:
             # Check agent process and memory usage
             memory_usage = self.get_agent_memory_usage(agent_id)
             response_time = await self.measure_agent_response_time(agent_id)
-            
-            status = 'active' if memory_usage and response_time else 'error'
+            wall_ms = (agent_accounting.snapshot(agent_id) or {}).get('wall_ms', {})
+
+            # no recorded calls yet is not an error, the agent just hasn't been used
+            status = 'active' if response_time is not None else 'idle'
             details = {
-                'memory_usage': memory_usage,
-                'response_time': f"{response_time:.2f}ms" if response_time else 'N/A',
+                'memory_usage': memory_usage or 'N/A',
+                'response_time': f"{response_time:.2f}ms" if response_time is not None else 'N/A',
+                'p95': f"{wall_ms['p95']:.2f}ms" if wall_ms.get('p95') is not None else 'N/A',
+                'p99': f"{wall_ms['p99']:.2f}ms" if wall_ms.get('p99') is not None else 'N/A',
                 'last_check': datetime.now().isoformat()
             }
 
@@ -177,14 +189,14 @@ class StatusMonitor:
             }
 
     def get_agent_memory_usage(self, agent_id: str) -> Optional[str]:
-        """Get memory usage of an agent process"""
-        # TODO: Implement actual memory usage check
-        return "45MB"
+        """Approximate footprint of an agent (config, personality and memory store)"""
+        usage = agent_accounting.snapshot(agent_id)
+        return usage['memory_usage'] if usage and usage['memory_bytes'] is not None else None
 
     async def measure_agent_response_time(self, agent_id: str) -> Optional[float]:
-        """Measure agent response time"""
-        # TODO: Implement actual response time measurement
-        return 120.5
+        """Median response time in ms over the agent's recent calls, None if there are none"""
+        usage = agent_accounting.snapshot(agent_id)
+        return usage['wall_ms']['p50'] if usage else None
 
     def has_status_changed(self, id: str, status: str, details: Dict) -> bool:
         """Check if status has changed since last check"""
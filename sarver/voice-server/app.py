@@ -13,6 +13,7 @@ from werkzeug.utils import secure_filename
 import threading
 import queue
 import json
+from collections import deque
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,8 +23,16 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from dispatcher.metrics import STT_SECONDS, TTS_SECONDS, collector, gauge_family, instrument_flask, language_label
+from dispatcher.tracing import span, trace_flask
+from dispatcher.broadcast import EmitAggregator, register_rooms
+from dispatcher.timeseries import query_args, timeseries
+instrument_flask(app, "voice_server")  # GET /metrics
+trace_flask(app, "voice_server")  # Server-Timing header, traces in the admin dashboard
+
 # Global variables for tracking
-voice_requests = []
+voice_requests = deque(maxlen=100)  # recent requests for /api/logs; history is in dispatcher.timeseries
 system_stats = {
     "cpu_usage": 0,
     "memory_usage": 0,
@@ -48,6 +57,15 @@ AUDIO_CONFIG = {
 
 # Audio playback queue for streaming
 audio_queue = queue.Queue()
+
+# tts_complete goes out batched per room every SOCKETIO_TICK_MS; clients start in
+# "tts" (all languages) and can subscribe to "tts:<language>" rooms instead
+emitter = EmitAggregator(socketio.emit, start_task=socketio.start_background_task, sleep=socketio.sleep)
+join_default_rooms = register_rooms(socketio, default_rooms=("tts",), allowed_prefixes=("tts:",))
+
+@collector
+def _audio_queue_metrics():
+    yield gauge_family("zombiecoder_audio_queue_depth", "Clips waiting for playback", [({}, audio_queue.qsize())])
 is_playing = False
 
 def setup_audio_system():
@@ -180,7 +198,8 @@ def status():
         "stats": system_stats,
         "audio_config": AUDIO_CONFIG,
         "is_playing": is_playing,
-        "queue_size": audio_queue.qsize()
+        "queue_size": audio_queue.qsize(),
+        "socketio_emits": emitter.stats()
     })
 
 @app.route("/api/tts", methods=["POST"])
@@ -199,7 +218,6 @@ def text_to_speech():
     
     try:
         # Import Bengali TTS
-        sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
         try:
             from shared.utils.bengali_voice import BengaliTTS
         except ImportError:
@@ -209,21 +227,22 @@ def text_to_speech():
         clean_text = clean_text_for_tts(text)
         
         # Initialize TTS engine
-        if language == "bn" and BengaliTTS:
-            # Use Bengali TTS
-            tts = BengaliTTS("pyttsx3_bengali")
-            audio_path = tts.text_to_speech(clean_text)
-        else:
-            # Use regular pyttsx3 for other languages
-            engine = pyttsx3.init()
-            engine.setProperty('rate', AUDIO_CONFIG["speed"])
-            engine.setProperty('volume', AUDIO_CONFIG["volume"])
-            
-            # Generate audio
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tf:
-                engine.save_to_file(clean_text, tf.name)
-                engine.runAndWait()
-                audio_path = tf.name
+        with span("tts.synthesize", language=language, text_length=len(clean_text)):
+            if language == "bn" and BengaliTTS:
+                # Use Bengali TTS
+                tts = BengaliTTS("pyttsx3_bengali")
+                audio_path = tts.text_to_speech(clean_text)
+            else:
+                # Use regular pyttsx3 for other languages
+                engine = pyttsx3.init()
+                engine.setProperty('rate', AUDIO_CONFIG["speed"])
+                engine.setProperty('volume', AUDIO_CONFIG["volume"])
+                
+                # Generate audio
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tf:
+                    engine.save_to_file(clean_text, tf.name)
+                    engine.runAndWait()
+                    audio_path = tf.name
         
         # Calculate processing time
         processing_time = (time.time() - start_time) * 1000
@@ -236,21 +255,19 @@ def text_to_speech():
             "text_length": len(clean_text),
             "processing_time_ms": round(processing_time, 2)
         })
-        
-        # Keep only last 100 entries
-        if len(voice_requests) > 100:
-            voice_requests.pop(0)
+        _record_metric("voice.tts_ms", processing_time)
+        TTS_SECONDS.labels(language_label(language), "ok").observe(processing_time / 1000)
         
         # Update stats
         system_stats["tts_requests"] += 1
         
-        # Emit real-time update
-        socketio.emit('tts_complete', {
+        # Real-time update, batched with the other TTS calls of this tick
+        emitter.add('tts_complete', {
             'text_length': len(clean_text),
             'language': language,
             'processing_time': round(processing_time, 2),
             'timestamp': datetime.now().isoformat()
-        })
+        }, rooms=("tts", f"tts:{language_label(language)}"), key=language_label(language), value=processing_time)
         
         # Handle streaming
         if stream:
@@ -269,6 +286,7 @@ def text_to_speech():
             return send_file(audio_path, mimetype="audio/wav", as_attachment=True, download_name="speech.wav")
         
     except Exception as e:
+        TTS_SECONDS.labels(language_label(language), "error").observe(time.time() - start_time)
         logger.error(f"TTS error: {e}")
         return jsonify({
             "success": False,
@@ -303,7 +321,6 @@ def speech_to_text():
     
     try:
         # Import Bengali STT
-        sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
         try:
             from shared.utils.bengali_voice import BengaliSTT
         except ImportError:
@@ -315,15 +332,16 @@ def speech_to_text():
             temp_audio_path = tf.name
         
         # Initialize STT
-        if language == "bn" and BengaliSTT:
-            stt = BengaliSTT("whisper_bengali")
-            text = stt.speech_to_text(temp_audio_path)
-        else:
-            # Use regular speech recognition for other languages
-            recognizer = sr.Recognizer()
-            with sr.AudioFile(temp_audio_path) as source:
-                audio = recognizer.record(source)
-            text = recognizer.recognize_google(audio, language="en-US")
+        with span("stt.recognize", language=language):
+            if language == "bn" and BengaliSTT:
+                stt = BengaliSTT("whisper_bengali")
+                text = stt.speech_to_text(temp_audio_path)
+            else:
+                # Use regular speech recognition for other languages
+                recognizer = sr.Recognizer()
+                with sr.AudioFile(temp_audio_path) as source:
+                    audio = recognizer.record(source)
+                text = recognizer.recognize_google(audio, language="en-US")
         
         # Clean up temporary file
         os.unlink(temp_audio_path)
@@ -338,6 +356,8 @@ def speech_to_text():
             "language": language,
             "processing_time_ms": round(processing_time, 2)
         })
+        _record_metric("voice.stt_ms", processing_time)
+        STT_SECONDS.labels(language_label(language), "ok").observe(processing_time / 1000)
         
         # Update stats
         system_stats["stt_requests"] += 1
@@ -350,6 +370,7 @@ def speech_to_text():
         })
         
     except Exception as e:
+        STT_SECONDS.labels(language_label(language), "error").observe(time.time() - start_time)
         logger.error(f"STT error: {e}")
         return jsonify({
             "success": False,
@@ -375,27 +396,28 @@ def voice_chat():
         response = f"আপনি বলেছেন: {clean_text}"
         
         # Generate audio
-        if language == "bn":
-            # Use eSpeak for Bengali
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tf:
-                cmd = [
-                    "espeak-ng", "-v", "bengali", 
-                    "-s", str(AUDIO_CONFIG["speed"]),
-                    "-w", tf.name,
-                    response
-                ]
-                subprocess.run(cmd, check=True)
-                audio_path = tf.name
-        else:
-            # Use pyttsx3 for other languages
-            engine = pyttsx3.init()
-            engine.setProperty('rate', AUDIO_CONFIG["speed"])
-            engine.setProperty('volume', AUDIO_CONFIG["volume"])
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tf:
-                engine.save_to_file(response, tf.name)
-                engine.runAndWait()
-                audio_path = tf.name
+        with span("tts.synthesize", language=language, text_length=len(response)):
+            if language == "bn":
+                # Use eSpeak for Bengali
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tf:
+                    cmd = [
+                        "espeak-ng", "-v", "bengali", 
+                        "-s", str(AUDIO_CONFIG["speed"]),
+                        "-w", tf.name,
+                        response
+                    ]
+                    subprocess.run(cmd, check=True)
+                    audio_path = tf.name
+            else:
+                # Use pyttsx3 for other languages
+                engine = pyttsx3.init()
+                engine.setProperty('rate', AUDIO_CONFIG["speed"])
+                engine.setProperty('volume', AUDIO_CONFIG["volume"])
+                
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tf:
+                    engine.save_to_file(response, tf.name)
+                    engine.runAndWait()
+                    audio_path = tf.name
         
         # Handle streaming
         if stream:
@@ -452,9 +474,20 @@ def get_logs():
     """Get recent voice requests"""
     return jsonify({
         "success": True,
-        "logs": voice_requests[-50:]  # Last 50 requests
+        "logs": list(voice_requests)[-50:]  # Last 50 requests
     })
 
+def _record_metric(name, value):
+    timeseries.record(name, value)
+
+@app.route("/api/timeseries")
+def get_timeseries():
+    """Series names, or ?series=<name>&start=&end=&resolution=1s|1m|1h rollups (min/max/avg/p95)"""
+    try:
+        return jsonify(query_args(timeseries, request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route("/api/health")
 def health_check():
     """Health check endpoint"""
@@ -469,6 +502,7 @@ def health_check():
 def handle_connect():
     """Handle client connection"""
     logger.info(f"Client connected: {request.sid}")
+    join_default_rooms()
     emit('status', {'message': 'Connected to voice server'})
 
 @socketio.on('disconnect')